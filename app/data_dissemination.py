@@ -1,6 +1,7 @@
 import app.protocol.deluge
 import net.layers.application
 import net.layers.transport
+import pickle
 import sock
 import threading
 import utils.pdu
@@ -25,6 +26,9 @@ class DataDissemination(net.layers.application.Application):
 
     PDU_CLS = DataDisseminationPDU
 
+    # Seconds between refreshing the protocol's view of our neighbours.
+    NEIGHBOURS_REFRESH = 5
+
     def __init__(self, addr, protocol=None):
         super(DataDissemination, self).__init__(addr)
         self.protocol = protocol or self.create_protocol()
@@ -32,7 +36,13 @@ class DataDissemination(net.layers.application.Application):
         self.start()
 
     def _handle_incoming(self, data):
-        transport_pdu = net.layers.transport.TransportPDU.from_string(data)
+        envelope = net.layers.transport.LocalEnvelope.from_string(data)
+        transport_pdu = net.layers.transport.TransportPDU.from_string(
+            envelope.data)
+        if self._is_neighbours_reply(transport_pdu):
+            self._handle_neighbours(pickle.loads(transport_pdu.message))
+            return
+        self._handle_incoming_metadata(transport_pdu, envelope.metadata)
         dd_pdu = self.PDU_CLS.from_string(transport_pdu.message)
         if dd_pdu.is_for_app():
             self._handle_incoming_message(
@@ -45,15 +55,34 @@ class DataDissemination(net.layers.application.Application):
         self.protocol.addr = self.addr
         # Override protocol's send method.
         app = self
-        def send_to_protocol(data):
-            app._send_to_protocol(data)
+        def send_to_protocol(data, is_data=False):
+            app._send_to_protocol(data, is_data)
         self.protocol._send = send_to_protocol
         self.protocol.start()
 
     def start(self):
-        t = threading.Thread(target=self._check_protocol_received)
-        t.setDaemon(True)
-        t.start()
+        # A single threaded scheduler (eg. sim.engine.Engine) hands data
+        # received by the protocol to _handle_incoming_dissemination itself.
+        if not getattr(self.scheduler, 'SINGLE_THREADED', False):
+            t = threading.Thread(target=self._check_protocol_received)
+            t.setDaemon(True)
+            t.start()
+
+        self.scheduler.call_later(0, self._refresh_neighbours)
+
+    def _refresh_neighbours(self):
+        if self._outgoing_queue is not None:
+            self.request_neighbours()
+        self.scheduler.call_later(
+            self.NEIGHBOURS_REFRESH, self._refresh_neighbours)
+
+    def _handle_neighbours(self, neighbours):
+        super(DataDissemination, self)._handle_neighbours(neighbours)
+        self.protocol.set_neighbours(neighbours)
+
+    def register_metrics(self, registry):
+        super(DataDissemination, self).register_metrics(registry)
+        self.protocol.register_metrics(registry)
 
     def start_protocol(self):
         self.protocol.start()
@@ -66,9 +95,9 @@ class DataDissemination(net.layers.application.Application):
             data = self.protocol.get_received_blocking()
             self._handle_incoming_dissemination(data)
         
-    def _send_to_protocol(self, data):
+    def _send_to_protocol(self, data, is_data=False):
         dd_pdu = self.PDU_CLS.create_for_protocol(data)
-        self._send(dd_pdu.to_string())
+        self._send(dd_pdu.to_string(), is_data=is_data)
 
     def _send_to_app(self, data, dest_addr=None):
         dd_pdu = self.PDU_CLS.create_for_app(data)
@@ -1,4 +1,5 @@
 import app.deluge
+import app.protocol.events
 import app.protocol.rateless_deluge
 import app.rateless_deluge
 import argparse
@@ -6,8 +7,8 @@ import net.layers.application
 import net.layers.base
 import pickle
 import struct
-import threading
 import time
+import utils.metrics
 import utils.pdu
 
 
@@ -55,15 +56,18 @@ class ManagerPDU(utils.pdu.PDU):
         self.t_tx = x[11]
         self.w = x[12]
         self.rx_max = x[13]
+        # Managers before verbose send 14 fields.
+        self.verbose = x[14] if len(x) > 14 else False
 
     def _repr_ctrl(self):
         format = "%4s, %s, d = %s/%s, r = %s/%s k = %s, t_min = %s, t_max = %s, " + \
-            "delay = %s, frame_delay = %s, t_r = %s, t_tx = %s, w = %s, rx_max = %s"
+            "delay = %s, frame_delay = %s, t_r = %s, t_tx = %s, w = %s, rx_max = %s, " + \
+            "verbose = %s"
         return format % (self.type, Protocol.get_name(self.protocol),
             self.d_page_size, self.d_packet_size,
             self.r_page_size, self.r_packet_size,
             self.k, self.t_min, self.t_max, self.delay, self.frame_delay,
-            self.t_r, self.t_tx, self.w, self.rx_max)
+            self.t_r, self.t_tx, self.w, self.rx_max, self.verbose)
 
     @classmethod
     def create_ctrl(cls,
@@ -80,7 +84,8 @@ class ManagerPDU(utils.pdu.PDU):
             t_r=.5,
             t_tx=.2,
             w=10,
-            rx_max=2):
+            rx_max=2,
+            verbose=False):
         assert d_page_size % d_packet_size == 0
         assert r_page_size % r_packet_size == 0
         assert t_min <= t_max
@@ -100,6 +105,7 @@ class ManagerPDU(utils.pdu.PDU):
             t_tx,
             w,
             rx_max,
+            verbose,
         ])
         return cls(cls.CTRL, message)
 
@@ -128,6 +134,7 @@ class Manager(net.layers.application.Application):
     T_TX = .2
     W = 10
     RX_MAX = 2
+    VERBOSE = False
 
     def __init__(self, addr):
         super(Manager, self).__init__(addr)
@@ -147,6 +154,11 @@ class Manager(net.layers.application.Application):
         self.apps[Protocol.RATELESS] = \
             app.rateless_deluge.RatelessDeluge.create_and_run_application()
 
+    def register_metrics(self, registry):
+        super(Manager, self).register_metrics(registry)
+        for application in self.apps.itervalues():
+            application.register_metrics(registry)
+
     def set_mode(self, mode):
         self.mode = mode
 
@@ -211,6 +223,7 @@ class Manager(net.layers.application.Application):
         self.T_TX = data_unit.t_tx
         self.W = data_unit.w
         self.RX_MAX = data_unit.rx_max
+        self.VERBOSE = data_unit.verbose
 
         # Update the two protocols.
         self._update_deluge()
@@ -225,6 +238,7 @@ class Manager(net.layers.application.Application):
         protocol.protocol.T_TX = self.T_TX
         protocol.protocol.W = self.W
         protocol.protocol.RX_MAX = self.RX_MAX
+        protocol.protocol.LOG_PACKETS = self.VERBOSE
 
     def _update_deluge(self):
         self.deluge.stop_protocol()
@@ -256,9 +270,8 @@ class Manager(net.layers.application.Application):
     def delay_start_active(self, delay, data=None, version=None):
         if self._start_timer is not None:
             self._start_timer.cancel()
-        self._start_timer = threading.Timer(
-            delay, self._start_active, args=(data, version))
-        self._start_timer.start()
+        self._start_timer = self.scheduler.call_later(
+            delay, self._start_active, data, version)
 
     def _start_active(self, data, version):
         active = self.apps[self.PROTOCOL]
@@ -312,7 +325,8 @@ class Manager(net.layers.application.Application):
             t_r=self.T_R,
             t_tx=self.T_TX,
             w=self.W,
-            rx_max=self.RX_MAX)
+            rx_max=self.RX_MAX,
+            verbose=self.VERBOSE)
         self._send_pdu(ctrl, dest_addr=dest_addr)
 
     def _send_ack(self, dest_addr):
@@ -344,6 +358,8 @@ class Manager(net.layers.application.Application):
 
 
 def main(args):
+    if args.event_log is not None:
+        app.protocol.events.open_event_log(args.event_log)
     manager = Manager.create_and_run_application()
     manager.set_mode(args.mode)
     manager.set_nodes(args.nodes)
@@ -361,9 +377,15 @@ def main(args):
         t_r=args.t_r,
         t_tx=args.t_tx,
         w=args.w,
-        rx_max=args.rx_max)
+        rx_max=args.rx_max,
+        verbose=args.verbose)
     manager._update_ctrl_parameters(control_pdu)
 
+    # Serve the applications' and protocols' metrics for live monitoring.
+    if args.metrics_port is not None:
+        manager.register_metrics(utils.metrics.get_registry())
+        utils.metrics.serve(args.metrics_port)
+
     # Start.
     seed_data = args.file.read()
     args.file.close()
@@ -408,6 +430,8 @@ if __name__ == '__main__':
     config.add_argument('--t_tx', type=float, default=.2)
     config.add_argument('--w', type=int, default=10)
     config.add_argument('--rx_max', type=int, default=2)
+    config.add_argument('--verbose', action='store_true',
+                        help='Log each packet sent and received (for experiments).')
 
     # Deluge page/packet size
     deluge = parser.add_argument_group('Deluge Specific Configuration')
@@ -426,6 +450,11 @@ if __name__ == '__main__':
     network = parser.add_argument_group('Network Configuration')
     network.add_argument('-n', '--nodes', type=int, metavar='NODES', nargs='+',
                          help='The node ids of the nodes in the network.')
+    network.add_argument('--event-log', default=None,
+                         help='Log the PDUs of the protocols to this file, in binary '
+                              '(decode with app/protocol/events.py).')
+    network.add_argument('--metrics-port', type=int, default=None,
+                         help='Serve metrics on http://localhost:<port>/metrics.')
 
     args = parser.parse_args()
     main(args)
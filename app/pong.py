@@ -5,7 +5,6 @@ import net.layers.base
 import net.radio.xbeeradio
 import serial
 import struct
-import threading
 import time
 import utils.cli
 import utils.git
@@ -182,8 +181,7 @@ class Pong(net.layers.application.Application):
             self.nodes.remove(self.addr)
 
     def start_normal(self):
-        time.sleep(10)
-        self.send_time_req_delayed()
+        self.scheduler.call_later(10, self.send_time_req_delayed)
 
     def _handle_incoming_message(self, message, sender_addr):
         message = Message.from_string(message)
@@ -202,7 +200,7 @@ class Pong(net.layers.application.Application):
             self.send_topo_pong(sender_addr)
 
         if message.is_topo_pong() and message.recipient_addr == self.addr:
-            self.topo_pongs[(time.time(), sender_addr)] = sender_addr
+            self.topo_pongs[(self.scheduler.time(), sender_addr)] = sender_addr
 
         # Only set time in NORMAL mode.
         if message.is_time_set():
@@ -235,7 +233,7 @@ class Pong(net.layers.application.Application):
 
     def _get_neighbours(self):
         # Determine neighbours
-        curr_t = time.time()
+        curr_t = self.scheduler.time()
         for k in self.topo_pongs.keys():
             t, addr = k
             if (curr_t - t) > 1.5:
@@ -253,30 +251,28 @@ class Pong(net.layers.application.Application):
     def send_topo_res_delayed(self):
         if self._topo_res_timer is not None:
             self._topo_res_timer.cancel()
-        self._topo_res_timer = threading.Timer(.5, self.send_topo_res)
-        self._topo_res_timer.start()
+        # Wait for TOPO_PONG(s) to our TOPO_PING.
+        self._topo_res_timer = self.scheduler.call_later(1, self.send_topo_res)
 
     def send_topo_res(self):
-        time.sleep(.5)
         topo_res = Message.create_topo_res(self._get_neighbours())
         self._send_message(topo_res)
 
     def send_topo_flood_res_delayed(self):
         if self._topo_res_timer is not None:
             self._topo_res_timer.cancel()
-        self._topo_res_timer = threading.Timer(.5, self.send_topo_flood_res)
-        self._topo_res_timer.start()
+        # Wait for TOPO_PONG(s) to our TOPO_PING.
+        self._topo_res_timer = self.scheduler.call_later(
+            1, self.send_topo_flood_res)
 
     def send_topo_flood_res(self):
-        time.sleep(.5)
         topo_res = Message.create_topo_res(self._get_neighbours())
         self._send_message(topo_res, dest_addr=net.layers.base.FLOOD_ADDRESS)
 
     def send_time_req_delayed(self):
         if self._time_req_timer is not None:
             self._time_req_timer.cancel()
-        self._time_req_timer = threading.Timer(5, self.send_time_req)
-        self._time_req_timer.start()
+        self._time_req_timer = self.scheduler.call_later(5, self.send_time_req)
 
     def send_time_req(self):
         if self._time_is_set:
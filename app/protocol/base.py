@@ -1,19 +1,34 @@
+import net.layers.neighbours
 import Queue as queue
+import random
 import threading
 import utils.logger
+import utils.scheduler
 
 
 class Base(object):
     """Base class for a Data Dissemination Protocol."""
-    def __init__(self):
+    def __init__(self, seed=None):
         self._incoming = queue.Queue()
         self._outgoing = queue.Queue()
         self._init_logger()
 
-        # Check for outgoing data from apps.
-        t = threading.Thread(target=self._check_outgoing)
-        t.setDaemon(True)
-        t.start()
+        # Randomness of the protocol (eg. its timers), seed it to reproduce a
+        # run.
+        self.random = random.Random(seed)
+
+        # Runs the protocol's timers.
+        self.scheduler = utils.scheduler.get_scheduler()
+
+        # {addr: (prr, rssi)} of our neighbours, kept up to date by the app.
+        self.neighbours = {}
+
+        # Check for outgoing data from apps. A single threaded scheduler (eg.
+        # sim.engine.Engine) hands it to process_outgoing itself.
+        if not getattr(self.scheduler, 'SINGLE_THREADED', False):
+            t = threading.Thread(target=self._check_outgoing)
+            t.setDaemon(True)
+            t.start()
 
     def _init_logger(self):
         self.logger = utils.logger.get_logger(self.__class__.__name__)
@@ -34,6 +49,18 @@ class Base(object):
         raise NotImplementedError(
             "This should be overriden by subclasses.")
 
+    def set_neighbours(self, neighbours):
+        self.neighbours = neighbours
+
+    def get_best_neighbour(self, candidates):
+        """Returns the candidate we have the best link to, None if unknown."""
+        return net.layers.neighbours.best(self.neighbours, candidates)
+
+    def register_metrics(self, registry):
+        """Exposes the protocol's metrics in `registry` (a
+        `utils.metrics.Registry`)."""
+        pass
+
     def disseminate(self, data, version=None):
         self._outgoing.put((data, version))
 
@@ -43,6 +70,7 @@ class Base(object):
     def get_received_blocking(self):
         return self._incoming.get()
 
-    def _send(self, data):
+    def _send(self, data, is_data=False):
+        """Sends `data`, `is_data` if it is bulk data (eg. Deluge DATA)."""
         raise NotImplementedError(
             "This should be monkey patched by the app using this protocol.")
\ No newline at end of file
@@ -1,13 +1,12 @@
 import app.protocol.base
+import app.protocol.events
 import coding.message
-import datetime
+import collections
 import hashlib
+import logging
 import math
 import pickle
-import random
 import struct
-import threading
-import time
 import utils.pdu
 
 
@@ -30,6 +29,10 @@ class DelugePDU(utils.pdu.PDU):
     REQ_HEADER = "HII"
     REQ_HEADER_SIZE = struct.calcsize(REQ_HEADER)
 
+    # Address of each known completed node piggybacked on ADVs.
+    KNOWN_COMPLETED_FORMAT = "H"
+    KNOWN_COMPLETED_SIZE = struct.calcsize(KNOWN_COMPLETED_FORMAT)
+
     def _init_adv(self):
         self.version, self.largest_completed_page, self.total_pages = \
             struct.unpack(self.ADV_HEADER, self.message[:self.ADV_HEADER_SIZE])
@@ -38,7 +41,9 @@ class DelugePDU(utils.pdu.PDU):
         if known_completed == "":
             self.known_completed = []
         else:
-            self.known_completed = struct.unpack('B' * len(known_completed), known_completed)
+            count = len(known_completed) / self.KNOWN_COMPLETED_SIZE
+            self.known_completed = struct.unpack(
+                self.KNOWN_COMPLETED_FORMAT * count, known_completed)
 
     def _init_req(self):
         self.request_from, self.version, self.page_number = \
@@ -70,7 +75,8 @@ class DelugePDU(utils.pdu.PDU):
         data_hash = data_hash[:DATA_HASH_SIZE] if data_hash is not None else ("_" * DATA_HASH_SIZE)
         # Piggyback known completed neighbours in ADV.
         if known_completed is not None:
-            known_completed = struct.pack('B' * len(known_completed), *known_completed)
+            known_completed = struct.pack(
+                cls.KNOWN_COMPLETED_FORMAT * len(known_completed), *known_completed)
         else:
             known_completed = ""
         return cls(cls.ADV, header + data_hash + known_completed)
@@ -123,6 +129,10 @@ class Deluge(app.protocol.base.Base):
     # Time taken for a single frame to leave the node #send is called.
     FRAME_DELAY = .02
 
+    # Log each PDU sent and received, and why PDUs were suppressed (verbose,
+    # for experiments).
+    LOG_PACKETS = False
+
     # Classes to use
     PDU_CLS = DelugePDU
     STATE_CLS = DelugeState
@@ -144,6 +154,10 @@ class Deluge(app.protocol.base.Base):
         assert self.get_data() == data
         self.total_pages = len(self.complete_pages)
         self.set_data_hash(self.get_data())
+        now = self.scheduler.time()
+        self.version_time = now
+        self.page_completion_times = [now] * self.total_pages
+        self.completion_time = now
 
         # Only set inconsistent if version is greater than 1. The protocol is
         # started with v1 data so every node is in the "steady state" (also
@@ -183,6 +197,23 @@ class Deluge(app.protocol.base.Base):
     def set_data_hash(self, data):
         self.data_hash = hashlib.md5(data).hexdigest()
 
+    def is_completed(self):
+        """Returns True if we have every page of the current version."""
+        return self.total_pages != 0 and \
+            len(self.complete_pages) == self.total_pages
+
+    def _page_completed(self):
+        """Called when the next page is added to self.complete_pages."""
+        now = self.scheduler.time()
+        if self._page_seconds is not None:
+            previous = self.page_completion_times[-1] \
+                if self.page_completion_times else self.version_time
+            self._page_seconds.observe(now - previous)
+        self.page_completion_times.append(now)
+        if self.is_completed():
+            self.completion_time = now
+        self.check_if_completed()
+
     def check_if_completed(self):
         if len(self.complete_pages) == self.total_pages:
             data = self.get_data()
@@ -190,8 +221,8 @@ class Deluge(app.protocol.base.Base):
             self.received(data)
             self._known_completed.add(self.addr)
 
-    def __init__(self):
-        super(Deluge, self).__init__()
+    def __init__(self, seed=None):
+        super(Deluge, self).__init__(seed)
 
         # The current version
         self.version = 1
@@ -212,16 +243,48 @@ class Deluge(app.protocol.base.Base):
         self.complete_pages = []
         self.buffering_pages = {}
 
-        # Timers and threads
+        # When we heard of the current version, and when each page, and all of
+        # them, completed.
+        self.version_time = self.scheduler.time()
+        self.page_completion_times = []
+        self.completion_time = None
+
+        # Number of messages sent of each type, eg. {'ADV': 3}.
+        self.messages_sent = collections.Counter()
+
+        # Timers (handles from self.scheduler)
         self._send_adv_timer = None
         self._send_req_timer = None
+        self._send_data_timer = None
         self._next_round_timer = None
 
         self._stopped = False
         self._known_completed = set()
 
+        # Histogram of the seconds to complete each page, see register_metrics.
+        self._page_seconds = None
+
         self._reset_round_state()
 
+    def register_metrics(self, registry):
+        labels = {'addr': self.addr, 'protocol': self.__class__.__name__.lower()}
+        for pdu_type in self.PDU_CLS.TYPES:
+            registry.counter('xbns_protocol_messages_sent_total',
+                'Messages sent by the protocol.', type=pdu_type, **labels).set_function(
+                    lambda pdu_type=pdu_type: self.messages_sent[pdu_type])
+        registry.gauge('xbns_protocol_version',
+            'Version being disseminated.', **labels).set_function(
+                lambda: self.version)
+        registry.gauge('xbns_protocol_pages_completed',
+            'Pages of the version completed.', **labels).set_function(
+                lambda: len(self.complete_pages))
+        registry.gauge('xbns_protocol_pages_total',
+            'Pages of the version.', **labels).set_function(
+                lambda: self.total_pages)
+        self._page_seconds = registry.histogram('xbns_page_completion_seconds',
+            'Seconds to complete each page, since the previous one (or hearing '
+            'of the version).', **labels)
+
     def _reset_round_state(self):
         # The state of the protocols. Starts in the MAINTAIN state.
         self.state = self.STATE_CLS.MAINTAIN
@@ -254,11 +317,14 @@ class Deluge(app.protocol.base.Base):
         # from the MAINTAIN to the RX state.
         self._page_to_req = None
 
-        # The latest node that sent an ADV that fulfills the `_page_to_req`.
-        # Initially, when changing from MAINTAIN to RX, this is the node that
-        # triggered entry into the RX state.
+        # The node to send REQ to, picked from `_rx_candidates`.
         self._rx_source = None
 
+        # Nodes that sent an ADV that fulfills the `_page_to_req`. Initially,
+        # when changing from MAINTAIN to RX, this is the node that triggered
+        # entry into the RX state.
+        self._rx_candidates = set()
+
         # The number of REQ sent since entering the RX state.
         self._rx_num_sent = 0
 
@@ -281,14 +347,15 @@ class Deluge(app.protocol.base.Base):
             self._send_adv_timer.cancel()
         if self._send_req_timer is not None:
             self._send_req_timer.cancel()
+        if self._send_data_timer is not None:
+            self._send_data_timer.cancel()
         if self._next_round_timer is not None:
             self._next_round_timer.cancel()
 
     def _start_next_round(self, delay=0):
         self._stopped = False
         self._cancel_all_timers()
-        self._next_round_timer = threading.Timer(delay, self._round)
-        self._next_round_timer.start()
+        self._next_round_timer = self.scheduler.call_later(delay, self._round)
 
     def _set_inconsistent(self):
         self._inconsistent = True
@@ -324,16 +391,15 @@ class Deluge(app.protocol.base.Base):
         self._send_req_delayed()
 
     def _round_tx(self):
+        # The next round starts once all pending DATA is sent.
         self._send_data()
-        self._start_next_round(delay=0)
 
     def _send_adv_delayed(self):
         # Wait for a random amount of time (between self.t / 2 and self.t)
         rand_t = self._get_random_t_adv()
         if self._send_adv_timer is not None:
             self._send_adv_timer.cancel()
-        self._send_adv_timer = threading.Timer(rand_t, self._send_adv)
-        self._send_adv_timer.start()
+        self._send_adv_timer = self.scheduler.call_later(rand_t, self._send_adv)
 
     def _send_adv(self, force=False):
         # Only send ADV if during the current window, we overhear less than K
@@ -350,8 +416,7 @@ class Deluge(app.protocol.base.Base):
         rand_t = self._get_random_t_req()
         if self._send_req_timer is not None:
             self._send_req_timer.cancel()
-        self._send_req_timer = threading.Timer(rand_t, self._send_req)
-        self._send_req_timer.start()
+        self._send_req_timer = self.scheduler.call_later(rand_t, self._send_req)
 
     def _send_req(self):
         if self.req_and_data_overheard_buffer or \
@@ -359,6 +424,8 @@ class Deluge(app.protocol.base.Base):
             self._log("Suppressed REQ")
             return
         self._rx_num_sent += 1
+        # Link quality may have changed since the candidates were heard.
+        self._rx_source = self._get_best_rx_source(self._rx_source)
         self._send_pdu(self._create_req())
 
     def _create_req(self):
@@ -384,21 +451,29 @@ class Deluge(app.protocol.base.Base):
         self._rx_data_rate = 0
 
     def _send_data(self):
-        while len(self._pending_datas):
-            page, packet = self._pending_datas.pop()
-            data = self.PDU_CLS.create_data(
-                self.version, page, packet,
-                self.complete_pages[page][packet])
-            sent_data = self._send_pdu(data)
-            # NOTE: sleep for a short amount of time. (.2s per frame)
-            # Instead of getting an acknowledgement from the networking stack
-            # that the message has been sent.
-            time.sleep(math.ceil(len(sent_data) / 76.0) * self.FRAME_DELAY)
-        self._change_state(self.STATE_CLS.MAINTAIN)
+        # Send one DATA at a time, the next one is scheduled after it has had
+        # time to leave the node.
+        if not len(self._pending_datas):
+            self._change_state(self.STATE_CLS.MAINTAIN)
+            self._start_next_round(delay=0)
+            return
+        page, packet = self._pending_datas.pop()
+        data = self.PDU_CLS.create_data(
+            self.version, page, packet,
+            self.complete_pages[page][packet])
+        sent_data = self._send_pdu(data)
+        self._send_data_timer = self.scheduler.call_later(
+            self._get_frame_delay(sent_data), self._send_data)
+
+    def _get_frame_delay(self, sent_data):
+        # NOTE: wait for a short amount of time (FRAME_DELAY per frame)
+        # instead of getting an acknowledgement from the networking stack that
+        # the message has been sent.
+        return math.ceil(len(sent_data) / 76.0) * self.FRAME_DELAY
 
     def _handle_incoming_message(self, message, sender_addr):
         data_unit = self.PDU_CLS.from_string(message)
-        self._log_receive_pdu(data_unit, sender_addr)
+        self._log_receive_pdu(data_unit, sender_addr, message)
         if self._stopped:
             return
 
@@ -408,9 +483,12 @@ class Deluge(app.protocol.base.Base):
         if self.state == self.STATE_CLS.MAINTAIN and \
                 data_unit.version > self.version:
             self.version = data_unit.version
+            self.version_time = self.scheduler.time()
             self.buffering_pages = {}
             self.complete_pages = []
             self.total_pages = 0
+            self.page_completion_times = []
+            self.completion_time = None
             self._known_completed = set()
 
         # Record state regarding overheard REQ and DATA packets
@@ -418,10 +496,10 @@ class Deluge(app.protocol.base.Base):
             self.req_and_data_overheard += 1
         if data_unit.is_req() and \
                 data_unit.page_number < len(self.complete_pages):
-            self._last_req_packet_recieved = (datetime.datetime.now(), data_unit, sender_addr)
+            self._last_req_packet_recieved = (self.scheduler.time(), data_unit, sender_addr)
         if data_unit.is_data() and \
                 data_unit.page_number <= len(self.complete_pages):
-            self._last_data_packet_received = (datetime.datetime.now(), data_unit, sender_addr)
+            self._last_data_packet_received = (self.scheduler.time(), data_unit, sender_addr)
 
         if data_unit.is_adv():
             self._process_adv(data_unit, sender_addr)
@@ -446,7 +524,7 @@ class Deluge(app.protocol.base.Base):
             if self.state == self.STATE_CLS.RX and \
                     data_unit.version == self.version and \
                     data_unit.largest_completed_page > self._page_to_req:
-                self._rx_source = sender_addr
+                self._add_rx_candidate(sender_addr)
             return
 
         if data_unit.version == self.version and \
@@ -485,24 +563,24 @@ class Deluge(app.protocol.base.Base):
             # M5: transit to RX unless, a REQ for a page we can fulfill was
             # overheard within the last 2 rounds OR a DATA for a page we want/
             # can fulfil was overheard in the last round.
-            now = datetime.datetime.now()
-            overheard_data_recently = self._last_data_packet_received[0] and \
-                (now - self._last_data_packet_received[0]).total_seconds() <= self.t and \
+            now = self.scheduler.time()
+            overheard_data_recently = self._last_data_packet_received[0] is not None and \
+                (now - self._last_data_packet_received[0]) <= self.t and \
                 self._last_data_packet_received[1].version == self.version
-            overheard_req_recently = self._last_req_packet_recieved[0] and \
-                (now - self._last_req_packet_recieved[0]).total_seconds() <= (2 * self.t)
+            overheard_req_recently = self._last_req_packet_recieved[0] is not None and \
+                (now - self._last_req_packet_recieved[0]) <= (2 * self.t)
             if overheard_req_recently or overheard_data_recently:
-                self._log("SUPPRESS TRANSITION INTO RX. %s, %s" % (overheard_req_recently, overheard_data_recently))
+                self._log("SUPPRESS TRANSITION INTO RX. %s, %s",
+                          overheard_req_recently, overheard_data_recently)
                 # NOTE: For analysis on why suppression occurred.
-                import pprint
-                since_last_data = self._last_data_packet_received[0] and now - self._last_data_packet_received[0]
-                since_last_req = self._last_req_packet_recieved[0] and now - self._last_req_packet_recieved[0]
-                why_suppress = [
-                    'now', now, 't', self.t,
-                    'last_data', self._last_data_packet_received, since_last_data,
-                    'last_req', self._last_req_packet_recieved, since_last_req,
-                ]
-                pprint.pprint(why_suppress)
+                if self._is_logging_packets():
+                    since_last_data = self._last_data_packet_received[0] is not None and \
+                        now - self._last_data_packet_received[0]
+                    since_last_req = self._last_req_packet_recieved[0] is not None and \
+                        now - self._last_req_packet_recieved[0]
+                    self._log("Suppressed RX: last DATA %s (%s ago), last REQ %s (%s ago)",
+                              self._last_data_packet_received, since_last_data,
+                              self._last_req_packet_recieved, since_last_req)
             else:
                 self._enter_rx(sender_addr)
 
@@ -530,7 +608,7 @@ class Deluge(app.protocol.base.Base):
         # Remove from pending DATA if applicable.
         data_id = (data_unit.page_number, data_unit.packet_number)
         if data_id in self._pending_datas:
-            self._log("Suppressed DATA")
+            self._log_packet("Suppressed DATA")
             self._pending_datas.remove(data_id)
 
         # Store data if applicable.
@@ -551,7 +629,7 @@ class Deluge(app.protocol.base.Base):
         while next_page in self.buffering_pages and \
                 len(self.buffering_pages[next_page]) == self.PACKETS_PER_PAGE:
             self.complete_pages.append(self.buffering_pages[next_page])
-            self.check_if_completed()
+            self._page_completed()
             if self.state == self.STATE_CLS.RX and next_page == self._page_to_req:
                 self._exit_rx()
             del self.buffering_pages[next_page]
@@ -560,20 +638,33 @@ class Deluge(app.protocol.base.Base):
     def _enter_rx(self, rx_source):
         # Set the next page to be requested.
         self._page_to_req = len(self.complete_pages)
-        self._rx_source = rx_source
+        self._rx_candidates = set()
+        self._add_rx_candidate(rx_source)
         self._rx_num_sent = 0
         self._change_state(self.STATE_CLS.RX)
 
     def _exit_rx(self):
         self._page_to_req = None
         self._rx_source = None
+        self._rx_candidates = set()
         self._rx_num_sent = 0
         self._change_state(self.STATE_CLS.MAINTAIN)
 
+    def _add_rx_candidate(self, sender_addr):
+        self._rx_candidates.add(sender_addr)
+        self._rx_source = self._get_best_rx_source(sender_addr)
+
+    def _get_best_rx_source(self, default):
+        # Requesting from a lossy neighbour wastes the whole page transfer.
+        # Without link quality information, fall back to `default`.
+        best = self.get_best_neighbour(self._rx_candidates)
+        return default if best is None else best
+
     def _send_pdu(self, data_unit):
-        self._log_send_pdu(data_unit)
         string = data_unit.to_string()
-        self._send(string)
+        self._log_send_pdu(data_unit, string)
+        self.messages_sent[data_unit.type] += 1
+        self._send(string, data_unit.is_data())
         # Return the string being sent.
         return string
 
@@ -582,26 +673,46 @@ class Deluge(app.protocol.base.Base):
         self.state = new_state
         self.rounds_in_state = 0
 
-    def _log(self, message):
-        prefix = "(%2s, %5s, [v%s, %02d/%02d], %4s)" % \
-            (self.addr, self.state, self.version, len(self.complete_pages),
-                (self.total_pages or 0), self.t)
-        self.logger.info("%s - %s" % (prefix, message))
-
-    def _log_send_pdu(self, data_unit):
-        self._log("Sending message (%s): %s" % (len(data_unit.to_string()), repr(data_unit)))
+    def _log(self, message, *args):
+        """Logs `message % args` with the state of the protocol, formatted
+        only if INFO is enabled."""
+        if not self.logger.isEnabledFor(logging.INFO):
+            return
+        self.logger.info("(%2s, %5s, [v%s, %02d/%02d], %4s) - " + message,
+            self.addr, self.state, self.version, len(self.complete_pages),
+            (self.total_pages or 0), self.t, *args)
+
+    def _is_logging_packets(self):
+        return self.LOG_PACKETS and self.logger.isEnabledFor(logging.INFO)
+
+    def _log_packet(self, message, *args):
+        """Logs per packet detail, with LOG_PACKETS."""
+        if self._is_logging_packets():
+            self._log(message, *args)
+
+    def _log_send_pdu(self, data_unit, string):
+        event_log = app.protocol.events.get_event_log()
+        if event_log is not None:
+            event_log.record(self, app.protocol.events.SEND, data_unit, string)
+        else:
+            self._log_packet("Sending message (%s): %r", len(string), data_unit)
 
-    def _log_receive_pdu(self, data_unit, sender_addr):
-        self._log("Received message from %3s: %s" % (sender_addr, repr(data_unit)))
+    def _log_receive_pdu(self, data_unit, sender_addr, string):
+        event_log = app.protocol.events.get_event_log()
+        if event_log is not None:
+            event_log.record(self, app.protocol.events.RECEIVE, data_unit,
+                             string, sender_addr)
+        else:
+            self._log_packet("Received message from %3s: %r", sender_addr, data_unit)
 
     def _log_round(self):
-        self._log('Starting round %3s' % self.round_number)
+        self._log('Starting round %3s', self.round_number)
 
     def _log_change_state(self, new_state):
-        self._log("Changing state from %5s to %5s" % (self.state, new_state))
+        self._log("Changing state from %5s to %5s", self.state, new_state)
 
     def _get_random_t_adv(self):
-        return random.uniform(self.t / 2.0, self.t)
+        return self.random.uniform(self.t / 2.0, self.t)
 
     def _get_random_t_req(self):
-        return random.uniform(0, self.T_R)
+        return self.random.uniform(0, self.T_R)
@@ -0,0 +1,153 @@
+"""Binary log of the PDUs sent and received by the protocols.
+
+Logging each PDU as text (`Deluge._log`) formats a prefix and the repr of the
+PDU and writes it to stdout and a file on the receiving thread. Instead, with
+an event log open (`open_event_log`), each PDU is packed as a fixed size
+header followed by the PDU's header bytes (DATA packets without their data)
+and written to a file in batches by a background thread.
+
+The decoder rebuilds the PDUs and prints the text log lines, eg.
+
+    PYTHONPATH=. python app/protocol/events.py log/events-3.bin
+"""
+import argparse
+import atexit
+import collections
+import logging
+import struct
+import threading
+import time
+import utils.logger
+
+
+# timestamp, addr, protocol, event, state, version, completed pages,
+# total pages, t, size of the PDU, peer, size of the PDU bytes that follow.
+HEADER = "<dHBBBIHHfHHH"
+HEADER_SIZE = struct.calcsize(HEADER)
+
+# Events.
+SEND = 0
+RECEIVE = 1
+
+# Indices of the protocols and states in the records.
+PROTOCOLS = ['Deluge', 'RatelessDeluge']
+STATES = ['MAIN', 'RX', 'TX']
+_PROTOCOL_INDEX = dict((name, i) for i, name in enumerate(PROTOCOLS))
+_STATE_INDEX = dict((name, i) for i, name in enumerate(STATES))
+
+Event = collections.namedtuple('Event', [
+    'timestamp', 'addr', 'protocol', 'event', 'state', 'version',
+    'completed_pages', 'total_pages', 't', 'size', 'peer', 'pdu_string'])
+
+
+class EventLog(object):
+    """Packs events and writes them to `f` every FLUSH_INTERVAL seconds, on
+    a background thread."""
+
+    FLUSH_INTERVAL = 1
+
+    def __init__(self, f):
+        self._file = f
+        self._records = []
+        self._lock = threading.Lock()
+        t = threading.Thread(target=self._flush_periodically)
+        t.setDaemon(True)
+        t.start()
+
+    def record(self, protocol, event, data_unit, string, peer=0):
+        """Records `data_unit` (sent or received as `string`) by `protocol`."""
+        # DATA packets are logged without their data.
+        if data_unit.is_data():
+            pdu_string = string[:data_unit.HEADER_PREFIX_SIZE + data_unit.DATA_HEADER_SIZE]
+        else:
+            pdu_string = string
+        header = struct.pack(HEADER, utils.logger.now(), protocol.addr,
+            _PROTOCOL_INDEX[protocol.__class__.__name__], event,
+            _STATE_INDEX[protocol.state], protocol.version,
+            len(protocol.complete_pages), protocol.total_pages or 0,
+            protocol.t, len(string), peer, len(pdu_string))
+        with self._lock:
+            self._records.append(header + pdu_string)
+
+    def _flush_periodically(self):
+        while True:
+            time.sleep(self.FLUSH_INTERVAL)
+            self.flush()
+
+    def flush(self):
+        with self._lock:
+            records, self._records = self._records, []
+        if records:
+            self._file.write("".join(records))
+            self._file.flush()
+
+
+def read_events(f):
+    """Yields the `Event`s recorded in `f`."""
+    while True:
+        header = f.read(HEADER_SIZE)
+        if len(header) < HEADER_SIZE:
+            return
+        fields = struct.unpack(HEADER, header)
+        pdu_string = f.read(fields[-1])
+        yield Event(*(fields[:-1] + (pdu_string,)))
+
+
+def _get_pdu_classes():
+    import app.protocol.deluge
+    import app.protocol.rateless_deluge
+    return [app.protocol.deluge.DelugePDU,
+            app.protocol.rateless_deluge.RatelessDelugePDU]
+
+
+def format_event(event, pdu_classes=None):
+    """Returns the line `Deluge._log` logs for `event`."""
+    pdu_cls = (pdu_classes or _get_pdu_classes())[event.protocol]
+    # DATA packets are padded back to their size, with no data.
+    data_unit = pdu_cls.from_string(event.pdu_string.ljust(event.size, '\0'))
+    if event.event == SEND:
+        message = "Sending message (%s): %s" % (event.size, repr(data_unit))
+    else:
+        message = "Received message from %3s: %s" % (event.peer, repr(data_unit))
+    t = int(event.t) if event.t == int(event.t) else event.t
+    prefix = "(%2s, %5s, [v%s, %02d/%02d], %4s)" % \
+        (event.addr, STATES[event.state], event.version,
+            event.completed_pages, event.total_pages, t)
+    record = logging.LogRecord(PROTOCOLS[event.protocol], logging.INFO, '', 0,
+        "%s - %s" % (prefix, message), None, None)
+    record.created = event.timestamp
+    record.msecs = (record.created - int(record.created)) * 1000
+    return _formatter.format(record)
+
+
+_formatter = logging.Formatter(utils.logger.FORMAT)
+
+_event_log = None
+
+
+def get_event_log():
+    """Returns the event log of the process, None to log PDUs as text."""
+    return _event_log
+
+
+def open_event_log(path):
+    """Logs the PDUs of the protocols of the process to `path`."""
+    global _event_log
+    _event_log = EventLog(open(path, 'ab'))
+    atexit.register(_event_log.flush)
+    return _event_log
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Event log decoder.')
+    parser.add_argument('files', type=argparse.FileType('rb'), nargs='+',
+                        help='Event logs to decode, merged in order of time.')
+    args = parser.parse_args()
+
+    pdu_classes = _get_pdu_classes()
+    events = []
+    for f in args.files:
+        events.extend(read_events(f))
+    events.sort(key=lambda event: event.timestamp)
+    for event in events:
+        print format_event(event, pdu_classes)
@@ -2,8 +2,6 @@ import coding.ff
 import coding.message
 import deluge
 import itertools
-import math
-import random
 import struct
 import threading
 import time
@@ -66,6 +64,21 @@ class RatelessDeluge(deluge.Deluge):
 
     PENDING_DATAS_LOCK = threading.Lock()
 
+    # Buckets of the decode latency histogram, in seconds.
+    DECODE_BUCKETS = [.0001, .0005, .001, .005, .01, .05, .1, .5, 1]
+
+    def __init__(self, seed=None):
+        super(RatelessDeluge, self).__init__(seed)
+        # Histogram of the seconds to decode each page, see register_metrics.
+        self._decode_seconds = None
+
+    def register_metrics(self, registry):
+        super(RatelessDeluge, self).register_metrics(registry)
+        self._decode_seconds = registry.histogram('xbns_decode_seconds',
+            'Seconds to decode each page once enough packets were received.',
+            buckets=self.DECODE_BUCKETS, addr=self.addr,
+            protocol=self.__class__.__name__.lower())
+
     def _reset_round_state(self):
         super(RatelessDeluge, self)._reset_round_state()
 
@@ -110,15 +123,15 @@ class RatelessDeluge(deluge.Deluge):
 
     def _get_random_coeffs(self):
         m = coding.ff.Matrix()
-        m.add_row([random.randint(0, 255) for i in xrange(ROWS_REQUIRED)])
+        m.add_row([self.random.randint(0, 255) for i in xrange(ROWS_REQUIRED)])
         return m
 
-    def _send_data(self):
-        while True:
+    def _send_data(self, pages_to_send=None):
+        # Send one DATA at a time, the next one is scheduled after it has had
+        # time to leave the node.
+        if not pages_to_send:
             pages_to_send = set()
             with self.PENDING_DATAS_LOCK:
-                if len(self._pending_datas) == 0:
-                    break
                 # Send one packet per page.
                 for page, number_of_packets in self._pending_datas.items():
                     if number_of_packets <= 0:
@@ -126,20 +139,19 @@ class RatelessDeluge(deluge.Deluge):
                     else:
                         self._pending_datas[page] -= 1
                         pages_to_send.add(page)
+            if not pages_to_send:
+                self._change_state(self.STATE_CLS.MAINTAIN)
+                self._start_next_round(delay=0)
+                return
 
-            while len(pages_to_send) != 0:
-                page = pages_to_send.pop()
-                coeffs = self._get_random_coeffs()
-                coded_data = coeffs.dot(self.complete_pages[page])
-                data = self.PDU_CLS.create_data_packet(
-                    self.version, page, list(coeffs.iter_row(0)), list(coded_data.iter_row(0)))
-                sent_data = self._send_pdu(data)
-                # NOTE: sleep for a short amount of time. (.2s per frame)
-                # Instead of getting an acknowledgement from the networking stack
-                # that the message has been sent.
-                time.sleep(math.ceil(len(sent_data) / 76.0) * self.FRAME_DELAY)
-
-        self._change_state(self.STATE_CLS.MAINTAIN)
+        page = pages_to_send.pop()
+        coeffs = self._get_random_coeffs()
+        coded_data = coeffs.dot(self.complete_pages[page])
+        data = self.PDU_CLS.create_data_packet(
+            self.version, page, list(coeffs.iter_row(0)), list(coded_data.iter_row(0)))
+        sent_data = self._send_pdu(data)
+        self._send_data_timer = self.scheduler.call_later(
+            self._get_frame_delay(sent_data), self._send_data, pages_to_send)
 
     def _process_req(self, data_unit):
         # React to REQ, transit to TX state only if we have the requested page.
@@ -165,7 +177,7 @@ class RatelessDeluge(deluge.Deluge):
     def _process_data(self, data_unit):
         # Remove from pending DATA if applicable.
         if data_unit.page_number in self._pending_datas:
-            self.log("Suppressed DATA")
+            self._log_packet("Suppressed DATA")
             self._pending_datas[data_unit.page_number] -= 1
 
         # Store data if applicable.
@@ -182,12 +194,13 @@ class RatelessDeluge(deluge.Deluge):
         # the completed pages.
         next_page = len(self.complete_pages)
         while next_page in self.buffering_pages and self.buffering_pages[next_page].is_solved():
+            start = time.time()
             matrix = self.buffering_pages[next_page].solve()
+            if self._decode_seconds is not None:
+                self._decode_seconds.observe(time.time() - start)
             self.complete_pages.append(matrix)
-            self.check_if_completed()
+            self._page_completed()
             if self.state == self.STATE_CLS.RX and next_page == self._page_to_req:
-                self._rx_source = None
-                self._page_to_req = None
-                self._change_state(self.STATE_CLS.MAINTAIN)
+                self._exit_rx()
             del self.buffering_pages[next_page]
             next_page += 1
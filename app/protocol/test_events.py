@@ -0,0 +1,104 @@
+from nose.tools import eq_
+from nose.tools import ok_
+from events import *
+import app.protocol.deluge
+import app.protocol.rateless_deluge
+import logging
+import sim.engine
+import StringIO
+import utils.logger
+import utils.scheduler
+
+
+class _Lines(logging.Handler):
+    def __init__(self):
+        logging.Handler.__init__(self)
+        self.lines = []
+        self.setFormatter(logging.Formatter(utils.logger.FORMAT))
+        self.addFilter(utils.logger._ClockFilter())
+
+    def emit(self, record):
+        self.lines.append(self.format(record))
+
+
+def _check_decoded_as_logged(protocol_cls, data_units):
+    """Checks each data unit decodes to the line logged without the event
+    log."""
+    utils.scheduler.set_scheduler(sim.engine.Engine())
+    utils.logger.set_clock(lambda: 1426149497.096)
+    lines = _Lines()
+    protocol = protocol_cls()
+    protocol.addr = 3
+    protocol.LOG_PACKETS = True
+    protocol.logger.addHandler(lines)
+    try:
+        protocol.new_version(2, 'x' * 2000, start=False)
+        f = StringIO.StringIO()
+        event_log = EventLog(f)
+        for data_unit in data_units:
+            protocol._log_send_pdu(data_unit, data_unit.to_string())
+            protocol._log_receive_pdu(data_unit, 12, data_unit.to_string())
+            event_log.record(protocol, SEND, data_unit, data_unit.to_string())
+            event_log.record(protocol, RECEIVE, data_unit, data_unit.to_string(), 12)
+        event_log.flush()
+        f.seek(0)
+        eq_(2 * len(data_units), len(lines.lines))
+        eq_(lines.lines, [format_event(event) for event in read_events(f)])
+    finally:
+        protocol.logger.removeHandler(lines)
+        utils.scheduler.set_scheduler(None)
+        utils.logger.set_clock(None)
+
+
+def test_deluge_events():
+    pdu_cls = app.protocol.deluge.DelugePDU
+    _check_decoded_as_logged(app.protocol.deluge.Deluge, [
+        pdu_cls.create_adv(2, 1, 2, 'abcdefghij', [1, 7]),
+        pdu_cls.create_req(5, 2, 1, [0, 3, 16]),
+        pdu_cls.create_data(2, 1, 4, 'y' * 60),
+    ])
+
+
+def test_rateless_events():
+    pdu_cls = app.protocol.rateless_deluge.RatelessDelugePDU
+    _check_decoded_as_logged(app.protocol.rateless_deluge.RatelessDeluge, [
+        pdu_cls.create_adv(2, 0, 3, None),
+        pdu_cls.create_req_packet(5, 2, 1, 20),
+        pdu_cls.create_data_packet(2, 1, range(20), range(45)),
+    ])
+
+
+def test_data_is_not_recorded():
+    utils.scheduler.set_scheduler(sim.engine.Engine())
+    try:
+        protocol = app.protocol.deluge.Deluge()
+        protocol.addr = 3
+        f = StringIO.StringIO()
+        event_log = EventLog(f)
+        data_unit = app.protocol.deluge.DelugePDU.create_data(2, 1, 4, 'y' * 60)
+        event_log.record(protocol, SEND, data_unit, data_unit.to_string())
+        event_log.flush()
+        eq_(HEADER_SIZE + 1 + data_unit.DATA_HEADER_SIZE, len(f.getvalue()))
+        f.seek(0)
+        eq_(73, list(read_events(f))[0].size)
+    finally:
+        utils.scheduler.set_scheduler(None)
+
+
+def test_packets_are_logged_when_verbose():
+    utils.scheduler.set_scheduler(sim.engine.Engine())
+    lines = _Lines()
+    protocol = app.protocol.deluge.Deluge()
+    protocol.addr = 3
+    protocol.logger.addHandler(lines)
+    try:
+        data_unit = app.protocol.deluge.DelugePDU.create_data(2, 1, 4, 'y' * 60)
+        protocol._log_send_pdu(data_unit, data_unit.to_string())
+        eq_([], lines.lines)
+        protocol.LOG_PACKETS = True
+        protocol._log_send_pdu(data_unit, data_unit.to_string())
+        eq_(1, len(lines.lines))
+        ok_(lines.lines[0].endswith("Sending message (73): DATA,  1,  4"))
+    finally:
+        protocol.logger.removeHandler(lines)
+        utils.scheduler.set_scheduler(None)
@@ -0,0 +1,19 @@
+from nose.tools import eq_
+from manager import *
+import pickle
+
+
+def test_ctrl_verbose():
+    pdu = ManagerPDU.from_string(ManagerPDU.create_ctrl(verbose=True).to_string())
+    eq_(True, pdu.verbose)
+    eq_(2, pdu.rx_max)
+    eq_(False, ManagerPDU.create_ctrl().verbose)
+
+
+def test_ctrl_without_verbose():
+    # CTRL of managers before the verbose field.
+    message = pickle.dumps([Protocol.RATELESS, 1020, 60, 900, 45, 1, 1, 600,
+                            5, .02, .5, .2, 10, 2])
+    pdu = ManagerPDU(ManagerPDU.CTRL, message)
+    eq_(Protocol.RATELESS, pdu.protocol)
+    eq_(False, pdu.verbose)
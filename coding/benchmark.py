@@ -0,0 +1,223 @@
+"""Benchmarks of the coding primitives.
+
+Measures GF(256) arithmetic, row operations, `Matrix.dot`, encoding and
+decoding a page of network coded packets (with 10, 20 and 40 packets per page)
+and escaping/padding the messages of `data/*.in`. Results are written as JSON:
+
+    {<benchmark>: {"ops_per_sec": <calls per second>,
+                   "seconds_per_op": <seconds per call>}, ...}
+
+and compared against a baseline (the results of an earlier run, by default
+the committed `coding/benchmark_baseline.json`), failing when a benchmark got
+slower than the baseline by more than the tolerance. Timings depend on the
+machine, so write a new baseline before comparing on another one.
+
+eg.
+    python coding/benchmark.py --tolerance .2
+    python coding/benchmark.py --baseline '' -o coding/benchmark_baseline.json
+"""
+import argparse
+import glob
+import json
+import os
+import random
+import sys
+import time
+
+import ff
+import message
+
+
+# Packets per page of the page encode and decode benchmarks.
+PACKETS_PER_PAGE = [10, 20, 40]
+
+# Bytes of each packet of a page (as RatelessDeluge).
+PACKET_SIZE = 45
+
+# Results compared against by default.
+BASELINE = os.path.join(os.path.dirname(__file__), 'benchmark_baseline.json')
+
+
+def measure(func, min_time=.2, repeat=3):
+    """Returns the seconds a call of `func` takes (the best of `repeat` runs
+    of calls for at least `min_time` seconds)."""
+    best = None
+    for i in xrange(repeat):
+        calls = 0
+        start = time.time()
+        while True:
+            func()
+            calls += 1
+            elapsed = time.time() - start
+            if elapsed >= min_time:
+                break
+        seconds_per_op = elapsed / calls
+        best = seconds_per_op if best is None else min(best, seconds_per_op)
+    return best
+
+
+def _random_rows(rand, rows, cols):
+    return [[rand.randint(0, 255) for i in xrange(cols)] for j in xrange(rows)]
+
+
+def get_ff_benchmarks(rand):
+    pairs = [(rand.randint(0, 255), rand.randint(1, 255)) for i in xrange(1000)]
+    row = _random_rows(rand, 1, PACKET_SIZE)[0]
+    other_row = _random_rows(rand, 1, PACKET_SIZE)[0]
+    m = ff.Matrix([row[:]])
+
+    def mul():
+        for a, b in pairs:
+            ff.mul(a, b)
+
+    def div():
+        for a, b in pairs:
+            ff.div(a, b)
+
+    def div_row():
+        m.div_row(0, 3)
+
+    def sub_from_row():
+        m.sub_from_row(0, ff.Matrix.mul_values(other_row, 7))
+
+    return [
+        # 1000 operations per call.
+        ('ff_mul_1000', mul),
+        ('ff_div_1000', div),
+        ('ff_div_row', div_row),
+        ('ff_sub_from_row', sub_from_row),
+    ]
+
+
+def get_page_benchmarks(rand, packets_per_page):
+    page = ff.Matrix(_random_rows(rand, packets_per_page, PACKET_SIZE))
+    coeffs = ff.Matrix(_random_rows(rand, packets_per_page, packets_per_page))
+    packet_coeffs = ff.Matrix(_random_rows(rand, 1, packets_per_page))
+    # Spare packets in case some are not innovative.
+    spare_coeffs = ff.Matrix(_random_rows(rand, packets_per_page, packets_per_page))
+    all_coeffs = coeffs.rows + spare_coeffs.rows
+    coded = ff.Matrix([row[:] for row in all_coeffs]).dot(page).rows
+
+    def dot():
+        packet_coeffs.dot(page)
+
+    def encode():
+        coeffs.dot(page)
+
+    def decode():
+        g = ff.Gaussian()
+        for a, b in zip(all_coeffs, coded):
+            g.add_row(a, b)
+            if g.is_solved():
+                break
+        assert g.solve() == page
+
+    return [
+        ('matrix_dot_%s' % packets_per_page, dot),
+        ('page_encode_%s' % packets_per_page, encode),
+        ('page_decode_%s' % packets_per_page, decode),
+    ]
+
+
+def get_message_benchmarks(path):
+    name = os.path.basename(path)
+    with open(path) as f:
+        string = f.read()
+    int_array = message.Message.to_int_array(string)
+    escaped = message.Message.escape(int_array)
+    padded = message.Message.addpadding(escaped[:], len(escaped) + PACKET_SIZE)
+
+    def escape():
+        message.Message.escape(int_array)
+
+    def pad():
+        message.Message.addpadding(escaped[:], len(escaped) + PACKET_SIZE)
+
+    def unpad():
+        message.Message.unescape(
+            message.Message.removepadding(padded))
+
+    return [
+        ('message_escape_%s' % name, escape),
+        ('message_pad_%s' % name, pad),
+        ('message_unpad_%s' % name, unpad),
+    ]
+
+
+def get_benchmarks(data_files=None):
+    """Returns a list of (name, function) of the benchmarks."""
+    rand = random.Random(0)
+    benchmarks = get_ff_benchmarks(rand)
+    for packets_per_page in PACKETS_PER_PAGE:
+        benchmarks.extend(get_page_benchmarks(rand, packets_per_page))
+    if data_files is None:
+        data_files = sorted(glob.glob(
+            os.path.join(os.path.dirname(__file__), '..', 'data', '*.in')))
+    for path in data_files:
+        benchmarks.extend(get_message_benchmarks(path))
+    return benchmarks
+
+
+def run_benchmarks(benchmarks, min_time=.2, repeat=3):
+    results = {}
+    for name, func in benchmarks:
+        seconds_per_op = measure(func, min_time=min_time, repeat=repeat)
+        results[name] = {
+            'ops_per_sec': 1 / seconds_per_op if seconds_per_op else float('inf'),
+            'seconds_per_op': seconds_per_op,
+        }
+    return results
+
+
+def get_regressions(results, baseline, tolerance):
+    """Returns [(name, ops_per_sec, baseline ops_per_sec)] of the benchmarks
+    slower than their baseline by more than `tolerance` (a fraction)."""
+    regressions = []
+    for name, result in sorted(results.iteritems()):
+        if name not in baseline:
+            continue
+        expected = baseline[name]['ops_per_sec']
+        if result['ops_per_sec'] < expected * (1 - tolerance):
+            regressions.append((name, result['ops_per_sec'], expected))
+    return regressions
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Coding benchmarks')
+    parser.add_argument('--output', '-o', type=argparse.FileType('w'),
+                        default=None, help='File to write the results to (as JSON).')
+    parser.add_argument('--baseline', '-b', default=BASELINE,
+                        help='Results to compare against, defaults to %s '
+                        '(an empty string to skip the comparison).' % BASELINE)
+    parser.add_argument('--tolerance', '-t', type=float, default=.25,
+                        help='Fraction a benchmark may be slower than the baseline, defaults to .25.')
+    parser.add_argument('--min-time', type=float, default=.2,
+                        help='Seconds to call each benchmark for (3 times), defaults to .2.')
+    parser.add_argument('--filter', '-k', default='',
+                        help='Only run benchmarks with this in their name.')
+    args = parser.parse_args()
+    if args.baseline and not os.path.exists(args.baseline):
+        parser.error("baseline %s not found, write one with "
+                     "--baseline '' -o %s" % (args.baseline, args.baseline))
+
+    benchmarks = [(name, func) for name, func in get_benchmarks()
+                  if args.filter in name]
+    results = run_benchmarks(benchmarks, min_time=args.min_time)
+    for name, func in benchmarks:
+        print "%-32s %12.1f ops/s %10.3f ms" % (
+            name, results[name]['ops_per_sec'],
+            results[name]['seconds_per_op'] * 1000)
+    if args.output:
+        json.dump(results, args.output, indent=2, sort_keys=True,
+                  separators=(',', ': '))
+        args.output.close()
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = get_regressions(results, baseline, args.tolerance)
+        for name, ops_per_sec, expected in regressions:
+            print "REGRESSION %s: %.1f ops/s, baseline %.1f ops/s" % (
+                name, ops_per_sec, expected)
+        if regressions:
+            sys.exit(1)
@@ -0,0 +1,32 @@
+from nose.tools import eq_
+from nose.tools import ok_
+from benchmark import *
+import random
+
+
+def test_run_benchmarks():
+    benchmarks = get_page_benchmarks(random.Random(0), 10)
+    results = run_benchmarks(benchmarks, min_time=0, repeat=1)
+    eq_(['matrix_dot_10', 'page_decode_10', 'page_encode_10'], sorted(results))
+    for result in results.itervalues():
+        ok_(result['ops_per_sec'] > 0)
+
+
+def test_get_regressions():
+    baseline = {
+        'a': {'ops_per_sec': 100},
+        'b': {'ops_per_sec': 100},
+        'c': {'ops_per_sec': 100},
+    }
+    results = {
+        'a': {'ops_per_sec': 80},
+        'b': {'ops_per_sec': 70},
+        'd': {'ops_per_sec': 1},
+    }
+    eq_([('b', 70, 100)], get_regressions(results, baseline, .25))
+
+
+def test_baseline_covers_benchmarks():
+    with open(BASELINE) as f:
+        baseline = json.load(f)
+    eq_(sorted(name for name, func in get_benchmarks()), sorted(baseline))
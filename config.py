@@ -33,5 +33,9 @@ def get_log_file_name():
 
 SHOULD_LOG = True
 
+# Write logs from a background thread (see utils.logger.AsyncHandler) instead
+# of the thread logging.
+ASYNC_LOGGING = True
+
 
 LOG_FILE_NAME = get_log_file_name()
\ No newline at end of file
@@ -0,0 +1,173 @@
+"""Measures the links between the nodes of a testbed run from its logs.
+
+Every message a node sent ("Sending message") is matched with the same
+message received from it by each of its neighbours ("Received message from")
+within a time window, giving the sequence of frames each link delivered and
+lost. Prints the delivery ratio and loss bursts of every link and writes
+the links (with their sequences) as JSON, replayed by the simulator with
+`python sim/main.py --link-trace links.json`.
+
+The protocols only log these lines with `--verbose`. Runs with `--event-log`
+log binary events instead, decode them to text first, eg.
+
+    PYTHONPATH=. python app/protocol/events.py log/events-*.bin > log/events.log
+    python log/links.py log/events.log
+
+    {"links": [{"sender": 1, "dest": 2, "sent": 100, "received": 90,
+                "prr": .9, "mean_burst": 1.5, "p": .06, "r": .67,
+                "trace": "1101..."}, ...]}
+"""
+import argparse
+import collections
+import datetime
+import json
+import sys
+import tabulate
+
+from utils import get_log_lines
+from utils import sync_timings
+
+
+def get_messages(lines):
+    """Returns the messages sent and received in `lines`.
+
+    ({sender: [(timestamp, key)]}, {(sender, dest): [(timestamp, key)]}), a
+    message's key is the protocol logging it and its repr.
+    """
+    sent = collections.defaultdict(list)
+    received = collections.defaultdict(list)
+    for l in lines:
+        if l.pdu_repr is None:
+            continue
+        key = (l.protocol, l.pdu_repr.strip())
+        if "Sending message" in l.pdu:
+            sent[l.addr].append((l.timestamp, key))
+        else:
+            received[(l.pdu_source_addr, l.addr)].append((l.timestamp, key))
+    return sent, received
+
+
+def get_spans(lines):
+    """Returns {addr: (first, last)} timestamps of each node's logs."""
+    spans = {}
+    for l in lines:
+        if l.addr is None:
+            continue
+        first, last = spans.get(l.addr, (l.timestamp, l.timestamp))
+        spans[l.addr] = (min(first, l.timestamp), max(last, l.timestamp))
+    return spans
+
+
+def match_messages(sent, received, window):
+    """Returns a list of True (delivered) or False (lost) for each message of
+    `sent`, the messages of `received` are matched at most once.
+
+    A sent message is delivered if the same message was received no more than
+    `window` (a timedelta) before or after it, the clocks of the nodes are
+    not exactly in sync.
+    """
+    pending = collections.defaultdict(collections.deque)
+    for timestamp, key in received:
+        pending[key].append(timestamp)
+    outcomes = []
+    for timestamp, key in sent:
+        timestamps = pending[key]
+        while timestamps and timestamps[0] < timestamp - window:
+            timestamps.popleft()
+        delivered = bool(timestamps) and timestamps[0] <= timestamp + window
+        if delivered:
+            timestamps.popleft()
+        outcomes.append(delivered)
+    return outcomes
+
+
+def get_link_stats(outcomes):
+    """Returns the statistics of a link delivering `outcomes`.
+
+    `p` and `r` fit a Gilbert-Elliott channel losing every frame in the bad
+    state: the probability of losing a frame after a delivered one and of
+    delivering a frame after a lost one.
+    """
+    sent = len(outcomes)
+    received = sum(outcomes)
+    bursts = []
+    for i, delivered in enumerate(outcomes):
+        if delivered:
+            continue
+        if i > 0 and not outcomes[i - 1]:
+            bursts[-1] += 1
+        else:
+            bursts.append(1)
+    transitions = collections.Counter(zip(outcomes, outcomes[1:]))
+    after_delivered = transitions[(True, True)] + transitions[(True, False)]
+    after_lost = transitions[(False, False)] + transitions[(False, True)]
+    return {
+        'sent': sent,
+        'received': received,
+        'prr': float(received) / sent if sent else 0,
+        'mean_burst': float(sum(bursts)) / len(bursts) if bursts else 0,
+        'p': float(transitions[(True, False)]) / after_delivered
+             if after_delivered else 0,
+        'r': float(transitions[(False, True)]) / after_lost
+             if after_lost else 1,
+        'trace': ''.join('1' if delivered else '0' for delivered in outcomes),
+    }
+
+
+def get_links(lines, window):
+    """Returns the stats of each link (a node hearing another at least once)."""
+    sent, received = get_messages(lines)
+    spans = get_spans(lines)
+    links = []
+    for (sender, dest), messages in sorted(received.iteritems()):
+        if sender not in sent or sender == dest:
+            continue
+        # Only the messages sent while the receiver was running.
+        first, last = spans[dest]
+        sender_messages = [m for m in sent[sender]
+                           if first - window <= m[0] <= last + window]
+        if not sender_messages:
+            continue
+        link = get_link_stats(match_messages(sender_messages, messages, window))
+        link['sender'] = sender
+        link['dest'] = dest
+        links.append(link)
+    return links
+
+
+def pprint_links(links):
+    headers = ['Link', 'Sent', 'Received', 'PRR', 'Mean burst', 'p', 'r']
+    rows = []
+    for link in links:
+        rows.append([
+            '%s -> %s' % (link['sender'], link['dest']), link['sent'],
+            link['received'], '%.3f' % link['prr'],
+            '%.2f' % link['mean_burst'], '%.3f' % link['p'], '%.3f' % link['r']])
+    print tabulate.tabulate(rows, headers=headers, numalign="right", stralign="right")
+
+
+def main(args):
+    lines = get_log_lines(args.files)
+    if args.c:
+        lines = sync_timings(lines)
+    if not any(get_messages(lines)):
+        sys.exit("No messages found, run the nodes with --verbose (or decode "
+                 "their event logs with app/protocol/events.py).")
+    links = get_links(lines, datetime.timedelta(seconds=args.window))
+    pprint_links(links)
+    if args.output:
+        json.dump({'links': links}, args.output, sort_keys=True)
+        args.output.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Link Quality from Logfiles')
+    parser.add_argument('files', metavar='LOGFILE', nargs='+',
+                        type=argparse.FileType('r'), help="Logfiles to parse.")
+    parser.add_argument('-o', '--output', type=argparse.FileType('w'),
+                        help="Write the links to file (as JSON).")
+    parser.add_argument('-w', '--window', type=float, default=1,
+                        help="Seconds between a message being sent and received, defaults to 1.")
+    parser.add_argument('-c', action='store_true', help="Attempt to sync timings from multiple logfiles.")
+    args = parser.parse_args()
+    main(args)
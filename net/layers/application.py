@@ -1,10 +1,13 @@
 import base
+import pickle
 import Queue as queue
 import sock.reader
 import sock.writer
 import socket
+import threading
 import time
 import transport
+import utils.scheduler
 
 
 class Application(base.BaseLayer):
@@ -15,10 +18,21 @@ class Application(base.BaseLayer):
 
         self._outgoing_queue = None
 
+        # Runs the application's timers.
+        self.scheduler = utils.scheduler.get_scheduler()
+
+        # Latest {addr: (prr, rssi)} of our neighbours, see request_neighbours.
+        self.neighbours = {}
+
+        # Messages dropped rather than blocking the scheduler thread.
+        self.dropped_sends = 0
+
     def set_outgoing_queue(self, queue):
         self._outgoing_queue = queue
 
-    def _send(self, data, dest_port=None, dest_addr=None):
+    def _send(self, data, dest_port=None, dest_addr=None, is_data=False):
+        """Sends `data`, `is_data` if it is bulk data that may be dropped when
+        the radio falls behind (control messages are never dropped)."""
         source_port = self.ADDRESS[1]
         source_addr = self.addr
         # Default to source port is not specified.
@@ -27,7 +41,19 @@ class Application(base.BaseLayer):
         dest_addr = dest_addr or base.BROADCAST_ADDRESS
         transport_pdu = transport.TransportPDU(
             data, source_port, source_addr, dest_port, dest_addr)
-        self._outgoing_queue.put(transport_pdu.to_string())
+        metadata = {'data': True} if is_data else {}
+        envelope = transport.LocalEnvelope(transport_pdu.to_string(), metadata)
+        if threading.current_thread() is not self.scheduler:
+            self._outgoing_queue.put(envelope.to_string())
+            return
+        # The timers of every application and protocol run on the scheduler
+        # thread, which must not wait for a backed up stack. The message is
+        # dropped instead, protocols send again on a later round.
+        try:
+            self._outgoing_queue.put(envelope.to_string(), block=False)
+        except queue.Full:
+            self.dropped_sends += 1
+            self.logger.warning("Stack backed up, dropped message to %s" % dest_addr)
 
     def get_incoming_socket_reader(self):
         # Lazily create socket reader.
@@ -43,10 +69,31 @@ class Application(base.BaseLayer):
             self._socket_reader.start()
         return self._socket_reader
 
+    def request_neighbours(self):
+        """Asks the Transport layer for the link quality of our neighbours."""
+        self._send("", dest_port=transport.NEIGHBOURS_PORT, dest_addr=self.addr)
+
+    def _is_neighbours_reply(self, transport_pdu):
+        return transport_pdu.source_port == transport.NEIGHBOURS_PORT and \
+            transport_pdu.source_addr == self.addr
+
+    def _handle_neighbours(self, neighbours):
+        self.neighbours = neighbours
+
     def _handle_incoming(self, data):
-        transport_pdu = transport.TransportPDU.from_string(data)
+        envelope = transport.LocalEnvelope.from_string(data)
+        transport_pdu = transport.TransportPDU.from_string(envelope.data)
+        if self._is_neighbours_reply(transport_pdu):
+            self._handle_neighbours(pickle.loads(transport_pdu.message))
+            return
+        self._handle_incoming_metadata(transport_pdu, envelope.metadata)
         self._handle_incoming_message(transport_pdu.message, transport_pdu.source_addr)
 
+    def _handle_incoming_metadata(self, transport_pdu, metadata):
+        """Called with the metadata (eg. rssi, timestamp, broadcast and
+        sender_addr) of each message, before it is handled."""
+        pass
+
     def _handle_incoming_message(self, message, sender_addr):
         self.log("Received %s from %s" % (message, sender_addr))
 
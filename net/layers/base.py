@@ -1,5 +1,9 @@
 import Queue as queue
+import json
+import stats
 import threading
+import time
+import utils.boundedqueue
 import utils.logger
 
 # 65535 => \xff\xff
@@ -14,16 +18,36 @@ class BaseLayer(object):
         self._init_logger()
         self.addr = addr
 
+        # Map of name => queue owned by this layer.
+        self._queues = {}
+
+        # Messages, bytes and time spent handling data from the layer below
+        # (incoming) and above (outgoing).
+        self.stats = {
+            'incoming': stats.HandlerStats(),
+            'outgoing': stats.HandlerStats(),
+        }
+
     def _init_logger(self):
         # Each layer has a logger that logs to the console.
         self.logger = utils.logger.get_logger(self.__class__.__name__)
         self.logger.info("Starting up.")
 
     def start_handling_incoming(self, queue):
-        self._start_handler(queue, self._handle_incoming)
+        self._start_handler(queue, self.get_incoming_handler())
 
     def start_handling_outgoing(self, queue):
-        self._start_handler(queue, self._handle_outgoing)
+        self._start_handler(queue, self.get_outgoing_handler())
+
+    def get_incoming_handler(self):
+        """Returns the handler of data from the layer below, recording it in
+        the stats."""
+        return self.stats['incoming'].wrap(self._handle_incoming)
+
+    def get_outgoing_handler(self):
+        """Returns the handler of data from the layer above, recording it in
+        the stats."""
+        return self.stats['outgoing'].wrap(self._handle_outgoing)
 
     def _start_handler(self, queue, handler):
         t = threading.Thread(target=self._handler, args=(queue, handler))
@@ -35,6 +59,53 @@ class BaseLayer(object):
             data = queue.get()
             handler(data)
 
+    def _create_queue(self, name, maxsize,
+            policy=utils.boundedqueue.Policy.BLOCK, is_droppable=None):
+        q = utils.boundedqueue.BoundedQueue(
+            maxsize, policy=policy, is_droppable=is_droppable)
+        self._queues[name] = q
+        return q
+
+    def get_queue_stats(self):
+        return dict((name, q.get_stats()) for name, q in self._queues.iteritems())
+
+    def get_stats(self):
+        """Returns the stats of the layer's handlers and queues."""
+        return {
+            'layer': self.__class__.__name__,
+            'addr': self.addr,
+            'time': time.time(),
+            'incoming': self.stats['incoming'].get_stats(),
+            'outgoing': self.stats['outgoing'].get_stats(),
+            'queues': self.get_queue_stats(),
+        }
+
+    def register_metrics(self, registry):
+        """Exposes the stats of the handlers and queue depths in `registry`
+        (a `utils.metrics.Registry`), read when it is collected."""
+        layer = self.__class__.__name__.lower()
+        for direction, handler_stats in self.stats.iteritems():
+            labels = {'addr': self.addr, 'layer': layer, 'direction': direction}
+            registry.counter('xbns_layer_messages_total',
+                'Messages handled by the layer.', **labels).set_function(
+                    lambda s=handler_stats: s.messages)
+            registry.counter('xbns_layer_bytes_total',
+                'Bytes handled by the layer.', **labels).set_function(
+                    lambda s=handler_stats: s.bytes)
+            registry.counter('xbns_layer_busy_seconds_total',
+                'Seconds spent handling messages.', **labels).set_function(
+                    lambda s=handler_stats: s.busy_time)
+        for name, q in self._queues.iteritems():
+            registry.gauge('xbns_queue_depth', 'Items waiting in the queue.',
+                addr=self.addr, layer=layer, queue=name).set_function(q.qsize)
+            registry.counter('xbns_queue_dropped_total', 'Items dropped by the queue.',
+                addr=self.addr, layer=layer, queue=name).set_function(
+                    lambda q=q: q.dropped)
+
+    def log_stats(self):
+        """Logs the stats as a single JSON record."""
+        self.logger.info("Stats: %s" % json.dumps(self.get_stats(), sort_keys=True))
+
     def get_outgoing_queue(self):
         # From this layer to a lower layer.
         raise NotImplementedError
@@ -1,6 +1,14 @@
 import base
-import Queue as queue
+import duplicates
+import flooding
+import neighbours
+import random
+import reassembly
+import routing
 import struct
+import threading
+import utils.boundedqueue
+import utils.scheduler
 
 
 class DataLinkPDU(object):
@@ -18,12 +26,30 @@ class DataLinkPDU(object):
     # I: unsigned int, 4 bytes.
     HEADER_SIZE = struct.calcsize(HEADER_FORMAT) # 16 bytes
 
+    # Offset of the ttl in the header.
+    TTL_OFFSET = struct.calcsize("HHB")
+
+    # Set in the ttl byte of frames carrying bulk data (eg. Deluge DATA), the
+    # first to be dropped when the radio falls behind. Other frames are
+    # control traffic.
+    DATA_FLAG = 0x80
+
     # Max payload size: 100
     # Source: http://www.digi.com/support/kbase/kbaseresultdetl?id=3345
     MAX_DATA_SIZE = 100 - HEADER_SIZE
 
+    # Message ids are from 1 - MAX_MESSAGE_ID.
+    MAX_MESSAGE_ID = 255
+
+    # Limits on a single message.
+    MAX_TOTAL_SIZE = 2**32 - 1
+    MAX_PIECES = 2**32
+
+    # Whether the next hop is sent along, otherwise every node forwards.
+    HAS_NEXT_HOP = False
+
     def __init__(self, source_addr, dest_addr, message_id, ttl, total_size,
-            piece_no, chunk):
+            piece_no, chunk, next_hop=base.BROADCAST_ADDRESS, is_data=False):
         self.source_addr = source_addr
         self.dest_addr = dest_addr
         self.message_id = message_id
@@ -31,19 +57,65 @@ class DataLinkPDU(object):
         self.piece_no = piece_no
         self.chunk = chunk
         self.ttl = ttl
+        # Node that should forward the packet, BROADCAST_ADDRESS for any node.
+        self.next_hop = next_hop
+        self.is_data = is_data
+
+    def _get_header(self):
+        ttl = self.ttl | self.DATA_FLAG if self.is_data else self.ttl
+        return (self.source_addr, self.dest_addr,
+                self.message_id, ttl,
+                self.total_size, self.piece_no)
 
     def to_string(self):
-        header = struct.pack(
-            self.HEADER_FORMAT,
-            self.source_addr, self.dest_addr,
-            self.message_id, self.ttl,
-            self.total_size, self.piece_no)
+        header = struct.pack(self.HEADER_FORMAT, *self._get_header())
         return header + self.chunk
 
     @classmethod
     def from_string(cls, data):
         x = struct.unpack(cls.HEADER_FORMAT, data[:cls.HEADER_SIZE])
-        return DataLinkPDU(x[0], x[1], x[2], x[3], x[4], x[5], data[cls.HEADER_SIZE:])
+        return cls(x[0], x[1], x[2], x[3] & ~cls.DATA_FLAG, x[4], x[5],
+                   data[cls.HEADER_SIZE:], *x[6:],
+                   is_data=bool(x[3] & cls.DATA_FLAG))
+
+    @classmethod
+    def is_data_frame(cls, data):
+        """Returns whether the frame `data` carries bulk data, without
+        unpacking the header."""
+        return bool(ord(data[cls.TTL_OFFSET]) & cls.DATA_FLAG)
+
+
+class CompactDataLinkPDU(DataLinkPDU):
+    """DataLinkPDU with a smaller header, 16-bit message ids and a next hop.
+
+    Leaves more room for the payload in each frame and lets message ids wrap
+    far less often. Unicast packets are only forwarded by their next hop.
+    Every node in the network must use the same header.
+    """
+    # source_addr: H
+    # dest_addr: H
+    # message_id: H
+    # ttl: B
+    # total_size: H
+    # piece_number: B
+    # next_hop: H
+    # Standard sizes, no alignment padding.
+    HEADER_FORMAT = "<HHHBHBH"
+    HEADER_SIZE = struct.calcsize(HEADER_FORMAT) # 12 bytes
+
+    TTL_OFFSET = struct.calcsize("<HHH")
+
+    MAX_DATA_SIZE = 100 - HEADER_SIZE
+
+    MAX_MESSAGE_ID = 2**16 - 1
+
+    MAX_TOTAL_SIZE = 2**16 - 1
+    MAX_PIECES = 2**8
+
+    HAS_NEXT_HOP = True
+
+    def _get_header(self):
+        return super(CompactDataLinkPDU, self)._get_header() + (self.next_hop,)
 
 
 class DataLink(base.BaseLayer):
@@ -51,25 +123,98 @@ class DataLink(base.BaseLayer):
 
     - Converts variable sized data into fixed sized packets.
     - Forwards packets along the network.
+    - Learns routes from overheard packets, unicast packets are only forwarded
+      by the next hop towards their destination (if the PDU_CLS carries it).
     """
-    def __init__(self, addr, ttl=5, buffer_window=10):
+
+    # Reassembled messages waiting for the Transport layer.
+    INCOMING_QUEUE_SIZE = 64
+
+    # Frames waiting for the Physical layer. Data frames (see
+    # DataLinkPDU.DATA_FLAG) are dropped (oldest first) when the radio falls
+    # behind, control frames are never dropped and block their producer
+    # instead.
+    OUTGOING_QUEUE_SIZE = 128
+
+    PDU_CLS = DataLinkPDU
+
+    # Duplicates are recognised for messages sent within the last
+    # DUPLICATE_HORIZON seconds by a source sending MESSAGE_RATE messages per
+    # second, bounded by a quarter of the message id space: ids up to half the
+    # id space ahead are new messages after wrapping around, ids further
+    # behind than that are a source that restarted its message ids. A source
+    # not heard for DUPLICATE_HORIZON seconds is forgotten too.
+    MESSAGE_RATE = 10
+    DUPLICATE_HORIZON = 30
+
+    # Pieces remembered per message in the duplicate filter.
+    PIECES_PER_MESSAGE = 4
+
+    # Rebroadcast suppression for each class of forwarded packets. Every node
+    # rebroadcasting every flooded packet wastes airtime in dense networks.
+    FORWARD_POLICIES = {
+        flooding.FLOOD: flooding.ForwardPolicy(
+            flooding.Suppression.COUNTER, k=3, max_delay=.1),
+        flooding.UNICAST: flooding.ForwardPolicy(flooding.Suppression.NONE),
+    }
+
+    # Seconds before a route that was not heard again expires.
+    ROUTE_TIMEOUT = 60
+
+    def __init__(self, addr, ttl=5, reassembly_timeout=30, pdu_cls=None,
+                 seed=None):
         super(DataLink, self).__init__(addr)
         self.last_message_id = 0
 
+        # Wire format, eg. CompactDataLinkPDU for 16-bit message ids.
+        self.PDU_CLS = pdu_cls or self.PDU_CLS
+
         # Maximum number of hops to forward a message.
         self.ttl = ttl
 
-        # Buffer of pieces: buffer[source_addr][message_id][piece_no]
-        self.buffer = {}
+        # Randomness of the forwarding decisions, seed it to reproduce a run.
+        self.random = random.Random(seed)
+
+        # Runs the assessment delays, and keeps the time.
+        self.scheduler = utils.scheduler.get_scheduler()
+        clock = self.scheduler.time
 
-        # Number of previous messages to keep around.
-        self.buffer_window = buffer_window
+        # Recently seen pieces, including those not intended for us.
+        id_space = self.PDU_CLS.MAX_MESSAGE_ID
+        window = min(self.MESSAGE_RATE * self.DUPLICATE_HORIZON, id_space / 4)
+        self.duplicates = duplicates.DuplicateCache(
+            size=window * self.PIECES_PER_MESSAGE,
+            id_space=id_space, window=window,
+            horizon=self.DUPLICATE_HORIZON, clock=clock)
+
+        # Pieces of messages intended for us waiting to be reassembled.
+        self.reassembly = reassembly.ReassemblyTable(
+            reassembly_timeout, clock=clock)
+
+        # Next hop towards other nodes.
+        self.routes = routing.RoutingTable(self.ROUTE_TIMEOUT, clock=clock)
+
+        # Link quality of the nodes we hear directly.
+        self.neighbours = neighbours.NeighbourTable(
+            id_space=id_space, clock=clock)
+
+        # Forwarded packets waiting for their assessment delay to pass:
+        # (source_addr, message_id, piece_no) =>
+        #     [copies overheard, data_unit, timer]
+        self._pending_forwards = {}
+        self._pending_forwards_lock = threading.Lock()
+        self.forwarded = 0
+        self.forwards_suppressed = 0
 
         # From this layer to a higher layer.
-        self._incoming_queue = queue.Queue()
+        self._incoming_queue = self._create_queue(
+            'incoming', self.INCOMING_QUEUE_SIZE)
 
         # From this layer to a lower layer.
-        self._outgoing_queue = queue.Queue()
+        self._outgoing_queue = self._create_queue(
+            'outgoing', self.OUTGOING_QUEUE_SIZE,
+            policy=utils.boundedqueue.Policy.DROP_OLDEST,
+            is_droppable=self.PDU_CLS.is_data_frame)
 
     def get_outgoing_queue(self):
         return self._outgoing_queue
@@ -80,55 +225,82 @@ class DataLink(base.BaseLayer):
     def _handle_incoming(self, args):
         # NOTE: Sender is the node that sent the packet we are receiving.
         # Source is the node where the packet originated from.
+        # Expect tuple of (data, sender_addr[, metadata]) from Physical layer.
         try:
-            data, sender_addr = args
-            data_unit = DataLinkPDU.from_string(data)
+            data, sender_addr = args[:2]
+            data_unit = self.PDU_CLS.from_string(data)
         except Exception as e:
             self.logger.error(str(e))
             return
+        metadata = args[2] if len(args) > 2 else {}
+
+        # Message ids are only in sequence for packets the sender originated.
+        own_message = data_unit.source_addr == sender_addr
+        self.neighbours.heard(sender_addr, metadata.get('rssi'),
+            data_unit.message_id if own_message else None)
 
         # Ignore packet if we are the source
         if self.addr == data_unit.source_addr:
             return
 
+        # We can hear the sender directly.
+        self.routes.learn(sender_addr, sender_addr, 1)
+
         # Ignore packet if we've already received it.
-        source_addr = data_unit.source_addr
-        m_id = data_unit.message_id
-        p_no = data_unit.piece_no
-        if source_addr not in self.buffer:
-            self.buffer[source_addr] = {}
-        if m_id not in self.buffer[source_addr]:
-            self.buffer[source_addr][m_id] = {}
-        if p_no in self.buffer[source_addr][m_id]:
+        piece_key = (data_unit.message_id, data_unit.piece_no)
+        if self.duplicates.check_and_add(data_unit.source_addr, piece_key):
+            self._overheard_forward(data_unit)
             return
 
+        # The first copy of a packet came in along a route back to its source.
+        hops = max(self.ttl - data_unit.ttl + 1, 1)
+        self.routes.learn(data_unit.source_addr, sender_addr, hops)
+
         self._maybe_forward_data(data_unit)
-        self._maybe_buffer_incoming(data_unit)
+        self._maybe_buffer_incoming(
+            data_unit, dict(metadata, sender_addr=sender_addr))
 
     def _handle_outgoing(self, args):
-        # Expect tuple of (data, dest_addr) from Transport layer.
-        data, dest_addr = args
-        message_id = self.get_next_message_id()
+        # Expect tuple of (data, dest_addr[, is_data]) from Transport layer.
+        data, dest_addr = args[:2]
+        is_data = args[2] if len(args) > 2 else False
         total_size = len(data)
-        for piece_no, chunk in enumerate(self._chunk_data(data)):
-            data_unit = DataLinkPDU(
+        chunks = self._chunk_data(data)
+        if total_size > self.PDU_CLS.MAX_TOTAL_SIZE or \
+                len(chunks) > self.PDU_CLS.MAX_PIECES:
+            self.logger.error("Message too large, dropped: %s bytes" % total_size)
+            return
+        message_id = self.get_next_message_id()
+        next_hop = self._get_next_hop(dest_addr)
+        for piece_no, chunk in enumerate(chunks):
+            data_unit = self.PDU_CLS(
                 self.addr, dest_addr, message_id, self.ttl,
-                total_size, piece_no, chunk)
+                total_size, piece_no, chunk, next_hop, is_data)
             self._outgoing_queue.put(data_unit.to_string())
 
     def get_next_message_id(self):
-        # restrict message id to be from 1 - 255
-        self.last_message_id = (self.last_message_id % 255) + 1
+        # restrict message id to be from 1 - MAX_MESSAGE_ID
+        self.last_message_id = \
+            (self.last_message_id % self.PDU_CLS.MAX_MESSAGE_ID) + 1
         return self.last_message_id
 
+    def _get_next_hop(self, dest_addr):
+        # Without a known route, every node that hears the packet forwards it.
+        if not self.PDU_CLS.HAS_NEXT_HOP or \
+                dest_addr == base.BROADCAST_ADDRESS or \
+                dest_addr == base.FLOOD_ADDRESS:
+            return base.BROADCAST_ADDRESS
+        next_hop = self.routes.get_next_hop(dest_addr)
+        return base.BROADCAST_ADDRESS if next_hop is None else next_hop
+
     def _chunk_data(self, data):
         """Chunk data into lengths no greater than MAX_DATA_SIZE."""
         chunks = []
         current_idx = 0
         while current_idx < len(data):
-            chunk = data[current_idx:current_idx + DataLinkPDU.MAX_DATA_SIZE]
+            chunk = data[current_idx:current_idx + self.PDU_CLS.MAX_DATA_SIZE]
             chunks.append(chunk)
-            current_idx += DataLinkPDU.MAX_DATA_SIZE
+            current_idx += self.PDU_CLS.MAX_DATA_SIZE
         return chunks
 
     def _maybe_forward_data(self, data_unit):
@@ -140,45 +312,69 @@ class DataLink(base.BaseLayer):
         # Do not forward if ttl is less than 1.
         if data_unit.ttl <= 0:
             return
+        # Do not forward if another node is the next hop.
+        if data_unit.next_hop != base.BROADCAST_ADDRESS and \
+                data_unit.next_hop != self.addr:
+            return
 
-        # Forward packet.
         data_unit.ttl -= 1
+        data_unit.next_hop = self._get_next_hop(data_unit.dest_addr)
+        policy = self._get_forward_policy(data_unit)
+        if policy.suppression == flooding.Suppression.PROBABILISTIC:
+            if self.random.random() < policy.p:
+                self._forward(data_unit)
+            else:
+                self.forwards_suppressed += 1
+        elif policy.suppression == flooding.Suppression.COUNTER:
+            key = self._get_forward_key(data_unit)
+            with self._pending_forwards_lock:
+                timer = self.scheduler.call_later(
+                    self.random.uniform(0, policy.max_delay),
+                    self._assess_forward, key, policy)
+                self._pending_forwards[key] = [1, data_unit, timer]
+        else:
+            self._forward(data_unit)
+
+    def _get_forward_policy(self, data_unit):
+        if data_unit.dest_addr == base.FLOOD_ADDRESS:
+            return self.FORWARD_POLICIES[flooding.FLOOD]
+        return self.FORWARD_POLICIES[flooding.UNICAST]
+
+    def _get_forward_key(self, data_unit):
+        return (data_unit.source_addr, data_unit.message_id, data_unit.piece_no)
+
+    def _overheard_forward(self, data_unit):
+        # Count copies of a packet we are waiting to forward.
+        with self._pending_forwards_lock:
+            pending = self._pending_forwards.get(self._get_forward_key(data_unit))
+            if pending is not None:
+                pending[0] += 1
+
+    def _assess_forward(self, key, policy):
+        with self._pending_forwards_lock:
+            pending = self._pending_forwards.pop(key, None)
+        if pending is None:
+            return
+        copies_overheard, data_unit, timer = pending
+        timer.cancel()
+        if copies_overheard < policy.k:
+            self._forward(data_unit)
+        else:
+            self.forwards_suppressed += 1
+
+    def _forward(self, data_unit):
+        self.forwarded += 1
         self._outgoing_queue.put(data_unit.to_string())
 
-    def _maybe_buffer_incoming(self, data_unit):
+    def _maybe_buffer_incoming(self, data_unit, metadata):
         # Only buffer packets that are intended for us.
         if data_unit.dest_addr != base.BROADCAST_ADDRESS and \
                 data_unit.dest_addr != self.addr and \
                 data_unit.dest_addr != base.FLOOD_ADDRESS:
             return
 
-        source_addr = data_unit.source_addr
-        m_id = data_unit.message_id
-        p_no = data_unit.piece_no
-        self.buffer[source_addr][m_id][p_no] = data_unit.chunk
-        buffered_chunks = self.buffer[source_addr][m_id]
-
-        size = sum((len(x) for x in buffered_chunks.values()))
-        if size == data_unit.total_size:
-            keys = sorted(buffered_chunks.keys())
-            data = "".join(buffered_chunks[x] for x in keys)
-            self._incoming_queue.put(data)
-
-            # clear buffer
-            self._clear_buffer(source_addr, m_id)
-
-    def _clear_buffer(self, source_addr, message_id):
-        # Remove all messages older than (source_addr, message_id - 10)
-        min_m_id = (message_id - self.buffer_window) % 255
-        max_m_id = (message_id + self.buffer_window) % 255
-        for m_id in self.buffer[source_addr].keys():
-            if min_m_id < max_m_id:
-                if min_m_id <= m_id <= max_m_id:
-                    continue
-            elif min_m_id > max_m_id:
-                if min_m_id <= m_id:
-                    continue
-                elif m_id <= max_m_id:
-                    continue
-            del self.buffer[source_addr][m_id]
-
+        data = self.reassembly.add(data_unit)
+        if data is not None:
+            # Transport layer expects tuple of (data, metadata), the metadata
+            # of the piece that completed the message.
+            self._incoming_queue.put((data, metadata))
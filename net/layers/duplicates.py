@@ -0,0 +1,88 @@
+import collections
+import time
+
+
+class DuplicateCache(object):
+    """Remembers the most recently seen packets from each source.
+
+    Packets are identified by a key of (message_id, piece_no). Each source
+    keeps a fixed-size ring of its latest keys alongside a set for O(1)
+    membership checks, and only the `max_sources` most recently active sources
+    are remembered, so memory stays bounded on long running nodes.
+
+    Message ids wrap around within `id_space`, so only the last `window`
+    message ids of a source are remembered: keys older than that are forgotten
+    (the id may be reused).
+
+    A source that restarts counts its message ids from the start again, so a
+    source is forgotten when a message id at least `window` behind its newest
+    id arrives (too old to be a late copy), or when it was not heard for
+    `horizon` seconds (eg. it restarted less than `window` messages in).
+    """
+
+    def __init__(self, size=512, max_sources=256, id_space=255, window=126,
+                 horizon=30, clock=time.time):
+        assert window < id_space / 2
+        # Number of keys remembered per source.
+        self.size = size
+        # Number of sources remembered.
+        self.max_sources = max_sources
+        self.id_space = id_space
+        self.window = window
+        self.horizon = horizon
+        # Time used when none is given.
+        self.clock = clock
+        # source_addr =>
+        #     [deque of keys oldest first, set of keys, newest id, last heard]
+        self._sources = collections.OrderedDict()
+
+    def __contains__(self, source_and_key):
+        source_addr, key = source_and_key
+        entry = self._sources.get(source_addr)
+        return entry is not None and key in entry[1]
+
+    def _age(self, newest_id, message_id):
+        """Number of message ids `message_id` is behind `newest_id`.
+
+        Negative if `message_id` is ahead of `newest_id`.
+        """
+        age = (newest_id - message_id) % self.id_space
+        if age > self.id_space / 2:
+            age -= self.id_space
+        return age
+
+    def check_and_add(self, source_addr, key, now=None):
+        """Records `key` for `source_addr`, returns True if already seen."""
+        now = self.clock() if now is None else now
+        message_id = key[0]
+        entry = self._sources.pop(source_addr, None)
+        if entry is not None and (now - entry[3] > self.horizon or \
+                self._age(entry[2], message_id) >= self.window):
+            # The source may have restarted its message ids.
+            entry = None
+        if entry is None:
+            entry = [collections.deque(), set(), message_id, now]
+            if len(self._sources) >= self.max_sources:
+                # Forget the least recently active source.
+                self._sources.popitem(last=False)
+        # (Re)insert to mark the source as the most recently active.
+        self._sources[source_addr] = entry
+        entry[3] = now
+
+        ring, keys, newest_id, _ = entry
+        if key in keys:
+            return True
+
+        if self._age(newest_id, message_id) < 0:
+            # Slide the window forward, forgetting ids that fall out of it.
+            entry[2] = newest_id = message_id
+            while ring and self._age(newest_id, ring[0][0]) >= self.window:
+                keys.discard(ring.popleft())
+        if len(ring) >= self.size:
+            keys.discard(ring.popleft())
+        ring.append(key)
+        keys.add(key)
+        return False
+
+    def __len__(self):
+        return sum(len(entry[1]) for entry in self._sources.itervalues())
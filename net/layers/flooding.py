@@ -0,0 +1,31 @@
+# Destination classes a ForwardPolicy can be configured for.
+FLOOD = 'flood'        # Packets sent to FLOOD_ADDRESS.
+UNICAST = 'unicast'    # Packets sent to a single node.
+
+
+class Suppression(object):
+    """Rebroadcast suppression schemes for forwarded packets."""
+    # Always rebroadcast.
+    NONE = 'NONE'
+    # Wait a random assessment delay, rebroadcast only if less than `k` copies
+    # of the packet (including the first) were overheard in the meantime.
+    COUNTER = 'COUNTER'
+    # Rebroadcast with probability `p`.
+    PROBABILISTIC = 'PROBABILISTIC'
+
+
+class ForwardPolicy(object):
+    """How DataLink decides whether to rebroadcast a packet it forwards."""
+
+    def __init__(self, suppression=Suppression.NONE, k=3, p=.65, max_delay=.1):
+        self.suppression = suppression
+        # COUNTER: threshold of overheard copies.
+        self.k = k
+        # PROBABILISTIC: probability of rebroadcasting.
+        self.p = p
+        # COUNTER: the assessment delay is uniform in [0, max_delay] seconds.
+        self.max_delay = max_delay
+
+    def __repr__(self):
+        return "ForwardPolicy(%s, k=%s, p=%s, max_delay=%s)" % \
+            (self.suppression, self.k, self.p, self.max_delay)
@@ -0,0 +1,146 @@
+import collections
+import threading
+import time
+
+
+def best(neighbours, candidates):
+    """Returns the candidate with the best link in `neighbours`.
+
+    `neighbours` is a snapshot from `NeighbourTable.get_neighbours`. Links are
+    ranked by packet reception ratio, then RSSI. Returns None if none of the
+    candidates are known neighbours.
+    """
+    known = [addr for addr in candidates if addr in neighbours]
+    if not known:
+        return None
+    def rank(addr):
+        prr, rssi = neighbours[addr]
+        return (prr, rssi if rssi is not None else float('-inf'))
+    return max(known, key=rank)
+
+
+class Neighbour(object):
+    __slots__ = ['last_message_id', 'received', 'expected', 'prr', 'rssi',
+                 'last_heard']
+
+    def __init__(self, now):
+        # Id of the latest message the neighbour sent itself.
+        self.last_message_id = None
+        # Messages received and expected in the current estimation window.
+        self.received = 0
+        self.expected = 0
+        # Packet reception ratio, None until the first window completes.
+        self.prr = None
+        # Received signal strength in dBm, None if the radio does not say.
+        self.rssi = None
+        self.last_heard = now
+
+    def get_prr(self):
+        if self.prr is not None:
+            return self.prr
+        if self.expected == 0:
+            return 1.0
+        return self.received / float(self.expected)
+
+
+class NeighbourTable(object):
+    """Link quality of the nodes we hear directly.
+
+    The packet reception ratio of a neighbour is estimated from the gaps in the
+    ids of the messages it sends itself (every node's own messages are heard
+    by all its neighbours): every `window` expected messages, the ratio of
+    messages received is folded into an exponentially weighted moving average.
+    RSSI is smoothed the same way on every frame. Neighbours not heard from in
+    `timeout` seconds are forgotten.
+
+    Updated by the DataLink layer and read by the Transport layer, so access is
+    synchronised.
+    """
+
+    def __init__(self, id_space=255, window=16, alpha=.4, rssi_alpha=.25,
+                 timeout=60, max_neighbours=64, clock=time.time):
+        self.id_space = id_space
+        self.window = window
+        self.alpha = alpha
+        self.rssi_alpha = rssi_alpha
+        self.timeout = timeout
+        self.max_neighbours = max_neighbours
+        # Time used when none is given.
+        self.clock = clock
+        # addr => Neighbour, least recently heard first.
+        self._neighbours = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._neighbours)
+
+    def __contains__(self, addr):
+        return addr in self._neighbours
+
+    def heard(self, addr, rssi=None, message_id=None, now=None):
+        """Records a frame sent by `addr`.
+
+        `message_id` is given if `addr` is the source of the message.
+        """
+        now = self.clock() if now is None else now
+        with self._lock:
+            self._heard(addr, rssi, message_id, now)
+
+    def _heard(self, addr, rssi, message_id, now):
+        neighbour = self._neighbours.pop(addr, None)
+        if neighbour is None or now - neighbour.last_heard >= self.timeout:
+            neighbour = Neighbour(now)
+            if len(self._neighbours) >= self.max_neighbours:
+                self._neighbours.popitem(last=False)
+        self._neighbours[addr] = neighbour
+        neighbour.last_heard = now
+
+        if rssi is not None:
+            if neighbour.rssi is None:
+                neighbour.rssi = float(rssi)
+            else:
+                neighbour.rssi += self.rssi_alpha * (rssi - neighbour.rssi)
+
+        if message_id is not None:
+            self._update_prr(neighbour, message_id)
+
+    def _update_prr(self, neighbour, message_id):
+        if neighbour.last_message_id is None:
+            neighbour.last_message_id = message_id
+            neighbour.received += 1
+            neighbour.expected += 1
+            return
+        gap = (message_id - neighbour.last_message_id) % self.id_space
+        # Another piece of the same message, or an old message.
+        if gap == 0 or gap > self.id_space / 2:
+            return
+        neighbour.last_message_id = message_id
+        neighbour.received += 1
+        # A long silence says little about the link, eg. a reboot.
+        neighbour.expected += min(gap, self.window)
+        if neighbour.expected >= self.window:
+            ratio = neighbour.received / float(neighbour.expected)
+            if neighbour.prr is None:
+                neighbour.prr = ratio
+            else:
+                neighbour.prr += self.alpha * (ratio - neighbour.prr)
+            neighbour.received = 0
+            neighbour.expected = 0
+
+    def _expire(self, now):
+        while self._neighbours:
+            addr, neighbour = next(self._neighbours.iteritems())
+            if now - neighbour.last_heard < self.timeout:
+                break
+            del self._neighbours[addr]
+
+    def get_neighbours(self, now=None):
+        """Returns {addr: (prr, rssi)} of the neighbours heard recently."""
+        now = self.clock() if now is None else now
+        with self._lock:
+            self._expire(now)
+            return dict((addr, (neighbour.get_prr(), neighbour.rssi))
+                for addr, neighbour in self._neighbours.iteritems())
+
+    def best(self, candidates, now=None):
+        return best(self.get_neighbours(now), candidates)
@@ -1,14 +1,24 @@
 import base
-import Queue as queue
+import stats
 import threading
+import time
+import utils.boundedqueue
 
 
 class Physical(base.BaseLayer):
     """Physical layer, interfaces with a Radio."""
+
+    # Frames received from the radio waiting for the DataLink layer. The radio
+    # listener must never block (the xbee keeps sending frames regardless), so
+    # the oldest frames are dropped when the DataLink layer falls behind.
+    INCOMING_QUEUE_SIZE = 128
+
     def __init__(self, addr, radio):
         super(Physical, self).__init__(addr);
         self.radio = radio
-        self._incoming_queue = queue.Queue()
+        self._incoming_queue = self._create_queue(
+            'incoming', self.INCOMING_QUEUE_SIZE,
+            policy=utils.boundedqueue.Policy.DROP_OLDEST)
 
     def start_listen_to_radio(self):
         listen_to_radio = threading.Thread(target=self._listen_to_radio)
@@ -16,12 +26,25 @@ class Physical(base.BaseLayer):
         listen_to_radio.start()
 
     def _listen_to_radio(self):
+        handle_frame = self.get_frame_handler()
         while True:
-            data = self.radio.receive()
-            if data[0] == self.radio.TYPE_RX:
-                self._incoming_queue.put(data[1:])
-            elif data[0] == self.radio.TYPE_OTHERS:
-                self.logger.info(data)
+            handle_frame(self.radio.receive())
+
+    def get_frame_handler(self):
+        """Returns the handler of frames from the radio, recording them in the
+        incoming stats."""
+        return self.stats['incoming'].wrap(
+            self._handle_frame, size=lambda frame: stats.get_size(frame[1]))
+
+    def _handle_frame(self, data):
+        if data[0] == self.radio.TYPE_RX:
+            # DataLink layer expects tuple of (data, sender_addr, metadata).
+            # The radio's dict is left as it is.
+            metadata = dict(data[3]) if len(data) > 3 else {}
+            metadata.setdefault('timestamp', time.time())
+            self._incoming_queue.put((data[1], data[2], metadata))
+        elif data[0] == self.radio.TYPE_OTHERS:
+            self.logger.info(data)
 
     def get_incoming_queue(self):
         return self._incoming_queue
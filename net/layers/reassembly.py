@@ -0,0 +1,121 @@
+import collections
+import time
+import utils.timerwheel
+
+
+class PartialMessage(object):
+    """The pieces received so far of a message being reassembled."""
+    __slots__ = ['total_size', 'chunks', 'bitmap', 'received_bytes', 'timer']
+
+    def __init__(self, total_size):
+        self.total_size = total_size
+        # piece_no => chunk
+        self.chunks = {}
+        # Bit `piece_no` is set once the piece has been received.
+        self.bitmap = 0
+        self.received_bytes = 0
+        # Timer evicting the message when it expires.
+        self.timer = None
+
+    def has_piece(self, piece_no):
+        return bool(self.bitmap & (1 << piece_no))
+
+    def add_piece(self, piece_no, chunk):
+        self.chunks[piece_no] = chunk
+        self.bitmap |= 1 << piece_no
+        self.received_bytes += len(chunk)
+
+    def is_complete(self):
+        return self.received_bytes >= self.total_size
+
+    def get_data(self):
+        return "".join(self.chunks[x] for x in sorted(self.chunks.keys()))
+
+
+class ReassemblyTable(object):
+    """Buffers the pieces of messages until they can be reassembled.
+
+    Partial messages that have not received a new piece for `timeout` seconds
+    are evicted by a timer wheel, advanced whenever a piece is added. At most
+    `max_messages` partial messages are kept, the oldest is evicted first.
+    """
+
+    def __init__(self, timeout=30, max_messages=256, clock=time.time):
+        self.timeout = timeout
+        # Time used when none is given.
+        self.clock = clock
+        self.max_messages = max_messages
+        # (source_addr, message_id) => PartialMessage, oldest first.
+        self._messages = collections.OrderedDict()
+        # Created on first use, starting from the time given to `add`.
+        self._wheel = None
+
+        # Counters
+        self.completed = 0
+        self.evicted = 0
+        self.evicted_bytes = 0
+        self.duplicate_pieces = 0
+
+    def __len__(self):
+        return len(self._messages)
+
+    def __contains__(self, message_key):
+        return message_key in self._messages
+
+    def add(self, data_unit, now=None):
+        """Buffers the piece in `data_unit`.
+
+        Returns the reassembled message once all its pieces are buffered,
+        otherwise None.
+        """
+        now = self.clock() if now is None else now
+        self.expire(now)
+
+        message_key = (data_unit.source_addr, data_unit.message_id)
+        message = self._messages.pop(message_key, None)
+        if message is None:
+            message = PartialMessage(data_unit.total_size)
+        else:
+            message.timer.cancel()
+
+        if message.has_piece(data_unit.piece_no):
+            self.duplicate_pieces += 1
+        else:
+            message.add_piece(data_unit.piece_no, data_unit.chunk)
+
+        if message.is_complete():
+            self.completed += 1
+            return message.get_data()
+
+        # (Re-)insert as the most recently active message.
+        message.timer = self._wheel.schedule(
+            now + self.timeout, self._evict, message_key)
+        self._messages[message_key] = message
+        if len(self._messages) > self.max_messages:
+            self._evict(next(self._messages.iterkeys()))
+        return None
+
+    def expire(self, now=None):
+        """Evicts partial messages past their deadline."""
+        now = self.clock() if now is None else now
+        if self._wheel is None:
+            self._wheel = utils.timerwheel.TimerWheel(
+                tick=max(self.timeout / 64.0, .01), slots=128, now=now)
+        self._wheel.advance(now)
+
+    def _evict(self, message_key):
+        message = self._messages.pop(message_key, None)
+        if message is None:
+            return
+        message.timer.cancel()
+        self.evicted += 1
+        self.evicted_bytes += message.received_bytes
+
+    def get_stats(self):
+        return {
+            'incomplete': len(self._messages),
+            'completed': self.completed,
+            'evicted': self.evicted,
+            'evicted_bytes': self.evicted_bytes,
+            'duplicate_pieces': self.duplicate_pieces,
+        }
@@ -0,0 +1,59 @@
+import time
+
+
+class Route(object):
+    __slots__ = ['next_hop', 'hops', 'expires']
+
+    def __init__(self, next_hop, hops, expires):
+        self.next_hop = next_hop
+        self.hops = hops
+        self.expires = expires
+
+    def __repr__(self):
+        return "Route(next_hop=%s, hops=%s)" % (self.next_hop, self.hops)
+
+
+class RoutingTable(object):
+    """Next hop towards each destination, learnt from overheard traffic.
+
+    Nodes we hear directly are neighbours (1 hop). A packet from `source`
+    relayed to us by `sender` after `hops` hops is a route back to `source` via
+    `sender` (reverse path learning), floods teach every node a route back to
+    the node that flooded. Routes not refreshed within `timeout` seconds
+    expire, a shorter (or as short) route replaces the current one.
+    """
+
+    def __init__(self, timeout=60, clock=time.time):
+        self.timeout = timeout
+        # Time used when none is given.
+        self.clock = clock
+        # dest_addr => Route
+        self._routes = {}
+
+    def __len__(self):
+        return len(self._routes)
+
+    def learn(self, dest_addr, next_hop, hops, now=None):
+        now = self.clock() if now is None else now
+        route = self._routes.get(dest_addr)
+        if route is None or route.expires <= now or hops <= route.hops or \
+                route.next_hop == next_hop:
+            self._routes[dest_addr] = Route(next_hop, hops, now + self.timeout)
+
+    def get_next_hop(self, dest_addr, now=None):
+        """Returns the next hop towards `dest_addr`, None if unknown."""
+        now = self.clock() if now is None else now
+        route = self._routes.get(dest_addr)
+        if route is None:
+            return None
+        if route.expires <= now:
+            del self._routes[dest_addr]
+            return None
+        return route.next_hop
+
+    def get_routes(self, now=None):
+        """Returns {dest_addr: (next_hop, hops)} of the routes not expired."""
+        now = self.clock() if now is None else now
+        return dict((dest_addr, (route.next_hop, route.hops))
+            for dest_addr, route in self._routes.iteritems()
+            if route.expires > now)
@@ -0,0 +1,61 @@
+import threading
+import time
+
+
+def get_size(data):
+    """Returns the bytes of data handed between layers.
+
+    Layers hand each other strings or tuples of (string, ...) (eg. (data,
+    dest_addr) or (data, sender_addr, metadata)).
+    """
+    if isinstance(data, tuple):
+        data = data[0] if data else ''
+    return len(data) if isinstance(data, str) else 0
+
+
+class HandlerStats(object):
+    """Messages, bytes and time spent in a layer's handler of one direction.
+
+    Times are wall clock seconds (`time.time`, the clock the rest of the stack
+    uses), so throughput is over the time since the stats were created.
+    """
+
+    def __init__(self, clock=time.time):
+        self.clock = clock
+        self.start_time = clock()
+        self.messages = 0
+        self.bytes = 0
+        # Seconds spent in the handler, in total and for the slowest message.
+        self.busy_time = 0.0
+        self.max_time = 0.0
+        self._lock = threading.Lock()
+
+    def record(self, size, seconds):
+        with self._lock:
+            self.messages += 1
+            self.bytes += size
+            self.busy_time += seconds
+            self.max_time = max(self.max_time, seconds)
+
+    def wrap(self, handler, size=get_size):
+        """Returns `handler`, recording each call in the stats (`size`
+        returns the bytes of the data it is called with)."""
+        def instrumented(data):
+            start = self.clock()
+            try:
+                return handler(data)
+            finally:
+                self.record(size(data), self.clock() - start)
+        return instrumented
+
+    def get_stats(self):
+        with self._lock:
+            elapsed = self.clock() - self.start_time
+            return {
+                'messages': self.messages,
+                'bytes': self.bytes,
+                'busy_time': self.busy_time,
+                'max_time': self.max_time,
+                'mean_time': self.busy_time / self.messages if self.messages else 0,
+                'bytes_per_sec': self.bytes / elapsed if elapsed > 0 else 0,
+            }
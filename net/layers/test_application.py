@@ -0,0 +1,25 @@
+from nose.tools import eq_
+from nose.tools import ok_
+import application
+import threading
+import utils.boundedqueue
+import utils.scheduler
+
+
+def test_should_drop_sends_from_scheduler_when_backed_up():
+    scheduler = utils.scheduler.Scheduler()
+    scheduler.start()
+    utils.scheduler.set_scheduler(scheduler)
+    try:
+        app = application.Application(1)
+        app.set_outgoing_queue(utils.boundedqueue.BoundedQueue(1))
+        app._send("first")
+        # Later timers still run.
+        done = threading.Event()
+        scheduler.call_later(0, app._send, "second")
+        scheduler.call_later(0, done.set)
+        ok_(done.wait(5))
+        eq_(1, app.dropped_sends)
+        eq_(1, app._outgoing_queue.qsize())
+    finally:
+        utils.scheduler.set_scheduler(None)
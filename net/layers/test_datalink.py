@@ -2,10 +2,17 @@ from nose.tools import eq_
 from nose.tools import ok_
 import base
 import datalink
+import duplicates
+import flooding
+import reassembly
+import routing
+import utils.scheduler
 
 
 class TestDataLink(object):
     def setup(self):
+        # Timers only run when the test runs them.
+        utils.scheduler.set_scheduler(utils.scheduler.Scheduler())
         self.addr = 123
         self.dest_addr = 124
         self.message_id = 10
@@ -14,7 +21,7 @@ class TestDataLink(object):
         self.data_link_layer = datalink.DataLink(self.addr)
 
     def teardown(self):
-        pass
+        utils.scheduler.set_scheduler(None)
 
     def assert_outgoing_empty(self):
         ok_(self.data_link_layer._outgoing_queue.empty())
@@ -56,6 +63,52 @@ class TestDataLink(object):
         eq_(2, self.data_link_layer.get_next_message_id())
         eq_(3, self.data_link_layer.get_next_message_id())
 
+    def test_get_next_message_id_wraps(self):
+        self.data_link_layer.last_message_id = 254
+        eq_(255, self.data_link_layer.get_next_message_id())
+        eq_(1, self.data_link_layer.get_next_message_id())
+
+        compact = datalink.DataLink(
+            self.addr, pdu_cls=datalink.CompactDataLinkPDU)
+        compact.last_message_id = 255
+        eq_(256, compact.get_next_message_id())
+        compact.last_message_id = 2**16 - 1
+        eq_(1, compact.get_next_message_id())
+
+    def test_compact_pdu_round_trip(self):
+        data_unit = datalink.CompactDataLinkPDU(self.addr, self.dest_addr,
+            1000, 2, 100, 1, self.short_data, self.dest_addr + 1)
+        string = data_unit.to_string()
+        eq_(12 + len(self.short_data), len(string))
+        data_unit = datalink.CompactDataLinkPDU.from_string(string)
+        ok_(isinstance(data_unit, datalink.CompactDataLinkPDU))
+        eq_(self.addr, data_unit.source_addr)
+        eq_(self.dest_addr, data_unit.dest_addr)
+        eq_(1000, data_unit.message_id)
+        eq_(100, data_unit.total_size)
+        eq_(1, data_unit.piece_no)
+        eq_(2, data_unit.ttl)
+        eq_(self.short_data, data_unit.chunk)
+        eq_(self.dest_addr + 1, data_unit.next_hop)
+
+    def test_pdu_data_flag_round_trip(self):
+        for pdu_cls in [datalink.DataLinkPDU, datalink.CompactDataLinkPDU]:
+            for is_data in [False, True]:
+                string = pdu_cls(self.addr, self.dest_addr, self.message_id,
+                    5, 100, 1, self.short_data, is_data=is_data).to_string()
+                data_unit = pdu_cls.from_string(string)
+                eq_(5, data_unit.ttl)
+                eq_(is_data, data_unit.is_data)
+                eq_(is_data, pdu_cls.is_data_frame(string))
+
+    def test_compact_should_drop_oversized_message(self):
+        compact = datalink.DataLink(
+            self.addr, pdu_cls=datalink.CompactDataLinkPDU)
+        compact._handle_outgoing(("x" * 2**16, self.dest_addr))
+        ok_(compact._outgoing_queue.empty())
+        compact._handle_outgoing((self.long_data, self.dest_addr))
+        ok_(not compact._outgoing_queue.empty())
+
     def test_should_not_receive_if_not_recipient(self):
         data_unit = datalink.DataLinkPDU(
             self.addr, base.BROADCAST_ADDRESS,
@@ -103,6 +156,32 @@ class TestDataLink(object):
         eq_(data_unit.piece_no, chunk.piece_no)
         eq_(data_unit.chunk, chunk.chunk)
 
+    def test_should_drop_data_before_forwarded_control(self):
+        class SmallQueueDataLink(datalink.DataLink):
+            OUTGOING_QUEUE_SIZE = 3
+        layer = SmallQueueDataLink(self.addr)
+        for message_id, is_data in [(1, False), (2, True), (3, False), (4, False)]:
+            data_unit = datalink.DataLinkPDU(
+                self.addr + 1, self.addr + 2, message_id, 1,
+                len(self.short_data), 0, self.short_data, is_data=is_data)
+            layer._handle_incoming((data_unit.to_string(), self.addr + 1))
+
+        # The data frame made room, the control frames were all forwarded.
+        eq_(1, layer._outgoing_queue.get_stats()['dropped'])
+        message_ids = [datalink.DataLinkPDU.from_string(
+            layer._outgoing_queue.get()).message_id for i in range(3)]
+        eq_([1, 3, 4], message_ids)
+
+    def test_should_flag_outgoing_data(self):
+        self.data_link_layer._handle_outgoing(
+            (self.long_data, self.dest_addr, True))
+        self.data_link_layer._handle_outgoing((self.short_data, self.dest_addr))
+        queue = self.data_link_layer._outgoing_queue
+        flags = [datalink.DataLinkPDU.from_string(queue.get()).is_data
+                 for i in range(queue.qsize())]
+        ok_(len(flags) > 2)
+        eq_([True] * (len(flags) - 1) + [False], flags)
+
     def test_should_not_forward_if_seen(self):
         data_unit = datalink.DataLinkPDU(
             self.addr + 1, self.addr + 2,
@@ -120,31 +199,326 @@ class TestDataLink(object):
         self.data_link_layer._handle_incoming(args)
         self.assert_outgoing_empty()
 
-    def test_should_flush_buffer(self):
-        self.data_link_layer.buffer_window = 1
-        data_unit1 = datalink.DataLinkPDU(
+    def test_should_reassemble(self):
+        pieces = self.data_link_layer._chunk_data(self.long_data)
+        ok_(len(pieces) > 1)
+        # Receive pieces in reverse order.
+        for piece_no, chunk in reversed(list(enumerate(pieces))):
+            self.assert_incoming_empty()
+            data_unit = datalink.DataLinkPDU(
+                self.dest_addr, self.addr, self.message_id, 1,
+                len(self.long_data), piece_no, chunk)
+            args = (data_unit.to_string(), self.dest_addr)
+            self.data_link_layer._handle_incoming(args)
+        data, metadata = self.data_link_layer._incoming_queue.get()
+        eq_(self.long_data, data)
+        eq_(self.dest_addr, metadata['sender_addr'])
+        eq_(0, len(self.data_link_layer.reassembly))
+
+    def test_should_not_deliver_duplicate(self):
+        data_unit = datalink.DataLinkPDU(
             self.dest_addr, self.addr,
-            self.message_id, 1, len(self.short_data), 1, self.short_data)
-        args = (data_unit1.to_string(), self.addr + 1)
+            self.message_id, 1, len(self.short_data), 0, self.short_data)
+        args = (data_unit.to_string(), self.dest_addr)
         self.data_link_layer._handle_incoming(args)
-        # One message buffered from self.dest_addr
-        eq_(1, len(self.data_link_layer.buffer[self.dest_addr]))
-        
-        data_unit2 = datalink.DataLinkPDU(
-            self.dest_addr, self.addr,
-            self.message_id + 1, 1, len(self.short_data), 1, self.short_data)
-        args = (data_unit2.to_string(), self.addr + 1)
         self.data_link_layer._handle_incoming(args)
-        # two messages buffered from self.dest_addr
-        eq_(2, len(self.data_link_layer.buffer[self.dest_addr]))
+        eq_(self.short_data, self.data_link_layer._incoming_queue.get()[0])
+        self.assert_incoming_empty()
+
+    def test_should_remember_pieces_not_for_us(self):
+        data_unit = datalink.DataLinkPDU(
+            self.addr + 1, self.addr + 2,
+            self.message_id, 1, len(self.long_data), 0, self.short_data)
+        args = (data_unit.to_string(), self.addr + 1)
+        self.data_link_layer._handle_incoming(args)
+        ok_((self.addr + 1, (self.message_id, 0)) in \
+            self.data_link_layer.duplicates)
+        # Not buffered for reassembly.
+        eq_(0, len(self.data_link_layer.reassembly))
+
+    def test_should_deliver_past_message_id_wrap(self):
+        sender = datalink.DataLink(self.dest_addr)
+        for i in range(2 * datalink.DataLinkPDU.MAX_MESSAGE_ID + 10):
+            data = "Message %s" % i
+            sender._handle_outgoing((data, self.addr))
+            args = (sender._outgoing_queue.get(), self.dest_addr)
+            self.data_link_layer._handle_incoming(args)
+            eq_(data, self.data_link_layer._incoming_queue.get_nowait()[0])
+
+    def test_should_deliver_after_source_restarts(self):
+        for pdu_cls in [datalink.DataLinkPDU, datalink.CompactDataLinkPDU]:
+            now = [0]
+            utils.scheduler.set_scheduler(
+                utils.scheduler.Scheduler(clock=lambda: now[0]))
+            receiver = datalink.DataLink(self.addr, pdu_cls=pdu_cls)
+            for restart in range(3):
+                # Message ids start from 1 again.
+                sender = datalink.DataLink(self.dest_addr, pdu_cls=pdu_cls)
+                for i in range(100):
+                    data = "Message %s" % i
+                    sender._handle_outgoing((data, self.addr))
+                    args = (sender._outgoing_queue.get(), self.dest_addr)
+                    receiver._handle_incoming(args)
+                    eq_(data, receiver._incoming_queue.get_nowait()[0])
+                    now[0] += .1
+                now[0] += datalink.DataLink.DUPLICATE_HORIZON + 1
 
-        data_unit3 = datalink.DataLinkPDU(
+    def test_should_deliver_right_after_source_restarts(self):
+        # More messages than the duplicate window before each restart.
+        count = self.data_link_layer.duplicates.window + 10
+        for restart in range(3):
+            sender = datalink.DataLink(self.dest_addr)
+            for i in range(count):
+                data = "Message %s" % i
+                sender._handle_outgoing((data, self.addr))
+                args = (sender._outgoing_queue.get(), self.dest_addr)
+                self.data_link_layer._handle_incoming(args)
+                eq_(data, self.data_link_layer._incoming_queue.get_nowait()[0])
+
+    def test_should_learn_routes(self):
+        # Packet from addr + 1 relayed by addr + 2 over 2 hops.
+        data_unit = datalink.DataLinkPDU(
+            self.addr + 1, base.BROADCAST_ADDRESS, self.message_id,
+            self.data_link_layer.ttl - 1, 100, 0, self.short_data)
+        args = (data_unit.to_string(), self.addr + 2)
+        self.data_link_layer._handle_incoming(args)
+        routes = self.data_link_layer.routes.get_routes()
+        eq_((self.addr + 2, 1), routes[self.addr + 2])
+        eq_((self.addr + 2, 2), routes[self.addr + 1])
+
+    def test_should_only_forward_as_next_hop(self):
+        compact = datalink.DataLink(
+            self.addr, pdu_cls=datalink.CompactDataLinkPDU)
+        compact.routes.learn(self.addr + 3, self.addr + 4, 1)
+        # We are not the next hop.
+        data_unit = datalink.CompactDataLinkPDU(
+            self.addr + 1, self.addr + 3, 1, 2, 100, 0, self.short_data,
+            self.addr + 2)
+        compact._handle_incoming((data_unit.to_string(), self.addr + 1))
+        ok_(compact._outgoing_queue.empty())
+
+        # We are the next hop, forward to our next hop.
+        data_unit.message_id += 1
+        data_unit.next_hop = self.addr
+        compact._handle_incoming((data_unit.to_string(), self.addr + 1))
+        chunk = datalink.CompactDataLinkPDU.from_string(
+            compact._outgoing_queue.get())
+        eq_(self.addr + 4, chunk.next_hop)
+        eq_(1, chunk.ttl)
+
+    def test_should_send_to_next_hop(self):
+        compact = datalink.DataLink(
+            self.addr, pdu_cls=datalink.CompactDataLinkPDU)
+        compact._handle_outgoing((self.short_data, self.dest_addr))
+        chunk = datalink.CompactDataLinkPDU.from_string(
+            compact._outgoing_queue.get())
+        # No route yet.
+        eq_(base.BROADCAST_ADDRESS, chunk.next_hop)
+
+        compact.routes.learn(self.dest_addr, self.dest_addr + 1, 2)
+        compact._handle_outgoing((self.short_data, self.dest_addr))
+        chunk = datalink.CompactDataLinkPDU.from_string(
+            compact._outgoing_queue.get())
+        eq_(self.dest_addr + 1, chunk.next_hop)
+
+    def test_should_pass_metadata_up(self):
+        data_unit = datalink.DataLinkPDU(
             self.dest_addr, self.addr,
-            self.message_id + 2, 1, len(self.short_data), 1, self.short_data)
-        args = (data_unit3.to_string(), self.addr + 1)
+            self.message_id, 1, len(self.short_data), 0, self.short_data)
+        metadata = {'rssi': -40, 'timestamp': 10, 'broadcast': True}
+        args = (data_unit.to_string(), self.dest_addr + 1, metadata)
+        self.data_link_layer._handle_incoming(args)
+        data, metadata = self.data_link_layer._incoming_queue.get()
+        eq_(self.short_data, data)
+        eq_({'rssi': -40, 'timestamp': 10, 'broadcast': True,
+             'sender_addr': self.dest_addr + 1}, metadata)
+
+    def test_should_track_neighbours(self):
+        # Sent by its source.
+        data_unit = datalink.DataLinkPDU(
+            self.addr + 1, base.BROADCAST_ADDRESS,
+            self.message_id, 1, 100, 0, self.short_data)
+        args = (data_unit.to_string(), self.addr + 1, {'rssi': -40})
+        self.data_link_layer._handle_incoming(args)
+        # Relayed by another node, without an RSSI.
+        args = (data_unit.to_string(), self.addr + 2)
+        self.data_link_layer._handle_incoming(args)
+        neighbours = self.data_link_layer.neighbours.get_neighbours()
+        eq_((1.0, -40), neighbours[self.addr + 1])
+        eq_((1.0, None), neighbours[self.addr + 2])
+
+    def flood_data_unit(self):
+        return datalink.DataLinkPDU(
+            self.addr + 1, base.FLOOD_ADDRESS,
+            self.message_id, 1, len(self.short_data), 0, self.short_data)
+
+    def test_counter_suppression_should_delay_flood(self):
+        policy = flooding.ForwardPolicy(
+            flooding.Suppression.COUNTER, k=3, max_delay=60)
+        self.data_link_layer.FORWARD_POLICIES = {flooding.FLOOD: policy}
+        data_unit = self.flood_data_unit()
+        args = (data_unit.to_string(), self.addr + 1)
         self.data_link_layer._handle_incoming(args)
-        # two messages (the latest 2) buffered from self.dest_addr
-        eq_(2, len(self.data_link_layer.buffer[self.dest_addr]))
-        ok_(self.message_id + 1 in self.data_link_layer.buffer[self.dest_addr])
-        ok_(self.message_id + 2 in self.data_link_layer.buffer[self.dest_addr])
+        # Delivered to us right away, forwarded after the assessment delay.
+        eq_(self.short_data, self.data_link_layer._incoming_queue.get()[0])
+        self.assert_outgoing_empty()
+
+        key = self.data_link_layer._get_forward_key(data_unit)
+        self.data_link_layer._assess_forward(key, policy)
+        self.assert_outgoing_not_empty()
+        eq_(1, self.data_link_layer.forwarded)
+
+    def test_counter_suppression_should_suppress_overheard_flood(self):
+        policy = flooding.ForwardPolicy(
+            flooding.Suppression.COUNTER, k=3, max_delay=60)
+        self.data_link_layer.FORWARD_POLICIES = {flooding.FLOOD: policy}
+        data_unit = self.flood_data_unit()
+        for sender_addr in xrange(self.addr + 1, self.addr + 4):
+            args = (data_unit.to_string(), sender_addr)
+            self.data_link_layer._handle_incoming(args)
+
+        key = self.data_link_layer._get_forward_key(data_unit)
+        self.data_link_layer._assess_forward(key, policy)
+        self.assert_outgoing_empty()
+        eq_(1, self.data_link_layer.forwards_suppressed)
+        # Assessed only once.
+        self.data_link_layer._assess_forward(key, policy)
+        eq_(1, self.data_link_layer.forwards_suppressed)
+
+    def test_probabilistic_suppression(self):
+        self.data_link_layer.FORWARD_POLICIES = {flooding.FLOOD:
+            flooding.ForwardPolicy(flooding.Suppression.PROBABILISTIC, p=0)}
+        args = (self.flood_data_unit().to_string(), self.addr + 1)
+        self.data_link_layer._handle_incoming(args)
+        self.assert_outgoing_empty()
+        eq_(1, self.data_link_layer.forwards_suppressed)
+
+        self.data_link_layer.FORWARD_POLICIES = {flooding.FLOOD:
+            flooding.ForwardPolicy(flooding.Suppression.PROBABILISTIC, p=1)}
+        data_unit = self.flood_data_unit()
+        data_unit.message_id += 1
+        args = (data_unit.to_string(), self.addr + 1)
+        self.data_link_layer._handle_incoming(args)
+        self.assert_outgoing_not_empty()
+
+
+def test_duplicate_cache_is_bounded():
+    cache = duplicates.DuplicateCache(size=2, max_sources=2)
+    ok_(not cache.check_and_add(1, (1, 0)))
+    ok_(cache.check_and_add(1, (1, 0)))
+    ok_(not cache.check_and_add(1, (1, 1)))
+    ok_(not cache.check_and_add(1, (2, 0)))
+    # Oldest key is evicted.
+    ok_((1, (1, 0)) not in cache)
+    ok_((1, (2, 0)) in cache)
+    eq_(2, len(cache))
+
+    # Least recently active source is evicted.
+    cache.check_and_add(2, (1, 0))
+    cache.check_and_add(1, (3, 0))
+    cache.check_and_add(3, (1, 0))
+    ok_((2, (1, 0)) not in cache)
+    ok_((1, (3, 0)) in cache)
+    ok_((3, (1, 0)) in cache)
+
+
+def test_duplicate_cache_message_ids_wrap_around():
+    cache = duplicates.DuplicateCache(size=100, id_space=255, window=10)
+    ok_(not cache.check_and_add(1, (250, 0)))
+    # Ids within the window are accepted once.
+    ok_(not cache.check_and_add(1, (245, 0)))
+    ok_(cache.check_and_add(1, (245, 0)))
+    # Wrapping around slides the window and forgets old ids.
+    ok_(not cache.check_and_add(1, (5, 0)))
+    ok_((1, (250, 0)) not in cache)
+    ok_((1, (245, 0)) not in cache)
+    ok_(not cache.check_and_add(1, (1, 0)))
+    ok_(cache.check_and_add(1, (1, 0)))
+
+
+def test_duplicate_cache_forgets_restarted_source():
+    for id_space in [255, 2**16 - 1]:
+        cache = duplicates.DuplicateCache(
+            size=100, id_space=id_space, window=10, horizon=30)
+        ok_(not cache.check_and_add(1, (100, 0), now=0))
+        ok_(cache.check_and_add(1, (100, 0), now=10))
+        # Not heard for longer than the horizon.
+        ok_(not cache.check_and_add(1, (100, 0), now=41))
+        # A late copy within the window.
+        ok_(not cache.check_and_add(1, (95, 0), now=42))
+        ok_(cache.check_and_add(1, (95, 0), now=42))
+        # The window behind the newest id.
+        ok_(not cache.check_and_add(1, (90, 0), now=42))
+        ok_((1, (100, 0)) not in cache)
+        ok_(cache.check_and_add(1, (90, 0), now=42))
+
+
+def test_reassembly_table_expires_partial_messages():
+    table = reassembly.ReassemblyTable(timeout=10)
+    first = datalink.DataLinkPDU(1, 2, 1, 1, 10, 0, "abcde")
+    second = datalink.DataLinkPDU(1, 2, 2, 1, 10, 0, "abcde")
+    eq_(None, table.add(first, now=0))
+    eq_(None, table.add(second, now=5))
+    eq_(2, len(table))
+
+    table.expire(now=12)
+    ok_((1, 1) not in table)
+    ok_((1, 2) in table)
+
+    # Completing the message removes it from the table.
+    eq_(None, table.add(second, now=13))
+    rest = datalink.DataLinkPDU(1, 2, 2, 1, 10, 1, "fghij")
+    eq_("abcdefghij", table.add(rest, now=13))
+    eq_(0, len(table))
+
+    stats = table.get_stats()
+    eq_(0, stats['incomplete'])
+    eq_(1, stats['completed'])
+    eq_(1, stats['evicted'])
+    eq_(5, stats['evicted_bytes'])
+    eq_(1, stats['duplicate_pieces'])
+
+
+def test_reassembly_table_new_piece_extends_deadline():
+    table = reassembly.ReassemblyTable(timeout=10)
+    table.add(datalink.DataLinkPDU(1, 2, 1, 1, 15, 0, "abcde"), now=0)
+    table.add(datalink.DataLinkPDU(1, 2, 1, 1, 15, 1, "fghij"), now=8)
+    table.expire(now=12)
+    ok_((1, 1) in table)
+    table.expire(now=19)
+    ok_((1, 1) not in table)
+
+
+def test_reassembly_table_is_bounded():
+    table = reassembly.ReassemblyTable(timeout=10, max_messages=2)
+    for m_id in xrange(3):
+        table.add(datalink.DataLinkPDU(1, 2, m_id, 1, 10, 0, "abcde"), now=0)
+    eq_(2, len(table))
+    ok_((1, 0) not in table)
+    eq_(1, table.get_stats()['evicted'])
+
+
+def test_routing_table_prefers_shorter_routes():
+    table = routing.RoutingTable(timeout=10)
+    table.learn(1, 2, 3, now=0)
+    eq_(2, table.get_next_hop(1, now=0))
+    table.learn(1, 4, 1, now=1)
+    eq_(4, table.get_next_hop(1, now=1))
+    # Longer route ignored, unless it is through the same next hop.
+    table.learn(1, 2, 3, now=2)
+    eq_(4, table.get_next_hop(1, now=2))
+    table.learn(1, 4, 2, now=3)
+    eq_({1: (4, 2)}, table.get_routes(now=3))
+
 
+def test_routing_table_routes_expire():
+    table = routing.RoutingTable(timeout=10)
+    table.learn(1, 2, 1, now=0)
+    eq_(2, table.get_next_hop(1, now=9))
+    eq_({}, table.get_routes(now=10))
+    eq_(None, table.get_next_hop(1, now=10))
+    eq_(0, len(table))
+    # Any route replaces an expired one.
+    table.learn(1, 2, 1, now=0)
+    table.learn(1, 3, 4, now=11)
+    eq_(3, table.get_next_hop(1, now=11))
@@ -0,0 +1,63 @@
+from nose.tools import eq_
+from nose.tools import ok_
+from neighbours import *
+
+
+def test_prr_from_message_id_gaps():
+    table = NeighbourTable(window=4, alpha=.5)
+    # Every other message is lost.
+    for message_id in [1, 3, 5]:
+        table.heard(1, message_id=message_id, now=0)
+    eq_(.6, table.get_neighbours(now=0)[1][0])
+    # Another window with every message received.
+    for message_id in [6, 7, 8, 9]:
+        table.heard(1, message_id=message_id, now=0)
+    eq_(.8, table.get_neighbours(now=0)[1][0])
+
+
+def test_prr_ignores_pieces_and_old_messages():
+    table = NeighbourTable(window=4)
+    for message_id in [1, 1, 2, 2, 1]:
+        table.heard(1, message_id=message_id, now=0)
+    eq_(1.0, table.get_neighbours(now=0)[1][0])
+
+
+def test_prr_message_ids_wrap_around():
+    table = NeighbourTable(id_space=255, window=4)
+    for message_id in [254, 255, 1, 2]:
+        table.heard(1, message_id=message_id, now=0)
+    eq_(1.0, table.get_neighbours(now=0)[1][0])
+
+
+def test_rssi_is_smoothed():
+    table = NeighbourTable(rssi_alpha=.5)
+    table.heard(1, rssi=-40, now=0)
+    table.heard(1, rssi=-60, now=0)
+    eq_(-50, table.get_neighbours(now=0)[1][1])
+    # Forwarded frames only tell us the neighbour is around.
+    table.heard(2, now=0)
+    eq_((1.0, None), table.get_neighbours(now=0)[2])
+
+
+def test_neighbours_expire():
+    table = NeighbourTable(timeout=10)
+    table.heard(1, now=0)
+    table.heard(2, now=5)
+    eq_(set([2]), set(table.get_neighbours(now=12).keys()))
+    ok_(1 not in table)
+
+
+def test_neighbours_are_bounded():
+    table = NeighbourTable(max_neighbours=2)
+    for addr in xrange(3):
+        table.heard(addr, now=0)
+    eq_(2, len(table))
+    ok_(0 not in table)
+
+
+def test_best():
+    neighbours = {1: (.5, -40), 2: (.9, -80), 3: (.9, -60), 4: (.9, None)}
+    eq_(3, best(neighbours, [1, 2, 3, 4]))
+    eq_(1, best(neighbours, [1, 5]))
+    eq_(None, best(neighbours, [5, 6]))
+    eq_(4, best(neighbours, [1, 4]))
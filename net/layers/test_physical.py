@@ -0,0 +1,14 @@
+from nose.tools import eq_
+from nose.tools import ok_
+import net.radio.base
+import physical
+
+
+def test_should_not_change_radio_metadata():
+    layer = physical.Physical(1, net.radio.base.BaseRadio())
+    metadata = {'rssi': -40}
+    layer._handle_frame((net.radio.base.BaseRadio.TYPE_RX, "data", 2, metadata))
+    eq_({'rssi': -40}, metadata)
+    data, sender_addr, metadata = layer.get_incoming_queue().get()
+    eq_(("data", 2, -40), (data, sender_addr, metadata['rssi']))
+    ok_('timestamp' in metadata)
@@ -0,0 +1,42 @@
+from nose.tools import eq_
+from nose.tools import ok_
+from stats import *
+
+
+def test_get_size():
+    eq_(3, get_size('abc'))
+    eq_(3, get_size(('abc', 2)))
+    eq_(0, get_size(None))
+
+
+def test_wrap():
+    now = [0]
+    def clock():
+        return now[0]
+    stats = HandlerStats(clock=clock)
+    handled = []
+    def handler(data):
+        now[0] += .5
+        handled.append(data)
+    wrapped = stats.wrap(handler)
+    wrapped(('abcd', 1))
+    wrapped('ab')
+    eq_([('abcd', 1), 'ab'], handled)
+    result = stats.get_stats()
+    eq_(2, result['messages'])
+    eq_(6, result['bytes'])
+    eq_(1, result['busy_time'])
+    eq_(.5, result['max_time'])
+    eq_(.5, result['mean_time'])
+    eq_(6, result['bytes_per_sec'])
+
+
+def test_wrap_records_failures():
+    stats = HandlerStats()
+    def handler(data):
+        raise ValueError
+    try:
+        stats.wrap(handler)('abc')
+    except ValueError:
+        pass
+    eq_(1, stats.get_stats()['messages'])
@@ -0,0 +1,36 @@
+from nose.tools import eq_
+import transport
+
+
+def test_transport_pdu_round_trip():
+    transport_pdu = transport.TransportPDU("message", 11000, 1, 11002, 2)
+    transport_pdu = transport.TransportPDU.from_string(
+        transport_pdu.to_string())
+    eq_("message", transport_pdu.message)
+    eq_(11000, transport_pdu.source_port)
+    eq_(1, transport_pdu.source_addr)
+    eq_(11002, transport_pdu.dest_port)
+    eq_(2, transport_pdu.dest_addr)
+
+
+def test_local_envelope_round_trip():
+    metadata = {'rssi': -40, 'timestamp': 1.5, 'broadcast': True}
+    envelope = transport.LocalEnvelope("data", metadata)
+    envelope = transport.LocalEnvelope.from_string(envelope.to_string())
+    eq_("data", envelope.data)
+    eq_(metadata, envelope.metadata)
+
+    envelope = transport.LocalEnvelope.from_string(
+        transport.LocalEnvelope("data").to_string())
+    eq_("data", envelope.data)
+    eq_({}, envelope.metadata)
+
+
+def test_should_pass_data_flag_to_datalink():
+    layer = transport.Transport(1)
+    data = transport.TransportPDU("message", 11000, 1, 11000, 2).to_string()
+    layer._handle_outgoing(
+        transport.LocalEnvelope(data, {'data': True}).to_string())
+    layer._handle_outgoing(transport.LocalEnvelope(data).to_string())
+    eq_((data, 2, True), layer.get_outgoing_queue().get())
+    eq_((data, 2, False), layer.get_outgoing_queue().get())
@@ -1,5 +1,5 @@
 import base
-import Queue as queue
+import pickle
 import sock.reader
 import sock.writer
 import socket
@@ -7,6 +7,12 @@ import struct
 import threading
 
 
+# Applications on this node query the neighbour table by sending an empty
+# message to this port (and their own address). The reply is a pickled
+# {addr: (prr, rssi)} from this port.
+NEIGHBOURS_PORT = 10001
+
+
 class TransportPDU(object):
     # H: unsigned short, 2 bytes.
     # source port: H
@@ -34,6 +40,35 @@ class TransportPDU(object):
         return TransportPDU(data[cls.HEADER_SIZE:], *x)
 
 
+class LocalEnvelope(object):
+    """A TransportPDU handed to an application on this node, along with the
+    metadata of the packet it arrived in (see `net.radio.base`), or handed to
+    the Transport layer by an application, along with how to send it (eg.
+    {'data': True} for bulk data, see `DataLinkPDU.DATA_FLAG`).
+
+    Only used between the Transport layer and applications, never sent over
+    the air.
+    """
+    # H: size of the pickled metadata.
+    HEADER_FORMAT = "H"
+    HEADER_SIZE = struct.calcsize(HEADER_FORMAT) # 2 bytes
+
+    def __init__(self, data, metadata=None):
+        self.data = data
+        self.metadata = metadata or {}
+
+    def to_string(self):
+        metadata = pickle.dumps(self.metadata, pickle.HIGHEST_PROTOCOL)
+        header = struct.pack(self.HEADER_FORMAT, len(metadata))
+        return header + metadata + self.data
+
+    @classmethod
+    def from_string(cls, data):
+        size = struct.unpack(cls.HEADER_FORMAT, data[:cls.HEADER_SIZE])[0]
+        metadata = pickle.loads(data[cls.HEADER_SIZE:cls.HEADER_SIZE + size])
+        return LocalEnvelope(data[cls.HEADER_SIZE + size:], metadata)
+
+
 class Transport(base.BaseLayer):
     """Transport Layer.
 
@@ -42,12 +77,25 @@ class Transport(base.BaseLayer):
     """
     ADDRESS = ("", 10000)
 
+    # Bounds on the messages buffered to/from the DataLink layer. Both block
+    # the producer when full so a slow radio pushes back on the applications.
+    INCOMING_QUEUE_SIZE = 64
+    OUTGOING_QUEUE_SIZE = 64
+
     def __init__(self, addr):
         super(Transport, self).__init__(addr)
 
-        self._incoming_queue = queue.Queue()
+        self._incoming_queue = self._create_queue(
+            'incoming', self.INCOMING_QUEUE_SIZE)
 
-        self._outgoing_queue = queue.Queue()
+        self._outgoing_queue = self._create_queue(
+            'outgoing', self.OUTGOING_QUEUE_SIZE)
+
+        # net.layers.neighbours.NeighbourTable, set by the owner of the stack.
+        self.neighbours = None
+
+    def set_neighbours(self, neighbours):
+        self.neighbours = neighbours
 
     def get_incoming_queue(self):
         return self._incoming_queue
@@ -67,23 +115,40 @@ class Transport(base.BaseLayer):
                 raise RuntimeError(msg)
             self._socket_reader = sock.reader.Reader(self.socket)
             self._socket_reader.start()
+            self._queues['socket'] = self._socket_reader.q
         return self._socket_reader
 
-    def _handle_incoming(self, data):
+    def _handle_incoming(self, args):
+        # Expect tuple of (data, metadata) from DataLink layer.
         try:
+            data, metadata = args
             transport_pdu = TransportPDU.from_string(data)
             app_socket_address = ("", transport_pdu.dest_port)
             with sock.writer.Writer(app_socket_address) as w:
-                w.write(data)
+                w.write(LocalEnvelope(data, metadata).to_string())
         except socket.error as msg:
             self.logger.error(msg)
         except Exception as e:
             self.logger.error(e)
 
     def _handle_outgoing(self, data):
+        # Expect a LocalEnvelope from applications.
         try:
-            transport_pdu = TransportPDU.from_string(data)
-            # DataLink layer expects tuple of (data, dest_addr).
-            self._outgoing_queue.put((data, transport_pdu.dest_addr))
+            envelope = LocalEnvelope.from_string(data)
+            transport_pdu = TransportPDU.from_string(envelope.data)
+            if transport_pdu.dest_port == NEIGHBOURS_PORT:
+                self._answer_neighbours(transport_pdu)
+                return
+            # DataLink layer expects tuple of (data, dest_addr, is_data).
+            self._outgoing_queue.put((envelope.data, transport_pdu.dest_addr,
+                envelope.metadata.get('data', False)))
         except Exception as e:
             self.logger.error(e)
+
+    def _answer_neighbours(self, transport_pdu):
+        neighbours = {}
+        if self.neighbours is not None:
+            neighbours = self.neighbours.get_neighbours()
+        reply = TransportPDU(pickle.dumps(neighbours), NEIGHBOURS_PORT,
+            self.addr, transport_pdu.source_port, self.addr)
+        self._handle_incoming((reply.to_string(), {}))
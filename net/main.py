@@ -7,6 +7,8 @@ import layers.physical
 import layers.transport
 import radio.xbeeradio
 import time
+import utils.logger
+import utils.metrics
 
 
 def main(args):
@@ -35,8 +37,11 @@ def main(args):
 
     # Create layers.
     physical = layers.physical.Physical(addr, xbeeradio)
-    datalink = layers.datalink.DataLink(addr)
+    pdu_cls = layers.datalink.CompactDataLinkPDU if args.compact else None
+    datalink = layers.datalink.DataLink(addr, pdu_cls=pdu_cls)
     transport = layers.transport.Transport(addr)
+    # Let applications query the link quality of our neighbours.
+    transport.set_neighbours(datalink.neighbours)
 
     # Start up Physical layer.
     # - listen for incoming packets on the radio
@@ -56,8 +61,38 @@ def main(args):
     # - handle outgoing packets from various Applications
     transport.start_handling_outgoing(transport.get_outgoing_socket_reader())
 
+    # Serve the layers' stats for live monitoring.
+    if args.metrics_port is not None:
+        registry = utils.metrics.get_registry()
+        for layer in (physical, datalink, transport):
+            layer.register_metrics(registry)
+        registry.counter('xbns_forwarded_total',
+            'Packets forwarded for other nodes.', addr=addr).set_function(
+                lambda: datalink.forwarded)
+        registry.counter('xbns_forwards_suppressed_total',
+            'Forwards suppressed by the flooding policies.', addr=addr).set_function(
+                lambda: datalink.forwards_suppressed)
+        async_handler = utils.logger.get_async_handler()
+        if async_handler is not None:
+            registry.counter('xbns_log_dropped_total',
+                'Log records dropped since logging could not keep up.').set_function(
+                    lambda: async_handler.get_stats()['dropped'])
+        utils.metrics.serve(args.metrics_port)
+
     while True:
         time.sleep(10)
+        for layer in (physical, datalink, transport):
+            layer.log_stats()
+        datalink.logger.debug(
+            "Reassembly: %s" % datalink.reassembly.get_stats())
+        datalink.logger.debug("Forwarded: %s, suppressed: %s" % \
+            (datalink.forwarded, datalink.forwards_suppressed))
+        datalink.logger.debug("Routes: %s" % datalink.routes.get_routes())
+        datalink.logger.debug(
+            "Neighbours: %s" % datalink.neighbours.get_neighbours())
+        if utils.logger.get_async_handler() is not None:
+            datalink.logger.debug(
+                "Logging: %s" % utils.logger.get_async_handler().get_stats())
 
 
 if __name__ == '__main__':
@@ -73,4 +108,10 @@ if __name__ == '__main__':
     parser.add_argument('-p', '--panid',
                         help='Personal Area Network (PAN) id, 64-bit, eg. 0x1234')
     parser.add_argument('-c', '--channel', help='Channel, 0x0B - 0x1A (11 - 26)')
+    # Stack configuration
+    parser.add_argument('--compact', action='store_true',
+                        help='Use the compact DataLink header with 16-bit message ids '
+                             '(every node must use the same header).')
+    parser.add_argument('--metrics-port', type=int, default=None,
+                        help='Serve metrics on http://localhost:<port>/metrics.')
     main(parser.parse_args())
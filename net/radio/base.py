@@ -6,5 +6,9 @@ class BaseRadio(object):
         raise NotImplementedError()
 
     def receive(self):
-        """Returns a tuple of (type, data, sender_addr)."""
+        """Returns a tuple of (type, data, sender_addr[, metadata]).
+
+        `metadata` is a dict of what the radio knows about the frame, eg.
+        'rssi' (dBm), 'timestamp' (time.time() when received), 'broadcast'.
+        """
         raise NotImplementedError()
@@ -1,12 +1,17 @@
 import base
 import serial
 import struct
+import time
 import xbee
 
 
 class XBeeRadio(base.BaseRadio):
     BROADCAST_ADDRESS = "\xFF\xFF"
 
+    # Bits of the options byte of rx frames.
+    OPTION_ADDRESS_BROADCAST = 0x02
+    OPTION_PAN_BROADCAST = 0x04
+
     def __init__(self, xbee_module):
         super(XBeeRadio, self).__init__()
         self.xbee_module = xbee_module
@@ -22,7 +27,15 @@ class XBeeRadio(base.BaseRadio):
         if frame.get('id') == "rx":
             data = frame.get('rf_data')
             sender_addr = struct.unpack("H", frame.get('source_addr'))[0]
-            return (self.TYPE_RX, data, sender_addr)
+            options = ord(frame.get('options'))
+            metadata = {
+                # The xbee reports the RSSI as -dBm.
+                'rssi': -ord(frame.get('rssi')),
+                'timestamp': time.time(),
+                'broadcast': bool(options & (self.OPTION_ADDRESS_BROADCAST |
+                                             self.OPTION_PAN_BROADCAST)),
+            }
+            return (self.TYPE_RX, data, sender_addr, metadata)
         return (self.TYPE_OTHERS, frame)
 
     def tohex(self, integer):
@@ -0,0 +1,116 @@
+"""End to end benchmark of the dissemination protocols on the simulator.
+
+Disseminates each of FILES with each of PROTOCOLS on each of TOPOLOGIES, with
+a fixed random seed (so the simulated results only change with the code), and
+reports for each: the (simulated) time the last node completed, the frames and
+messages of each type sent, and the CPU time the simulation took per node.
+Results are written as JSON:
+
+    {"deluge l[10] 1KB.in": {"completed": true, "time": 12.3, "frames": 456,
+                              "messages": {"ADV": 100, ...},
+                              "cpu_time_per_node": .01}, ...}
+
+and compared against a baseline (the results of an earlier run), failing when
+a benchmark got slower or sent more frames by more than the tolerance.
+
+eg.
+    python sim/benchmark.py -o baseline.json
+    python sim/benchmark.py --baseline baseline.json
+"""
+import argparse
+import json
+import os
+import sys
+import sweep
+
+
+PROTOCOLS = ['deluge', 'rateless']
+
+TOPOLOGIES = ['l[10]', 'c[10]', 'l[2, 1]-c[3, 10]-l[2, 20]']
+
+FILES = ['data/1KB.in', 'data/20KB.in', 'data/100KB.in']
+
+RANDOM_SEED = 0
+
+# Results compared against the baseline, lower is better.
+COMPARED = ['time', 'frames', 'cpu_time_per_node']
+
+
+def get_name(combination):
+    return '%s %s %s' % (combination['protocol'], combination['topo'],
+                         os.path.basename(combination['file']))
+
+
+def summarize(result):
+    return {
+        'completed': result['completed'],
+        'time': result['time'],
+        'frames': result['frames'],
+        'bytes': result['bytes'],
+        'messages': result['messages'],
+        'cpu_time_per_node': result['cpu_time'] / len(result['nodes']),
+    }
+
+
+def benchmark(argv=None, processes=None):
+    """Returns {name: summary} of the benchmarks, `argv` are extra arguments
+    of `sim/main.py`."""
+    params = [('protocol', PROTOCOLS), ('topo', TOPOLOGIES), ('file', FILES)]
+    results = sweep.sweep(params, argv, random_seed=RANDOM_SEED,
+                          processes=processes)
+    return {get_name(combination): summarize(result)
+            for combination, result in results}
+
+
+def get_regressions(results, baseline, tolerance):
+    """Returns [(name, key, value, baseline value)] of the results worse than
+    their baseline by more than `tolerance` (a fraction), or not completed."""
+    regressions = []
+    for name, result in sorted(results.iteritems()):
+        if name not in baseline:
+            continue
+        expected = baseline[name]
+        if expected['completed'] and not result['completed']:
+            regressions.append((name, 'completed', False, True))
+            continue
+        for key in COMPARED:
+            if result[key] is None or expected[key] is None:
+                continue
+            if result[key] > expected[key] * (1 + tolerance):
+                regressions.append((name, key, result[key], expected[key]))
+    return regressions
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='XBNS Simulator benchmark')
+    parser.add_argument('--output', '-o', type=argparse.FileType('w'),
+                        default=None, help='File to write the results to (as JSON).')
+    parser.add_argument('--baseline', '-b', type=argparse.FileType('r'),
+                        default=None, help='Results to compare against.')
+    parser.add_argument('--tolerance', '-t', type=float, default=.25,
+                        help='Fraction a result may be worse than the baseline, defaults to .25.')
+    parser.add_argument('--processes', '-j', type=int, default=None,
+                        help='Simulations run in parallel, defaults to the\n'
+                             'number of cores.')
+    parser.add_argument('argv', nargs=argparse.REMAINDER,
+                        help='Other arguments of sim/main.py, after --')
+    args = parser.parse_args()
+    argv = args.argv[1:] if args.argv[:1] == ['--'] else args.argv
+
+    results = benchmark(argv, processes=args.processes)
+    for name, result in sorted(results.iteritems()):
+        print "%-40s %10s %8s frames %8.3f ms CPU/node  %s" % (
+            name,
+            '%.1fs' % result['time'] if result['completed'] else 'incomplete',
+            result['frames'], result['cpu_time_per_node'] * 1000,
+            ", ".join("%s %s" % item for item in sorted(result['messages'].iteritems())))
+    if args.output:
+        json.dump(results, args.output, indent=2, sort_keys=True)
+        args.output.close()
+
+    if args.baseline:
+        regressions = get_regressions(results, json.load(args.baseline), args.tolerance)
+        for name, key, value, expected in regressions:
+            print "REGRESSION %s %s: %s, baseline %s" % (name, key, value, expected)
+        if regressions:
+            sys.exit(1)
@@ -0,0 +1,161 @@
+"""Models of the wireless channel between simulated nodes.
+
+A `Channel` decides whether a frame sent on a link is lost (a loss model) and
+how long a frame is on air (its airtime, frames overlapping at a receiver
+collide). Loss models are called with the `random.Random` to draw from, so
+simulations on the engine stay reproducible. Models keeping state per link
+lock it, with --realtime every node thread sends frames.
+"""
+import json
+import threading
+
+
+def parse_link_losses(spec):
+    """Returns {(sender, dest): loss} of eg. "1-2=.3,2-1=.5"."""
+    losses = {}
+    for link_loss in spec.split(','):
+        link, loss = link_loss.split('=')
+        sender, dest = link.split('-')
+        losses[(int(sender), int(dest))] = float(loss)
+    return losses
+
+
+class LossModel(object):
+    def is_lost(self, sender, dest, random):
+        """Returns True if the frame sent by `sender` does not reach `dest`."""
+        raise NotImplementedError
+
+
+class UniformLoss(LossModel):
+    """Every frame is lost with probability `loss`, on all links."""
+    def __init__(self, loss=0):
+        self.loss = loss
+
+    def is_lost(self, sender, dest, random):
+        return random.random() < self.loss
+
+
+class LinkLoss(LossModel):
+    """Frames are lost with the probability of their link.
+
+    `losses` is {(sender, dest): loss}, links not in it lose frames with
+    probability `default`.
+    """
+    def __init__(self, losses, default=0):
+        self.losses = losses
+        self.default = default
+
+    def get_loss(self, sender, dest):
+        return self.losses.get((sender, dest), self.default)
+
+    def is_lost(self, sender, dest, random):
+        return random.random() < self.get_loss(sender, dest)
+
+
+class GilbertElliott(LossModel):
+    """Bursty loss: each link is a two state Markov chain.
+
+    A link in the good state loses frames with probability `loss_good`, one
+    in the bad state with probability `loss_bad`. Before each frame, a good
+    link turns bad with probability `p` and a bad link turns good with
+    probability `r` (so bursts last 1 / r frames on average).
+    """
+    def __init__(self, p, r, loss_good=0, loss_bad=1):
+        self.p = p
+        self.r = r
+        self.loss_good = loss_good
+        self.loss_bad = loss_bad
+        # Links in the bad state.
+        self._bad = set()
+        self._lock = threading.Lock()
+
+    def is_lost(self, sender, dest, random):
+        link = (sender, dest)
+        with self._lock:
+            if link in self._bad:
+                if random.random() < self.r:
+                    self._bad.remove(link)
+            elif random.random() < self.p:
+                self._bad.add(link)
+            loss = self.loss_bad if link in self._bad else self.loss_good
+        return random.random() < loss
+
+
+def read_link_traces(f):
+    """Returns {(sender, dest): [True if delivered, ...]} of the links
+    measured by `log/links.py`, read from the JSON file `f`."""
+    traces = {}
+    for link in json.load(f)['links']:
+        trace = [c == '1' for c in link['trace']]
+        if trace:
+            traces[(link['sender'], link['dest'])] = trace
+    return traces
+
+
+class TraceLoss(LossModel):
+    """Replays the frames delivered and lost on measured links.
+
+    `traces` is {(sender, dest): [True if delivered, ...]}, each link starts
+    at a random position of its trace and wraps around at its end. Links not
+    in it lose frames with probability `default`.
+    """
+    def __init__(self, traces, default=1):
+        self.traces = traces
+        self.default = default
+        # Position of each link in its trace.
+        self._positions = {}
+        self._lock = threading.Lock()
+
+    def is_lost(self, sender, dest, random):
+        link = (sender, dest)
+        trace = self.traces.get(link)
+        if trace is None:
+            return random.random() < self.default
+        with self._lock:
+            if link not in self._positions:
+                self._positions[link] = random.randrange(len(trace))
+            position = self._positions[link]
+            self._positions[link] = (position + 1) % len(trace)
+        return not trace[position]
+
+
+class Channel(object):
+    """Loss and airtime of the frames sent between nodes.
+
+    Without a `bitrate` frames take no time on air and never collide. With
+    one, a frame of n bytes is on air for (n + OVERHEAD) * 8 / bitrate seconds,
+    frames overlapping at a receiver (or reaching a node while it transmits)
+    are lost, and with `carrier_sense` nodes back off while they hear another
+    transmission (CSMA-CA, as the XBee radios do).
+    """
+
+    # Bytes of the 802.15.4 PHY and MAC headers sent with every frame.
+    OVERHEAD = 17
+
+    # Backoff period of CSMA-CA in seconds, attempts before giving up on a
+    # frame and the range of the backoff exponent (802.15.4 defaults).
+    BACKOFF_PERIOD = .00032
+    MAX_BACKOFFS = 4
+    MIN_BE = 3
+    MAX_BE = 5
+
+    def __init__(self, loss_model=None, bitrate=None, carrier_sense=True):
+        self.loss_model = loss_model or UniformLoss()
+        self.bitrate = bitrate
+        self.carrier_sense = carrier_sense
+
+    def is_lost(self, sender, dest, random):
+        return self.loss_model.is_lost(sender, dest, random)
+
+    def has_airtime(self):
+        return bool(self.bitrate)
+
+    def get_airtime(self, data):
+        if not self.bitrate:
+            return 0
+        return (len(data) + self.OVERHEAD) * 8.0 / self.bitrate
+
+    def get_backoff(self, attempt, random):
+        """Returns the time to back off for before the given attempt."""
+        exponent = min(self.MIN_BE + attempt, self.MAX_BE)
+        return random.randint(0, 2 ** exponent - 1) * self.BACKOFF_PERIOD
@@ -0,0 +1,121 @@
+import heapq
+import itertools
+import random
+import utils.logger
+
+
+class Event(object):
+    """A callback scheduled on an `Engine`, can be cancelled."""
+    __slots__ = ['time', 'callback', 'args', 'cancelled']
+
+    def __init__(self, time, callback, args):
+        self.time = time
+        self.callback = callback
+        self.args = args
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+
+class Engine(object):
+    """Discrete event simulation engine.
+
+    Keeps a virtual clock and a priority queue of events. Running the engine
+    pops the events in order of time (ties in the order they were scheduled),
+    moves the clock to the time of each event and calls it, so a simulation
+    runs as fast as the events can be processed and the same seed always gives
+    the same run. Everything runs on the thread calling `run`.
+
+    Implements the `utils.scheduler.Scheduler` interface (`call_later`,
+    `call_at`, `time`), install it with `utils.scheduler.set_scheduler` so the
+    protocols and layers schedule their timers on the virtual clock.
+    """
+
+    # Protocols and apps do not start their own threads.
+    SINGLE_THREADED = True
+
+    def __init__(self, seed=0):
+        self.now = 0.0
+        self.seed = seed
+        # Randomness of the simulation itself, eg. packet loss.
+        self.random = random.Random(seed)
+        # Heap of (time, sequence number, Event).
+        self._queue = []
+        self._sequence = itertools.count()
+        self._stopped = False
+        # Number of events run so far.
+        self.events_run = 0
+        self.logger = utils.logger.get_logger(self.__class__.__name__)
+
+    def __len__(self):
+        return len(self._queue)
+
+    def time(self):
+        return self.now
+
+    def call_later(self, delay, callback, *args):
+        return self.call_at(self.now + delay, callback, *args)
+
+    def call_at(self, deadline, callback, *args):
+        # Events are never run in the past.
+        event = Event(max(deadline, self.now), callback, args)
+        heapq.heappush(self._queue, (event.time, next(self._sequence), event))
+        return event
+
+    def call_soon(self, callback, *args):
+        return self.call_at(self.now, callback, *args)
+
+    def stop(self):
+        """Stops `run` after the current event."""
+        self._stopped = True
+
+    def step(self):
+        """Runs the next event, returns False if there are none left."""
+        while self._queue:
+            t, _, event = heapq.heappop(self._queue)
+            if event.cancelled:
+                continue
+            self.now = t
+            self.events_run += 1
+            try:
+                event.callback(*event.args)
+            except Exception as e:
+                self.logger.exception(e)
+            return True
+        return False
+
+    def run(self, until=None):
+        """Runs events until none are left, `stop` is called or the clock
+        would pass `until`."""
+        self._stopped = False
+        while self._queue and not self._stopped:
+            if until is not None and self._queue[0][0] > until:
+                break
+            self.step()
+        if until is not None and not self._stopped:
+            self.now = max(self.now, until)
+        return self.now
+
+
+class EventQueue(object):
+    """Queue-like object passing each item to `handler` in an event.
+
+    Replaces the queues (and threads) between layers when a node is driven by
+    an `Engine`.
+    """
+
+    def __init__(self, engine, handler):
+        self.engine = engine
+        self.handler = handler
+        self.puts = 0
+
+    def put(self, item, block=True, timeout=None):
+        self.puts += 1
+        self.engine.call_soon(self.handler, item)
+
+    def empty(self):
+        return True
+
+    def get_stats(self):
+        return {'puts': self.puts}
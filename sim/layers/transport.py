@@ -1,3 +1,4 @@
+from net.layers.transport import LocalEnvelope
 from net.layers.transport import TransportPDU
 
 import net.layers.transport
@@ -17,8 +18,9 @@ class Transport(net.layers.transport.Transport):
             self._incoming_queues_for_apps[socket_address] = queue.Queue()
         return self._incoming_queues_for_apps[socket_address]
 
-    def _handle_incoming(self, data):
+    def _handle_incoming(self, args):
+        data, metadata = args
         transport_pdu = TransportPDU.from_string(data)
         app_socket_address = ("", transport_pdu.dest_port)
         incoming_queue = self.get_incoming_queue_for_app(app_socket_address)
-        incoming_queue.put(data)
+        incoming_queue.put(LocalEnvelope(data, metadata).to_string())
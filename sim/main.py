@@ -1,4 +1,6 @@
+from network import EngineNetwork
 from network import Network
+from node import EngineNode
 from node import Node
 from pprint import pprint
 
@@ -7,9 +9,15 @@ import app.pong
 import app.protocol.rateless_deluge
 import app.rateless_deluge
 import argparse
+import channel
 import config
+import json
+import sim.engine
+import sim.results
 import time
 import topology
+import utils.logger
+import utils.scheduler
 
 
 # The various protocols that can be used in the simulator.
@@ -22,41 +30,106 @@ PROTOCOLS = {
     'make': app.pong.Pong,
 }
 
+# Protocols disseminating a file, that complete.
+DISSEMINATION_PROTOCOLS = ['deluge', 'rateless']
 
-def main(args):
+
+# Seconds of (virtual) time between checks for all nodes having completed.
+COMPLETION_CHECK_INTERVAL = 1
+
+
+def get_topology(args):
+    """Returns the topology of `args`, the measured links with `--link-trace`."""
+    if args.link_trace is not None:
+        return topology.from_links(get_link_traces(args))
+    if args.topo_file is not None:
+        with open(args.topo_file) as f:
+            return topology.read_topology(f)
+    return topology.parse_topology(args.topo, seed=args.topo_seed)
+
+
+def get_link_traces(args):
+    with open(args.link_trace) as f:
+        return channel.read_link_traces(f)
+
+
+def create_channel(args):
+    if args.link_trace is not None:
+        loss_model = channel.TraceLoss(get_link_traces(args), default=1)
+    elif args.burst is not None:
+        p, r, loss_bad = args.burst
+        loss_model = channel.GilbertElliott(
+            p, r, loss_good=args.loss, loss_bad=loss_bad)
+    elif args.link_loss is not None:
+        loss_model = channel.LinkLoss(
+            channel.parse_link_losses(args.link_loss), default=args.loss)
+    else:
+        loss_model = channel.UniformLoss(args.loss)
+    return channel.Channel(loss_model, bitrate=args.bitrate or None,
+                           carrier_sense=not args.no_carrier_sense)
+
+
+# Parts of a node drawing random numbers, each from its own generator.
+NODE_RANDOM_COMPONENTS = ['datalink', 'protocol']
+
+
+def get_node_seed(random_seed, addr, component):
+    """Returns the seed of the randomness of `component` (one of
+    NODE_RANDOM_COMPONENTS) of node `addr` in run `random_seed`."""
+    index = NODE_RANDOM_COMPONENTS.index(component)
+    return (random_seed * 65536 + addr) * len(NODE_RANDOM_COMPONENTS) + index
+
+
+def setup(args, topo):
+    """Creates the network of `topo` running the protocol of `args`.
+
+    Returns (engine, network, nodes), engine is None with `args.realtime`.
+    """
     config.SHOULD_LOG = args.log
-    topo = topology.parse_topology(args.topo)
+    # Nodes on the engine run on a single thread, log in order as they run.
+    config.ASYNC_LOGGING = args.realtime
 
-    print "\n"
-    print "########################################"
-    print "#        SIMULATION PARAMETERS.        #"
-    print "########################################"
-    pprint(args.__dict__)
-    print "\n"
-    print "########################################"
-    print "#              TOPOLOGY.               #"
-    print "########################################"
-    pprint(topo)
-    print "\n"
-    print "########################################"
-    print "#            SIMULATION LOG.           #"
-    print "########################################"
+    engine = None
+    if not args.realtime:
+        # Everything runs on the engine's virtual clock, set it up before
+        # creating the nodes and applications.
+        engine = sim.engine.Engine(seed=args.random_seed)
+        utils.scheduler.set_scheduler(engine)
+        utils.logger.set_clock(engine.time)
 
     # Set up nodes in the network.
     nodes = {}
-    network = Network(delay=args.delay, loss=args.loss)
+    network_channel = create_channel(args)
+    if engine is None:
+        network = Network(delay=args.delay, channel=network_channel,
+                          seed=args.random_seed)
+    else:
+        network = EngineNetwork(
+            engine, delay=args.delay, channel=network_channel)
     for addr, outgoing_links in topo:
-        node = Node.create(addr)
+        if engine is None:
+            node = Node.create(addr)
+        else:
+            node = EngineNode.create(addr, engine)
+        node.datalink.random.seed(
+            get_node_seed(args.random_seed, addr, 'datalink'))
         nodes[addr] = node
         network.add_node(node, outgoing_links)
 
-    # Start the network.
-    network.start()
+    # Start the network, nodes on the engine need no threads.
+    if engine is None:
+        network.start()
 
     # Run protocol.
     APP_CLS = PROTOCOLS[args.protocol]
     for addr, node in nodes.iteritems():
-        node.start_application(APP_CLS(addr))
+        if args.protocol in DISSEMINATION_PROTOCOLS:
+            protocol = APP_CLS.create_protocol()
+            protocol.random.seed(
+                get_node_seed(args.random_seed, addr, 'protocol'))
+            node.start_application(APP_CLS(addr, protocol))
+        else:
+            node.start_application(APP_CLS(addr))
 
     if args.protocol == 'pong':
         for addr in args.seed:
@@ -77,7 +150,7 @@ def main(args):
         for addr in args.seed:
             nodes[addr].get_application(APP_CLS.ADDRESS).send_topo_flood()
 
-    if args.protocol == 'deluge' or args.protocol == 'rateless':
+    if args.protocol in DISSEMINATION_PROTOCOLS:
         for addr, node in nodes.iteritems():
             application = node.get_application(APP_CLS.ADDRESS)
             application.stop_protocol()
@@ -89,6 +162,7 @@ def main(args):
             application.protocol.T_TX = args.t_tx
             application.protocol.W = args.w
             application.protocol.RX_MAX = args.rx_max
+            application.protocol.LOG_PACKETS = args.verbose
             if args.protocol == 'deluge':
                 assert args.dpagesize % args.dpacketsize == 0
                 application.protocol.PAGE_SIZE = args.dpagesize
@@ -111,12 +185,90 @@ def main(args):
         for addr in args.seed:
             nodes[addr].get_application(APP_CLS.ADDRESS).disseminate(data)
 
-    # Don't terminate.
-    while True:
-        time.sleep(100)
+    return engine, network, nodes
 
 
-if __name__ == '__main__':
+def all_completed(nodes, app_cls):
+    """Returns True if every node has all the data being disseminated."""
+    for node in nodes.itervalues():
+        if not node.get_application(app_cls.ADDRESS).protocol.is_completed():
+            return False
+    return True
+
+
+def run(args, topo):
+    """Runs the simulation until every node completed, or the time budget is
+    exceeded (`args.duration` seconds of simulated time, `args.timeout`
+    seconds of real time), returns a dict of results (see `sim.results`)."""
+    wall_start = time.time()
+    cpu_start = time.clock()
+    engine, network, nodes = setup(args, topo)
+    app_cls = PROTOCOLS[args.protocol]
+    disseminating = args.protocol in DISSEMINATION_PROTOCOLS
+
+    def is_done():
+        if disseminating and all_completed(nodes, app_cls):
+            return True
+        return args.timeout is not None and \
+            time.time() - wall_start > args.timeout
+
+    if engine is None:
+        while not is_done() and time.time() - wall_start < args.duration:
+            time.sleep(COMPLETION_CHECK_INTERVAL)
+    else:
+        def check_done():
+            if is_done():
+                engine.stop()
+            else:
+                engine.call_later(COMPLETION_CHECK_INTERVAL, check_done)
+        engine.call_later(COMPLETION_CHECK_INTERVAL, check_done)
+        engine.run(until=args.duration)
+
+    if disseminating:
+        # Protocols on the engine start at time 0.
+        result = sim.results.get_results(
+            network, nodes, app_cls, start=wall_start if engine is None else 0)
+    else:
+        result = {'frames': network.frames_sent, 'bytes': network.bytes_sent}
+    result['wall_time'] = time.time() - wall_start
+    result['cpu_time'] = time.clock() - cpu_start
+    if engine is not None:
+        result['events'] = engine.events_run
+    return result
+
+
+def main(args):
+    topo = get_topology(args)
+
+    print "\n"
+    print "########################################"
+    print "#        SIMULATION PARAMETERS.        #"
+    print "########################################"
+    pprint(args.__dict__)
+    print "\n"
+    print "########################################"
+    print "#              TOPOLOGY.               #"
+    print "########################################"
+    pprint(topo)
+    print "\n"
+    print "########################################"
+    print "#            SIMULATION LOG.           #"
+    print "########################################"
+
+    result = run(args, topo)
+
+    if args.output is not None:
+        json.dump(result, args.output, sort_keys=True)
+        args.output.close()
+        return
+    print "\n"
+    print "########################################"
+    print "#         SIMULATION RESULTS.          #"
+    print "########################################"
+    print json.dumps(result, indent=2, sort_keys=True)
+
+
+def create_parser():
     parser = argparse.ArgumentParser(
         description='XBNS Simulator', formatter_class=argparse.RawTextHelpFormatter)
     parser.add_argument('--protocol', '-p', default='deluge',
@@ -124,17 +276,56 @@ if __name__ == '__main__':
                         help='Protocol to run in simulation.')
     parser.add_argument('--log', type=bool, default=False,
                         help='Whether to write to log file.')
+    parser.add_argument('--realtime', action='store_true',
+                        help='Run the nodes on threads in real time instead of\n'
+                             'on the virtual clock of the event engine.')
+    parser.add_argument('--duration', type=float, default=60 * 60,
+                        help='Seconds of (virtual) time to simulate, unless all the\n'
+                             'nodes complete earlier. Defaults to 3600.')
+    parser.add_argument('--timeout', type=float, default=None,
+                        help='Seconds of real time to simulate at most.')
+    parser.add_argument('--output', '-o', type=argparse.FileType('w'),
+                        default=None,
+                        help='File to write the results to (as JSON), printed by default.')
+    parser.add_argument('--random-seed', '-r', type=int, default=0,
+                        help='Seed of the random number generators, runs with the\n'
+                             'same seed are identical. Defaults to 0.')
 
     # TODO: A easy way to specify topology.
     network = parser.add_argument_group('Network Configuration')
     network.add_argument('--topo', '-t', default='l[2, 1]-c[3, 10]-l[2, 20]',
                          help=topology.TOPOLOGY_HELP)
+    network.add_argument('--topo-seed', type=int, default=0,
+                         help='Seed of the random components of --topo, defaults to 0.')
+    network.add_argument('--topo-file', default=None,
+                         help='File of the topology instead of --topo: JSON of the links\n'
+                              'of each node, eg. {"1": [2], "2": [1]}, or one edge per\n'
+                              'line, eg. "1 2".')
     network.add_argument('--seed', '-s', nargs='*', type=int, default=[1],
                          help='Node IDs to seed the file initially, defaults to 1')
     network.add_argument('--loss', '-l', default=0, type=float,
                          help='The packet loss rate, defaults to 0.')
     network.add_argument('--delay', '-d', default=0, type=float,
                          help='The propogation delay in the shared medium, defaults to 0.')
+    network.add_argument('--link-loss', default=None,
+                         help='Loss rate of individual links, eg. 1-2=.3,2-1=.5 (links\n'
+                              'not listed lose --loss).')
+    network.add_argument('--burst', nargs=3, type=float, default=None,
+                         metavar=('P', 'R', 'LOSS_BAD'),
+                         help='Bursty (Gilbert-Elliott) loss: links turn bad with\n'
+                              'probability P and good with probability R before each\n'
+                              'frame, and lose --loss (good) or LOSS_BAD (bad) of them.')
+    network.add_argument('--link-trace', default=None,
+                         help='Replay the frames delivered and lost on the links measured\n'
+                              'on the testbed (the JSON of log/links.py), the topology is\n'
+                              'then the measured links instead of --topo.')
+    network.add_argument('--bitrate', default=0, type=float,
+                         help='Bits per second of the radios (XBee: 250000), frames then\n'
+                              'take time on air and collide. Defaults to 0: frames take\n'
+                              'no time, and there are no collisions and no carrier sense\n'
+                              '(see --no-carrier-sense). Only on the event engine.')
+    network.add_argument('--no-carrier-sense', action='store_true',
+                         help='Send frames without waiting for the channel to be clear.')
 
     common = parser.add_argument_group('Deluge/Rateless Common Configuration')
     common.add_argument('--file', '-f', type=argparse.FileType(),
@@ -152,6 +343,8 @@ if __name__ == '__main__':
     common.add_argument('--t_tx', type=float, default=.2)
     common.add_argument('--w', type=int, default=10)
     common.add_argument('--rx_max', type=int, default=2)
+    common.add_argument('--verbose', action='store_true',
+                        help='Log each packet sent and received.')
 
     # Deluge page/packet size
     deluge = parser.add_argument_group('Deluge Specific Configuration')
@@ -170,5 +363,10 @@ if __name__ == '__main__':
     # Make
     parser.add_argument('--target', type=str, default="yo", help='Makefile target.')
 
+    return parser
+
+
+if __name__ == '__main__':
+    parser = create_parser()
     args = parser.parse_args()
     main(args)
@@ -1,3 +1,5 @@
+from channel import Channel
+from channel import UniformLoss
 from collections import defaultdict
 import radio
 import random
@@ -5,14 +7,28 @@ import threading
 import time
 
 
-class Network(threading.Thread):
-    def __init__(self, delay=0, loss=0):
-        super(Network, self).__init__()
+class BaseNetwork(object):
+    """Nodes of a simulation and the links between them.
+
+    Frames on the links are lost as decided by a `sim.channel.Channel`, by
+    default every frame is lost with probability `loss`, drawing from
+    `random` (seeded with `seed`).
+    """
+    def __init__(self, delay=0, loss=0, channel=None, seed=None):
         self.outgoing_links = defaultdict(set)
         self.nodes = {}
-        self.daemon = True
         self.delay = delay
         self.loss = loss
+        self.channel = channel or Channel(UniformLoss(loss))
+        self.random = random.Random(seed)
+        # Frames (and their bytes) sent by all the nodes.
+        self.frames_sent = 0
+        self.bytes_sent = 0
+        # Frames not received by a neighbour, lost or collided.
+        self.frames_lost = 0
+        self.frames_collided = 0
+        # Frames given up on as the channel was busy.
+        self.frames_unsent = 0
 
     def _add_link(self, a, b):
         """Adds an outgoing link from `a` to `b`."""
@@ -23,22 +39,38 @@ class Network(threading.Thread):
         for link in outgoing_links:
             self._add_link(node.addr, link)
 
+    def broadcast(self, data, sender):
+        raise NotImplementedError
+
+
+class Network(BaseNetwork, threading.Thread):
+    def __init__(self, delay=0, loss=0, channel=None, seed=None):
+        BaseNetwork.__init__(
+            self, delay=delay, loss=loss, channel=channel, seed=seed)
+        threading.Thread.__init__(self)
+        self.daemon = True
+        self._lock = threading.Lock()
+
     def broadcast(self, data, sender):
         """Broadcast data from sender."""
         time.sleep(self.delay)
+        with self._lock:
+            self.frames_sent += 1
+            self.bytes_sent += len(data)
         # Radios expect a tuple of (data, sender_addr)
         frame = (radio.Radio.TYPE_RX, data, sender)
 
         # Determine if packet should be droped.
         for dest in self.outgoing_links[sender]:
-            if not self.should_drop_packet(data, sender):
+            if not self.should_drop_packet(data, sender, dest):
                 self.nodes[dest].incoming_buffer.put(frame)
             else:
+                with self._lock:
+                    self.frames_lost += 1
                 print 'FRAME DROPPED.'
 
-    def should_drop_packet(self, data, sender):
-        # TODO: Make use of the data and sender args.
-        return random.random() < self.loss
+    def should_drop_packet(self, data, sender, dest):
+        return self.channel.is_lost(sender, dest, self.random)
 
     def process_outgoing(self, addr):
         while True:
@@ -51,3 +83,118 @@ class Network(threading.Thread):
             t.setDaemon(True)
             t.start()
             node.start()
+
+
+class Transmission(object):
+    """A frame on air, as heard by one receiver."""
+    __slots__ = ['frame', 'end', 'collided']
+
+    def __init__(self, frame, end):
+        self.frame = frame
+        self.end = end
+        self.collided = False
+
+
+class EngineNetwork(BaseNetwork):
+    """Network of `EngineNode`(s) delivering frames as events of an `Engine`.
+
+    A frame reaches each neighbour `delay` (virtual) seconds after it is sent,
+    plus its airtime if the channel has one. A node sends its frames one at a
+    time, and frames overlapping at a receiver collide. No threads are used.
+    `seed` defaults to the engine's.
+    """
+    def __init__(self, engine, delay=0, loss=0, channel=None, seed=None):
+        super(EngineNetwork, self).__init__(
+            delay=delay, loss=loss, channel=channel,
+            seed=engine.seed if seed is None else seed)
+        self.engine = engine
+        # addr => frames waiting to be sent, the first is being sent.
+        self._outgoing = defaultdict(list)
+        # addr => Transmissions being received.
+        self._receiving = defaultdict(list)
+        # addr => time the node's current transmission ends.
+        self._transmitting_until = defaultdict(float)
+
+    def add_node(self, node, outgoing_links):
+        super(EngineNetwork, self).add_node(node, outgoing_links)
+        node.radio.network = self
+
+    def broadcast(self, data, sender):
+        """Broadcast data from sender."""
+        self.frames_sent += 1
+        self.bytes_sent += len(data)
+        if not self.channel.has_airtime():
+            self._send(data, sender)
+            return
+        outgoing = self._outgoing[sender]
+        outgoing.append(data)
+        if len(outgoing) == 1:
+            self._access_channel(sender)
+
+    def _send(self, data, sender, airtime=0):
+        # Delivered when the whole frame was received.
+        delay = airtime + self.delay
+        now = self.engine.now
+        metadata = {'timestamp': now + delay}
+        frame = (radio.Radio.TYPE_RX, data, sender, metadata)
+        for dest in sorted(self.outgoing_links[sender]):
+            if self.should_drop_packet(data, sender, dest):
+                self.frames_lost += 1
+            elif not airtime:
+                self.engine.call_later(
+                    delay, self.nodes[dest].receive_frame, frame)
+            else:
+                transmission = Transmission(frame, now + airtime)
+                # Overlapping frames are lost, a node cannot receive while it
+                # is transmitting.
+                for other in self._receiving[dest]:
+                    if other.end > now:
+                        other.collided = True
+                        transmission.collided = True
+                if self._transmitting_until[dest] > now:
+                    transmission.collided = True
+                self._receiving[dest].append(transmission)
+                self.engine.call_later(delay, self._receive, dest, transmission)
+
+    def _receive(self, dest, transmission):
+        self._receiving[dest].remove(transmission)
+        if transmission.collided:
+            self.frames_collided += 1
+        else:
+            self.nodes[dest].receive_frame(transmission.frame)
+
+    def _is_channel_busy(self, addr):
+        # Frames still on air, not those only waiting for the delay.
+        now = self.engine.now
+        return any(t.end > now for t in self._receiving[addr])
+
+    def _access_channel(self, sender, attempt=0):
+        if self.channel.carrier_sense and self._is_channel_busy(sender):
+            if attempt >= self.channel.MAX_BACKOFFS:
+                # Channel access failure, the radio drops the frame.
+                self.frames_unsent += 1
+                self._sent(sender)
+                return
+            backoff = self.channel.get_backoff(attempt, self.random)
+            self.engine.call_later(
+                backoff, self._access_channel, sender, attempt + 1)
+            return
+        data = self._outgoing[sender][0]
+        airtime = self.channel.get_airtime(data)
+        now = self.engine.now
+        self._transmitting_until[sender] = now + airtime
+        # Frames the sender was receiving are lost.
+        for other in self._receiving[sender]:
+            if other.end > now:
+                other.collided = True
+        self._send(data, sender, airtime)
+        self.engine.call_later(airtime, self._sent, sender)
+
+    def _sent(self, sender):
+        outgoing = self._outgoing[sender]
+        outgoing.pop(0)
+        if outgoing:
+            self._access_channel(sender)
+
+    def should_drop_packet(self, data, sender, dest):
+        return self.channel.is_lost(sender, dest, self.random)
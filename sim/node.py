@@ -2,16 +2,36 @@ import net.layers.datalink
 import net.layers.physical
 import Queue as queue
 import sim.layers.transport
+import sim.engine
 import sim.radio
 import threading
 
-class Node(threading.Thread):
+class BaseNode(object):
+    """The network stack and applications of a simulated node."""
     def __init__(self, addr, radio):
-        super(Node, self).__init__()
-        self.daemon = True
         self.addr = addr
         self.radio = radio
 
+        # Map of app.ADDRESS to applications
+        self.applications = {}
+
+        self._init_create_layers()
+
+    def _init_create_layers(self):
+        raise NotImplementedError
+
+    def start_application(self, app):
+        raise NotImplementedError
+
+    def get_application(self, socket_address):
+        return self.applications[socket_address]
+
+
+class Node(BaseNode, threading.Thread):
+    def __init__(self, addr, radio):
+        threading.Thread.__init__(self)
+        self.daemon = True
+
         # Messages from other node waiting to be received by our radio.
         self.incoming_buffer = queue.Queue()
 
@@ -21,10 +41,7 @@ class Node(threading.Thread):
         # Simulated socket buffer for transport layer
         self.transport_layer_socket_queue = queue.Queue()
 
-        # Map of app.ADDRESS to applications
-        self.applications = {}
-
-        self._init_create_layers()
+        BaseNode.__init__(self, addr, radio)
 
     def _init_create_layers(self):
         self.physical = net.layers.physical.Physical(self.addr, self.radio)
@@ -32,6 +49,7 @@ class Node(threading.Thread):
 
         # Simulated transport layer.
         self.transport = sim.layers.transport.Transport(self.addr)
+        self.transport.set_neighbours(self.datalink.neighbours)
 
         # Start up Physical layer.
         # - listen for incoming packets on the radio
@@ -58,9 +76,6 @@ class Node(threading.Thread):
         app.start_handling_incoming(
             self.transport.get_incoming_queue_for_app(app.ADDRESS))
 
-    def get_application(self, socket_address):
-        return self.applications[socket_address]
-
     def _process_incoming(self):
         while True:
             incoming = self.incoming_buffer.get()
@@ -83,3 +98,67 @@ class Node(threading.Thread):
     def create(cls, addr):
         radio = sim.radio.Radio(addr)
         return Node(addr, radio)
+
+
+class EngineNode(BaseNode):
+    """A Node driven by a `sim.engine.Engine`.
+
+    A plain object, without threads: layers hand data to each other in events
+    of the engine instead of through queues, so everything on the node runs on
+    the engine's virtual clock, one event at a time. Hundreds of nodes can be
+    simulated in a single process.
+    """
+    def __init__(self, addr, radio, engine):
+        self.engine = engine
+        super(EngineNode, self).__init__(addr, radio)
+
+    def _event_queue(self, layer, name, handler):
+        q = sim.engine.EventQueue(self.engine, handler)
+        layer._queues[name] = q
+        return q
+
+    def _init_create_layers(self):
+        self.physical = net.layers.physical.Physical(self.addr, self.radio)
+        self.datalink = net.layers.datalink.DataLink(self.addr)
+        self.transport = sim.layers.transport.Transport(self.addr)
+        self.transport.set_neighbours(self.datalink.neighbours)
+
+        # Physical layer => DataLink layer.
+        self.physical._incoming_queue = self._event_queue(
+            self.physical, 'incoming', self.datalink.get_incoming_handler())
+        # DataLink layer => Physical layer.
+        self.datalink._outgoing_queue = self._event_queue(
+            self.datalink, 'outgoing', self.physical.get_outgoing_handler())
+        # DataLink layer => Transport layer.
+        self.datalink._incoming_queue = self._event_queue(
+            self.datalink, 'incoming', self.transport.get_incoming_handler())
+        # Transport layer => DataLink layer.
+        self.transport._outgoing_queue = self._event_queue(
+            self.transport, 'outgoing', self.datalink.get_outgoing_handler())
+        # Applications => Transport layer.
+        self.transport_layer_socket_queue = self._event_queue(
+            self.transport, 'socket', self.transport.get_outgoing_handler())
+        # Frames from the network.
+        self._handle_frame = self.physical.get_frame_handler()
+
+    def start_application(self, app):
+        assert app.ADDRESS not in self.applications
+        self.applications[app.ADDRESS] = app
+        app.set_outgoing_queue(self.transport_layer_socket_queue)
+        self.transport._incoming_queues_for_apps[app.ADDRESS] = \
+            sim.engine.EventQueue(self.engine, app.get_incoming_handler())
+        protocol = getattr(app, 'protocol', None)
+        if protocol is not None:
+            # Data to disseminate, and data received by the protocol.
+            protocol._outgoing = sim.engine.EventQueue(
+                self.engine, protocol.process_outgoing)
+            protocol._incoming = sim.engine.EventQueue(
+                self.engine, app._handle_incoming_dissemination)
+
+    def receive_frame(self, frame):
+        self._handle_frame(frame)
+
+    @classmethod
+    def create(cls, addr, engine):
+        radio = sim.radio.EngineRadio(addr)
+        return EngineNode(addr, radio, engine)
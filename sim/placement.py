@@ -0,0 +1,245 @@
+"""Proposes the nodes to seed a file on, from the topology.
+
+Dissemination spreads hop by hop from the seeds, so the time the last node
+completes grows with its distance (in hops) from the nearest seed. Seed sets
+are scored by that distance (then the mean distance of all nodes, then the
+betweenness of the seeds), found greedily and improved by swapping seeds with
+other nodes. The best candidates can then be simulated to confirm.
+
+eg. the 2 best pairs of seeds of a 30 node chain, each simulated 3 times:
+
+    python sim/placement.py --seeds 2 --candidates 2 --simulate --runs 3 \\
+        -- -t 'l[30]' -f data/1KB.in
+"""
+from pprint import pprint
+
+import argparse
+import collections
+import main
+import sweep
+import sys
+import topology
+
+
+def get_distances(topo_dict, source):
+    """Returns {addr: hops from `source`} of the nodes reachable from it."""
+    distances = {source: 0}
+    to_visit = collections.deque([source])
+    while to_visit:
+        current = to_visit.popleft()
+        for link in topo_dict[current]:
+            if link not in distances:
+                distances[link] = distances[current] + 1
+                to_visit.append(link)
+    return distances
+
+
+def get_all_distances(topo):
+    topo_dict = topology.topo_to_dict(topo)
+    return {addr: get_distances(topo_dict, addr) for addr in topo_dict}
+
+
+def get_eccentricities(topo, all_distances=None):
+    """Returns {addr: hops to the furthest node}, inf if some are unreachable."""
+    all_distances = all_distances or get_all_distances(topo)
+    eccentricities = {}
+    for addr, distances in all_distances.iteritems():
+        if len(distances) < len(all_distances):
+            eccentricities[addr] = float('inf')
+        else:
+            eccentricities[addr] = max(distances.itervalues())
+    return eccentricities
+
+
+def get_diameter(topo, all_distances=None):
+    return max(get_eccentricities(topo, all_distances).itervalues())
+
+
+def get_betweenness(topo):
+    """Returns {addr: number of shortest paths between other nodes through it}.
+
+    Paths between a pair of nodes count as 1 / (number of shortest paths
+    between them), each pair counted in both directions (Brandes' algorithm).
+    """
+    topo_dict = topology.topo_to_dict(topo)
+    betweenness = dict.fromkeys(topo_dict, 0.0)
+    for source in topo_dict:
+        # Nodes in order of distance from source, their predecessors on the
+        # shortest paths and the number of shortest paths to them.
+        order = []
+        predecessors = collections.defaultdict(list)
+        paths = collections.defaultdict(int)
+        paths[source] = 1
+        distances = {source: 0}
+        to_visit = collections.deque([source])
+        while to_visit:
+            current = to_visit.popleft()
+            order.append(current)
+            for link in topo_dict[current]:
+                if link not in distances:
+                    distances[link] = distances[current] + 1
+                    to_visit.append(link)
+                if distances[link] == distances[current] + 1:
+                    paths[link] += paths[current]
+                    predecessors[link].append(current)
+        dependency = collections.defaultdict(float)
+        for node in reversed(order):
+            for predecessor in predecessors[node]:
+                dependency[predecessor] += \
+                    float(paths[predecessor]) / paths[node] * (1 + dependency[node])
+            if node != source:
+                betweenness[node] += dependency[node]
+    return betweenness
+
+
+class Placement(object):
+    """Scores and searches sets of seeds of a topology."""
+
+    def __init__(self, topo):
+        self.topo = topo
+        self.nodes = sorted(topology.all_nodes(topo))
+        self.all_distances = get_all_distances(topo)
+        self.eccentricities = get_eccentricities(topo, self.all_distances)
+        self.betweenness = get_betweenness(topo)
+        # Hops from each node to the nodes, in the order of `nodes`.
+        self.hops = {}
+        for addr, distances in self.all_distances.iteritems():
+            self.hops[addr] = [distances.get(node, float('inf'))
+                               for node in self.nodes]
+
+    def get_score(self, seeds):
+        """Returns the score of `seeds`, lower is better.
+
+        (hops from the furthest node to its nearest seed, mean hops of the nodes
+        to their nearest seed, - betweenness of the seeds)
+        """
+        return self._get_score(seeds, self._get_hops(seeds))
+
+    def _get_hops(self, seeds):
+        """Returns the hops from each node to its nearest seed."""
+        hops = [float('inf')] * len(self.nodes)
+        for seed in seeds:
+            hops = map(min, hops, self.hops[seed])
+        return hops
+
+    def _get_score(self, seeds, hops):
+        betweenness = sum(self.betweenness[seed] for seed in seeds)
+        return (max(hops), float(sum(hops)) / len(hops), -betweenness)
+
+    def _add_seed(self, seeds):
+        hops = self._get_hops(seeds)
+        candidates = []
+        for addr in self.nodes:
+            if addr not in seeds:
+                candidate = seeds + [addr]
+                candidates.append((self._get_score(
+                    candidate, map(min, hops, self.hops[addr])), candidate))
+        return min(candidates)[1]
+
+    def _improve(self, seeds):
+        """Swaps seeds with other nodes while that improves the score."""
+        score = self.get_score(seeds)
+        improved = True
+        while improved:
+            improved = False
+            for i in xrange(len(seeds)):
+                # Hops to the nearest of the other seeds.
+                hops = self._get_hops(seeds[:i] + seeds[i + 1:])
+                for addr in self.nodes:
+                    if addr in seeds:
+                        continue
+                    candidate = seeds[:i] + [addr] + seeds[i + 1:]
+                    candidate_score = self._get_score(
+                        candidate, map(min, hops, self.hops[addr]))
+                    if candidate_score < score:
+                        seeds, score = candidate, candidate_score
+                        improved = True
+                        hops = self._get_hops(seeds[:i] + seeds[i + 1:])
+        return seeds
+
+    def get_candidates(self, num_seeds=1, num_candidates=1):
+        """Returns up to `num_candidates` sets of `num_seeds` seeds, best first.
+
+        A search starts from each of the most central nodes (lowest
+        eccentricity), adding the best seed until there are `num_seeds` then
+        swapping seeds for better ones.
+        """
+        num_seeds = min(num_seeds, len(self.nodes))
+        central = sorted(self.nodes,
+                         key=lambda addr: (self.eccentricities[addr],
+                                           -self.betweenness[addr], addr))
+        candidates = set()
+        for first in central[:max(num_candidates, 5)]:
+            seeds = [first]
+            while len(seeds) < num_seeds:
+                seeds = self._add_seed(seeds)
+            candidates.add(tuple(sorted(seeds)))
+            if num_seeds > 1:
+                candidates.add(tuple(sorted(self._improve(seeds))))
+        candidates = sorted(candidates, key=lambda seeds: (self.get_score(seeds), seeds))
+        return [list(seeds) for seeds in candidates[:num_candidates]]
+
+
+def simulate(seeds, argv, runs=1, random_seed=0, processes=None):
+    """Returns the results of the simulations of seeding on `seeds`."""
+    argv = argv + ['--seed'] + [str(seed) for seed in seeds]
+    return [result for combination, result in sweep.sweep(
+        [], argv, runs=runs, random_seed=random_seed, processes=processes)]
+
+
+def mean_time(results):
+    """Returns the mean completion time of `results`, None if any did not
+    complete."""
+    times = [result.get('time') for result in results]
+    if not times or None in times:
+        return None
+    return sum(times) / len(times)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='XBNS Simulator seed placement',
+        formatter_class=argparse.RawTextHelpFormatter)
+    parser.add_argument('--seeds', '-n', type=int, default=1,
+                        help='Number of seeds, defaults to 1.')
+    parser.add_argument('--candidates', '-k', type=int, default=3,
+                        help='Number of sets of seeds to propose, defaults to 3.')
+    parser.add_argument('--simulate', action='store_true',
+                        help='Simulate each of the proposed sets of seeds.')
+    parser.add_argument('--runs', type=int, default=1,
+                        help='Runs of each simulation, defaults to 1.')
+    parser.add_argument('--random-seed', '-r', type=int, default=0,
+                        help='Seed of the first run, defaults to 0.')
+    parser.add_argument('--processes', '-j', type=int, default=None,
+                        help='Simulations run in parallel, defaults to the\n'
+                             'number of cores.')
+    parser.add_argument('argv', nargs=argparse.REMAINDER,
+                        help='Arguments of sim/main.py (eg. the topology), after --')
+
+    args = parser.parse_args()
+    argv = args.argv[1:] if args.argv[:1] == ['--'] else args.argv
+    pprint(args.__dict__, stream=sys.stderr)
+
+    topo = main.get_topology(main.create_parser().parse_args(argv))
+    placement = Placement(topo)
+    print "Nodes: %s" % len(placement.nodes)
+    print "Diameter: %s" % max(placement.eccentricities.itervalues())
+    center = min(placement.eccentricities.itervalues())
+    print "Center: %s" % [addr for addr in placement.nodes
+                          if placement.eccentricities[addr] == center]
+    top_betweenness = sorted(placement.nodes,
+                             key=lambda addr: -placement.betweenness[addr])[:5]
+    print "Highest betweenness: %s" % ", ".join(
+        "%s (%.0f)" % (addr, placement.betweenness[addr]) for addr in top_betweenness)
+
+    print "\nSeeds, furthest hops, mean hops%s" % (
+        ", simulated time" if args.simulate else "")
+    for seeds in placement.get_candidates(args.seeds, args.candidates):
+        furthest, mean, betweenness = placement.get_score(seeds)
+        row = [" ".join(str(seed) for seed in seeds), str(furthest), "%.2f" % mean]
+        if args.simulate:
+            results = simulate(seeds, argv, runs=args.runs,
+                               random_seed=args.random_seed,
+                               processes=args.processes)
+            row.append(str(mean_time(results)))
+        print ", ".join(row)
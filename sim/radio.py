@@ -19,3 +19,15 @@ class Radio(BaseRadio):
 
     def get_outgoing(self):
         return self.outgoing_queue.get()
+
+
+class EngineRadio(BaseRadio):
+    """Radio of a node driven by a `sim.engine.Engine`, frames go straight to
+    the network and come straight from it (see `sim.node.EngineNode`)."""
+    def __init__(self, addr):
+        self.addr = addr
+        # Set by the network the node is added to.
+        self.network = None
+
+    def broadcast(self, data):
+        self.network.broadcast(data, self.addr)
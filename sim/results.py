@@ -0,0 +1,54 @@
+import collections
+
+
+def get_results(network, nodes, app_cls, start=0):
+    """Returns the results of disseminating data on `nodes`.
+
+    Times are seconds since `start` (the time the data was seeded), None for
+    nodes that did not complete.
+
+    {
+        'completed': <True if every node completed>,
+        'time': <time the last node completed>,
+        'frames': <frames on air>,
+        'bytes': <bytes on air>,
+        'frames_lost': <frames a neighbour lost>,
+        'frames_collided': <frames a neighbour lost to a collision>,
+        'frames_unsent': <frames dropped as the channel was busy>,
+        'messages': {'ADV': <count>, 'REQ': <count>, 'DATA': <count>},
+        'nodes': {
+            <addr>: {
+                'time': <time the node completed>,
+                'pages': [<time each page completed>, ...],
+                'messages': {'ADV': <count>, ...},
+            },
+            ...
+        },
+    }
+    """
+    def since_start(t):
+        return None if t is None else t - start
+
+    messages = collections.Counter()
+    nodes_results = {}
+    for addr, node in nodes.iteritems():
+        protocol = node.get_application(app_cls.ADDRESS).protocol
+        messages.update(protocol.messages_sent)
+        nodes_results[addr] = {
+            'time': since_start(protocol.completion_time),
+            'pages': [since_start(t) for t in protocol.page_completion_times],
+            'messages': dict(protocol.messages_sent),
+        }
+    times = [result['time'] for result in nodes_results.itervalues()]
+    completed = None not in times
+    return {
+        'completed': completed,
+        'time': max(times) if completed and times else None,
+        'frames': network.frames_sent,
+        'bytes': network.bytes_sent,
+        'frames_lost': network.frames_lost,
+        'frames_collided': network.frames_collided,
+        'frames_unsent': network.frames_unsent,
+        'messages': dict(messages),
+        'nodes': nodes_results,
+    }
@@ -0,0 +1,130 @@
+"""Runs the simulator over a grid of parameters, in parallel.
+
+Every combination of the parameter values is simulated `--runs` times (with
+different random seeds) on the event engine until all nodes completed, in a
+pool of processes. Results (see `sim.results`) are written as a CSV table, one
+row per run.
+
+eg. Deluge vs Rateless on a 100 node grid with various k and loss rates:
+
+    python sim/sweep.py --param protocol deluge rateless \\
+        --param k 1 2 4 --param loss 0 .1 --runs 5 -o results.csv \\
+        -- -t 'g[100]' -f data/1KB.in
+"""
+from pprint import pprint
+
+import argparse
+import csv
+import itertools
+import main
+import multiprocessing
+import os
+import sys
+
+
+# Columns of the results table after the parameters.
+RESULT_COLUMNS = [
+    'run', 'random_seed', 'completed', 'time', 'frames', 'bytes',
+    'frames_lost', 'frames_collided', 'adv', 'req', 'data', 'events',
+    'wall_time', 'cpu_time',
+]
+
+
+def get_grid(params):
+    """Returns a dict for each combination of the [(name, [values])]."""
+    names = [name for name, values in params]
+    return [dict(zip(names, values)) for values in
+            itertools.product(*[values for name, values in params])]
+
+
+def to_argv(name, value):
+    """Returns the arguments of `sim/main.py` to set `name` to `value`."""
+    option = '-%s' % name if len(name) == 1 else '--%s' % name
+    return [option, str(value)]
+
+
+def _quiet():
+    # The simulations log every packet.
+    sys.stdout = open(os.devnull, 'w')
+
+
+def _run(job):
+    argv, run, random_seed = job
+    args = main.create_parser().parse_args(
+        argv + ['--random-seed', str(random_seed)])
+    topo = main.get_topology(args)
+    result = main.run(args, topo)
+    result['run'] = run
+    result['random_seed'] = random_seed
+    return result
+
+
+def sweep(params, argv=None, runs=1, random_seed=0, processes=None):
+    """Simulates every combination of `params` (a list of (name, [values]))
+    `runs` times, with `argv` as the other arguments of `sim/main.py`.
+
+    Returns a list of (combination, result) in the order of the grid.
+    """
+    argv = argv or []
+    grid = get_grid(params)
+    jobs = []
+    for combination in grid:
+        combination_argv = list(argv)
+        for name, value in sorted(combination.iteritems()):
+            combination_argv.extend(to_argv(name, value))
+        for run in xrange(runs):
+            jobs.append((combination_argv, run, random_seed + run))
+
+    # A process per simulation, simulations change global state (eg. the
+    # scheduler).
+    pool = multiprocessing.Pool(processes, _quiet, maxtasksperchild=1)
+    try:
+        results = pool.map(_run, jobs, chunksize=1)
+    finally:
+        pool.close()
+        pool.join()
+    combinations = [c for c in grid for run in xrange(runs)]
+    return zip(combinations, results)
+
+
+def write_results(f, params, results):
+    names = [name for name, values in params]
+    writer = csv.DictWriter(f, names + RESULT_COLUMNS, extrasaction='ignore')
+    writer.writeheader()
+    for combination, result in results:
+        row = dict(combination)
+        row.update(result)
+        for message_type, count in result.get('messages', {}).iteritems():
+            row[message_type.lower()] = count
+        writer.writerow(row)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='XBNS Simulator parameter sweep',
+        formatter_class=argparse.RawTextHelpFormatter)
+    parser.add_argument('--param', nargs='+', action='append', default=[],
+                        metavar=('NAME', 'VALUE'),
+                        help='An argument of sim/main.py and the values to\n'
+                             'simulate, eg. --param k 1 2 4')
+    parser.add_argument('--runs', '-n', type=int, default=1,
+                        help='Runs of each combination, defaults to 1.')
+    parser.add_argument('--random-seed', '-r', type=int, default=0,
+                        help='Seed of the first run, defaults to 0.')
+    parser.add_argument('--processes', '-j', type=int, default=None,
+                        help='Simulations run in parallel, defaults to the\n'
+                             'number of cores.')
+    parser.add_argument('--output', '-o', type=argparse.FileType('w'),
+                        default=sys.stdout,
+                        help='File to write the results to, defaults to stdout.')
+    parser.add_argument('argv', nargs=argparse.REMAINDER,
+                        help='Arguments of sim/main.py for all the runs, after --')
+
+    args = parser.parse_args()
+    params = [(param[0], param[1:]) for param in args.param]
+    argv = args.argv[1:] if args.argv[:1] == ['--'] else args.argv
+
+    pprint(args.__dict__, stream=sys.stderr)
+    results = sweep(params, argv, runs=args.runs,
+                    random_seed=args.random_seed, processes=args.processes)
+    write_results(args.output, params, results)
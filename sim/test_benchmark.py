@@ -0,0 +1,22 @@
+from nose.tools import eq_
+from benchmark import *
+
+
+def test_get_name():
+    eq_('deluge l[10] 1KB.in', get_name(
+        {'protocol': 'deluge', 'topo': 'l[10]', 'file': 'data/1KB.in'}))
+
+
+def test_get_regressions():
+    baseline = {
+        'a': {'completed': True, 'time': 10, 'frames': 100, 'cpu_time_per_node': 1},
+        'b': {'completed': True, 'time': 10, 'frames': 100, 'cpu_time_per_node': 1},
+        'c': {'completed': True, 'time': 10, 'frames': 100, 'cpu_time_per_node': 1},
+    }
+    results = {
+        'a': {'completed': True, 'time': 12, 'frames': 90, 'cpu_time_per_node': 1},
+        'b': {'completed': True, 'time': 10, 'frames': 150, 'cpu_time_per_node': 1},
+        'c': {'completed': False, 'time': None, 'frames': 100, 'cpu_time_per_node': 1},
+    }
+    eq_([('b', 'frames', 150, 100), ('c', 'completed', False, True)],
+        get_regressions(results, baseline, .25))
@@ -0,0 +1,108 @@
+from nose.tools import eq_
+from nose.tools import ok_
+from channel import *
+import StringIO
+import engine
+import network
+import random
+
+
+def test_parse_link_losses():
+    eq_({(1, 2): .3, (2, 1): .5}, parse_link_losses('1-2=.3,2-1=.5'))
+
+
+def test_link_loss():
+    loss_model = LinkLoss({(1, 2): 1}, default=0)
+    r = random.Random(0)
+    ok_(loss_model.is_lost(1, 2, r))
+    ok_(not loss_model.is_lost(2, 1, r))
+
+
+def test_gilbert_elliott_losses_are_bursty():
+    loss_model = GilbertElliott(p=.05, r=.25, loss_good=0, loss_bad=1)
+    r = random.Random(0)
+    lost = [loss_model.is_lost(1, 2, r) for i in xrange(10000)]
+    # Stationary loss rate p / (p + r).
+    ok_(.1 < sum(lost) / 10000.0 < .22)
+    bursts = len([i for i in xrange(1, len(lost)) if lost[i] and not lost[i - 1]])
+    # Bursts last 1 / r frames on average.
+    ok_(3 < sum(lost) / float(bursts) < 5)
+
+
+def test_read_link_traces():
+    f = StringIO.StringIO(
+        '{"links": [{"sender": 1, "dest": 2, "prr": 0.5, "trace": "10"},'
+        '           {"sender": 2, "dest": 1, "prr": 0, "trace": ""}]}')
+    eq_({(1, 2): [True, False]}, read_link_traces(f))
+
+
+def test_trace_loss_replays_the_trace():
+    trace = [True, True, False, True, False, False]
+    loss_model = TraceLoss({(1, 2): trace}, default=1)
+    r = random.Random(0)
+    lost = [loss_model.is_lost(1, 2, r) for i in xrange(len(trace) * 2)]
+    # The trace from some position, wrapping around.
+    eq_(lost[:len(trace)], lost[len(trace):])
+    ok_(lost[:len(trace)] in [
+        [not d for d in trace[i:] + trace[:i]] for i in xrange(len(trace))])
+    ok_(loss_model.is_lost(2, 1, r))
+
+
+def test_airtime():
+    channel = Channel(bitrate=250000)
+    eq_((100 + Channel.OVERHEAD) * 8 / 250000.0, channel.get_airtime('x' * 100))
+    eq_(0, Channel().get_airtime('x' * 100))
+
+
+class FakeRadio(object):
+    pass
+
+
+class FakeNode(object):
+    def __init__(self, addr):
+        self.addr = addr
+        self.radio = FakeRadio()
+        self.received = []
+
+    def receive_frame(self, frame):
+        self.received.append(frame[1])
+
+
+def _network(carrier_sense):
+    # 1 and 3 cannot hear each other (hidden terminals), both reach 2.
+    e = engine.Engine()
+    net = network.EngineNetwork(
+        e, channel=Channel(bitrate=250000, carrier_sense=carrier_sense))
+    nodes = dict((addr, FakeNode(addr)) for addr in [1, 2, 3])
+    net.add_node(nodes[1], [2])
+    net.add_node(nodes[2], [1, 3])
+    net.add_node(nodes[3], [2])
+    return e, net, nodes
+
+
+def test_overlapping_frames_collide():
+    e, net, nodes = _network(carrier_sense=True)
+    net.broadcast('a' * 50, 1)
+    e.call_later(.001, net.broadcast, 'b' * 50, 3)
+    e.run()
+    eq_([], nodes[2].received)
+    eq_(2, net.frames_collided)
+
+
+def test_frames_of_a_node_do_not_overlap():
+    e, net, nodes = _network(carrier_sense=False)
+    net.broadcast('a', 1)
+    net.broadcast('b', 1)
+    e.run()
+    eq_(['a', 'b'], nodes[2].received)
+    eq_(2 * net.channel.get_airtime('a'), e.now)
+
+
+def test_carrier_sense_defers_to_frames_heard():
+    e, net, nodes = _network(carrier_sense=True)
+    net.broadcast('a' * 50, 2)
+    e.call_later(.001, net.broadcast, 'b' * 50, 1)
+    e.run()
+    eq_(['a' * 50], nodes[1].received)
+    eq_(['b' * 50], nodes[2].received)
+    eq_(0, net.frames_collided)
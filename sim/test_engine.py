@@ -0,0 +1,124 @@
+from nose.tools import eq_
+from nose.tools import ok_
+from engine import *
+import app.deluge
+import random
+import sim.main
+import sim.network
+import sim.node
+import utils.logger
+import utils.metrics
+import utils.scheduler
+
+
+def test_events_run_in_order():
+    engine = Engine()
+    called = []
+    engine.call_later(2, called.append, 'c')
+    engine.call_later(1, called.append, 'a')
+    # Ties run in the order they were scheduled.
+    engine.call_later(1, called.append, 'b')
+    engine.run()
+    eq_(['a', 'b', 'c'], called)
+    eq_(2, engine.now)
+    eq_(3, engine.events_run)
+
+
+def test_cancel():
+    engine = Engine()
+    called = []
+    event = engine.call_later(1, called.append, 'a')
+    engine.call_later(.5, event.cancel)
+    engine.run()
+    eq_([], called)
+
+
+def test_run_until():
+    engine = Engine()
+    called = []
+    def callback():
+        called.append(engine.now)
+        engine.call_later(1, callback)
+    engine.call_soon(callback)
+    eq_(10, engine.run(until=10))
+    eq_(range(11), called)
+
+
+def test_events_are_never_in_the_past():
+    engine = Engine()
+    engine.call_later(5, engine.call_at, 1, engine.stop)
+    engine.run()
+    eq_(5, engine.now)
+
+
+def test_event_queue():
+    engine = Engine()
+    received = []
+    q = EventQueue(engine, received.append)
+    q.put('a')
+    q.put('b')
+    eq_([], received)
+    engine.run()
+    eq_(['a', 'b'], received)
+
+
+def _disseminate(seed, data, registry=None):
+    engine = Engine(seed=seed)
+    utils.scheduler.set_scheduler(engine)
+    utils.logger.set_clock(engine.time)
+    try:
+        network = sim.network.EngineNetwork(engine, delay=.01, loss=.1)
+        nodes = {}
+        for addr, outgoing_links in [(1, [2]), (2, [1, 3]), (3, [2])]:
+            nodes[addr] = sim.node.EngineNode.create(addr, engine)
+            nodes[addr].datalink.random.seed(
+                sim.main.get_node_seed(seed, addr, 'datalink'))
+            network.add_node(nodes[addr], outgoing_links)
+        for addr, node in nodes.iteritems():
+            protocol = app.deluge.Deluge.create_protocol()
+            protocol.random.seed(sim.main.get_node_seed(seed, addr, 'protocol'))
+            application = app.deluge.Deluge(addr, protocol)
+            if registry is not None:
+                application.register_metrics(registry)
+            node.start_application(application)
+        nodes[1].get_application(app.deluge.Deluge.ADDRESS).disseminate(data)
+        engine.run(until=300)
+    finally:
+        utils.scheduler.set_scheduler(None)
+        utils.logger.set_clock(None)
+    protocols = [node.get_application(app.deluge.Deluge.ADDRESS).protocol
+                 for addr, node in sorted(nodes.iteritems())]
+    return engine, protocols
+
+
+def test_deluge_over_engine_is_deterministic():
+    data = 'x' * 2000
+    engine, protocols = _disseminate(1, data)
+    for protocol in protocols:
+        eq_(data, protocol.get_data())
+    ok_(engine.events_run > 0)
+    # Whatever else draws from the global random.
+    random.random()
+    other_engine, other_protocols = _disseminate(1, data)
+    eq_(engine.events_run, other_engine.events_run)
+    eq_([p.completion_time for p in protocols],
+        [p.completion_time for p in other_protocols])
+    ok_(engine.events_run != _disseminate(2, data)[0].events_run)
+
+
+def test_deluge_metrics():
+    registry = utils.metrics.Registry()
+    engine, protocols = _disseminate(1, 'x' * 2000, registry)
+    for protocol in protocols:
+        labels = {'addr': protocol.addr, 'protocol': 'deluge'}
+        eq_(protocol.total_pages, registry.gauge(
+            'xbns_protocol_pages_completed', **labels).get())
+        eq_(protocol.messages_sent['ADV'], registry.counter(
+            'xbns_protocol_messages_sent_total', type='ADV', **labels).get())
+    # The seed had the pages, the others completed each of them.
+    pages = registry.histogram('xbns_page_completion_seconds', addr=1, protocol='deluge')
+    eq_(0, sum(pages.counts))
+    pages = registry.histogram('xbns_page_completion_seconds', addr=3, protocol='deluge')
+    eq_(protocols[2].total_pages, sum(pages.counts))
+    ok_('xbns_page_completion_seconds_count{addr="3",protocol="deluge"} 2\n'
+        in registry.render())
@@ -0,0 +1,27 @@
+from nose.tools import eq_
+import main
+import utils.logger
+import utils.scheduler
+
+
+def test_get_node_seed():
+    seeds = set(main.get_node_seed(random_seed, addr, component)
+                for random_seed in range(3) for addr in range(1, 50)
+                for component in main.NODE_RANDOM_COMPONENTS)
+    eq_(3 * 49 * len(main.NODE_RANDOM_COMPONENTS), len(seeds))
+
+
+def test_node_components_draw_different_streams():
+    args = main.create_parser().parse_args(['-t', 'l[2]', '-f', 'data/32B.in'])
+    try:
+        engine, network, nodes = main.setup(args, main.get_topology(args))
+    finally:
+        utils.scheduler.set_scheduler(None)
+        utils.logger.set_clock(None)
+    app_cls = main.PROTOCOLS[args.protocol]
+    for node in nodes.itervalues():
+        protocol = node.get_application(app_cls.ADDRESS).protocol
+        # Not the same numbers, even shifted by the draws made so far.
+        datalink_draws = set(node.datalink.random.random() for i in range(100))
+        protocol_draws = set(protocol.random.random() for i in range(100))
+        eq_(set(), datalink_draws & protocol_draws)
@@ -0,0 +1,41 @@
+from nose.tools import eq_
+from nose.tools import ok_
+from placement import *
+import topology
+
+
+def test_eccentricities_and_diameter():
+    topo = topology.chain(5, start_addr=1)
+    eq_({1: 4, 2: 3, 3: 2, 4: 3, 5: 4}, get_eccentricities(topo))
+    eq_(4, get_diameter(topo))
+
+
+def test_unreachable_nodes():
+    topo = [(1, {2}), (2, {1}), (3, set())]
+    eq_(float('inf'), get_diameter(topo))
+
+
+def test_betweenness():
+    # Pairs of nodes in both directions.
+    eq_({1: 0, 2: 6, 3: 8, 4: 6, 5: 0},
+        get_betweenness(topology.chain(5, start_addr=1)))
+    # The two shortest paths between 1 and 4 share the pair.
+    eq_({1: 1, 2: 1, 3: 1, 4: 1},
+        get_betweenness([(1, {2, 3}), (2, {1, 4}), (3, {1, 4}), (4, {2, 3})]))
+
+
+def test_single_seed_is_the_center():
+    placement = Placement(topology.chain(9, start_addr=1))
+    eq_([[5], [4], [6]], placement.get_candidates(1, 3))
+
+
+def test_seeds_spread_over_the_chain():
+    placement = Placement(topology.chain(9, start_addr=1))
+    eq_([3, 7], placement.get_candidates(2, 1)[0])
+    eq_((2, 10 / 9.0, -48), placement.get_score([3, 7]))
+
+
+def test_seeds_of_a_grid():
+    placement = Placement(topology.grid(25, start_addr=1))
+    seeds = placement.get_candidates(4, 1)[0]
+    ok_(placement.get_score(seeds)[0] <= 2)
@@ -0,0 +1,56 @@
+from nose.tools import eq_
+from nose.tools import ok_
+from results import *
+import collections
+
+
+class FakeApp(object):
+    ADDRESS = 1
+
+    def __init__(self, completion_time, page_completion_times, **messages_sent):
+        self.protocol = self
+        self.completion_time = completion_time
+        self.page_completion_times = page_completion_times
+        self.messages_sent = collections.Counter(messages_sent)
+
+
+class FakeNode(object):
+    def __init__(self, app):
+        self.app = app
+
+    def get_application(self, address):
+        return self.app
+
+
+class FakeNetwork(object):
+    frames_sent = 10
+    bytes_sent = 100
+    frames_lost = 1
+    frames_collided = 2
+    frames_unsent = 0
+
+
+def test_get_results():
+    nodes = {
+        1: FakeNode(FakeApp(10, [10, 10], ADV=2, DATA=3)),
+        2: FakeNode(FakeApp(15, [12, 15], ADV=1, REQ=1)),
+    }
+    results = get_results(FakeNetwork(), nodes, FakeApp, start=10)
+    ok_(results['completed'])
+    eq_(5, results['time'])
+    eq_(10, results['frames'])
+    eq_(100, results['bytes'])
+    eq_({'ADV': 3, 'REQ': 1, 'DATA': 3}, results['messages'])
+    eq_({'time': 5, 'pages': [2, 5], 'messages': {'ADV': 1, 'REQ': 1}},
+        results['nodes'][2])
+
+
+def test_get_results_not_completed():
+    nodes = {
+        1: FakeNode(FakeApp(0, [0], ADV=2)),
+        2: FakeNode(FakeApp(None, [])),
+    }
+    results = get_results(FakeNetwork(), nodes, FakeApp)
+    ok_(not results['completed'])
+    eq_(None, results['time'])
+    eq_(None, results['nodes'][2]['time'])
@@ -0,0 +1,28 @@
+from nose.tools import eq_
+from nose.tools import ok_
+from sweep import *
+
+
+def test_get_grid():
+    grid = get_grid([('k', ['1', '2']), ('loss', ['0', '.1'])])
+    eq_([
+        {'k': '1', 'loss': '0'},
+        {'k': '1', 'loss': '.1'},
+        {'k': '2', 'loss': '0'},
+        {'k': '2', 'loss': '.1'},
+    ], grid)
+
+
+def test_to_argv():
+    eq_(['-k', '2'], to_argv('k', 2))
+    eq_(['--loss', '0.1'], to_argv('loss', .1))
+
+
+def test_sweep():
+    results = sweep([('loss', ['0'])], ['-t', 'l[2]', '-f', 'data/32B.in'],
+                    runs=2, processes=1)
+    eq_(2, len(results))
+    for combination, result in results:
+        eq_({'loss': '0'}, combination)
+        ok_(result['completed'])
+    eq_([0, 1], [result['random_seed'] for combination, result in results])
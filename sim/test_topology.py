@@ -1,6 +1,8 @@
 from nose.tools import eq_
 from nose.tools import ok_
 from topology import *
+import StringIO
+import random
 
 
 def test_clique_1():
@@ -64,6 +66,92 @@ def test_chain():
     eq_(sorted(expected), sorted(chain(5, start_addr=1)))
 
 
+def test_grid():
+    expected = [
+        (1, {2, 4}),
+        (2, {1, 3, 5}),
+        (3, {2, 6}),
+        (4, {1, 5, 7}),
+        (5, {2, 4, 6}),
+        (6, {3, 5}),
+        (7, {4}),
+    ]
+    eq_(expected, grid(7, start_addr=1, width=3))
+    eq_({1, 3, 5, 7}, grid(9)[4][1])
+
+
+def test_parse_grid():
+    topo = parse_topology('g[500]')
+    eq_(500, len(topo))
+    eq_({2, 24}, topo_to_dict(topo)[1])
+
+
+def test_parse_topology():
+    eq_([(1, {2}), (2, {1, 10}), (10, {2, 11, 12}), (11, {10, 12}),
+         (12, {10, 11, 20}), (20, {12, 21}), (21, {20})],
+        parse_topology('l[2, 1]-c[3, 10]-l[2, 20]'))
+    eq_([(1, {2, 3, 4}), (2, {1, 3}), (3, {1, 2, 4}), (4, {1, 3})],
+        parse_topology('l[4]+1-3,1-4'))
+
+
+def test_parse_large_topology():
+    edges = ','.join('%d-%d' % (i, i + 2) for i in xrange(1, 2000))
+    topo = parse_topology('g[5000]-l[5000]+' + edges)
+    eq_(10000, len(topo))
+    ok_({4999, 5001} <= topo_to_dict(topo)[5000])
+
+
+def test_random_geometric():
+    topo = random_geometric(200, start_addr=1, radius=.15, seed=3)
+    eq_(topo, random_geometric(200, start_addr=1, radius=.15, seed=3))
+    ok_(topo != random_geometric(200, start_addr=1, radius=.15, seed=4))
+
+    # The same links as comparing every pair of positions.
+    rand = random.Random(3)
+    positions = [(rand.random(), rand.random()) for i in xrange(200)]
+    for addr, links in topo:
+        x, y = positions[addr - 1]
+        expected = {other + 1 for other, (other_x, other_y) in enumerate(positions)
+                    if other != addr - 1 and
+                    (x - other_x) ** 2 + (y - other_y) ** 2 <= .15 ** 2}
+        eq_(expected, links)
+
+
+def test_parse_random_geometric():
+    topo = parse_topology('r[50]', seed=1)
+    eq_(range(1, 51), sorted(all_nodes(topo)))
+    eq_(topo, parse_topology('r[50]', seed=1))
+
+    # Each random component has its own layout.
+    topo = topo_to_dict(parse_topology('r[50]-r[50]', seed=1))
+    first = dict((addr, topo[addr] & set(range(1, 51)))
+                 for addr in range(1, 51))
+    second = dict((addr - 50, set(other - 50 for other in topo[addr] if other > 50))
+                  for addr in range(51, 101))
+    ok_(first != second)
+
+    # Components of different seeds do not share layouts.
+    topo = topo_to_dict(parse_topology('r[50]-r[50]', seed=0))
+    second = dict((addr - 50, set(other - 50 for other in topo[addr] if other > 50))
+                  for addr in range(51, 101))
+    ok_(second != topo_to_dict(parse_topology('r[50]', seed=1)))
+
+
+def test_read_topology_json():
+    f = StringIO.StringIO('{"1": [2], "2": [1, 3], "3": []}')
+    eq_([(1, {2}), (2, {1, 3}), (3, set())], read_topology(f))
+
+
+def test_read_topology_edge_list():
+    f = StringIO.StringIO('# Testbed\n1 2\n\n2 3\n')
+    eq_([(1, {2}), (2, {1, 3}), (3, {2})], read_topology(f))
+
+
+def test_from_links():
+    eq_([(1, {2, 3}), (2, {1}), (3, set())],
+        from_links([(1, 2), (2, 1), (1, 3)]))
+
+
 def test_all_nodes():
     topo = [
         (1, {2, 3}),
@@ -1,3 +1,7 @@
+import collections
+import json
+import math
+import random
 import re
 
 # A network topology is represented as:
@@ -40,30 +44,33 @@ def dict_to_topo(topo_dict):
     return [(k, v) for k, v in topo_dict.iteritems()]
 
 
-def add_link(topo, a, b):
-    """Adds a link from `a` to `b`.
-
-    `a` and `b` can be iterable.
-    """
+def _iterable(x):
     try:
-        iter(a)
-        iter_a = a
+        iter(x)
+        return x
     except TypeError, te:
-        iter_a = [a]
-    try:
-        iter(b)
-        iter_b = b
-    except TypeError, te:
-        iter_b = [b]
+        return [x]
 
 
-    topo_dict = topo_to_dict(topo)
+def _add_links(topo_dict, a, b):
+    """Links every node of `a` with every node of `b` in `topo_dict`."""
+    iter_a = _iterable(a)
+    iter_b = _iterable(b)
     for a in iter_a:
         for b in iter_b:
             if a == b:
                 continue
             topo_dict[a].add(b)
             topo_dict[b].add(a)
+
+
+def add_link(topo, a, b):
+    """Adds a link from `a` to `b`.
+
+    `a` and `b` can be iterable.
+    """
+    topo_dict = topo_to_dict(topo)
+    _add_links(topo_dict, a, b)
     return dict_to_topo(topo_dict)
 
 
@@ -113,6 +120,93 @@ def chain(length, start_addr=0):
     """Returns a network with n nodes connected in a chain."""
     return nary_tree(length - 1, 1, start_addr=start_addr)
 
+
+def grid(size, start_addr=0, width=None):
+    """Returns a grid of the given size, each node linked to the nodes
+    above, below, left and right of it.
+
+    Nodes are laid out in rows of `width` nodes (defaults to a square grid),
+    the last row may be partial.
+    """
+    width = width or int(math.ceil(math.sqrt(size)))
+    topology = []
+    for i in xrange(size):
+        links = set()
+        if i % width != 0:
+            links.add(i - 1)
+        if i % width != width - 1 and i + 1 < size:
+            links.add(i + 1)
+        if i >= width:
+            links.add(i - width)
+        if i + width < size:
+            links.add(i + width)
+        topology.append(
+            (i + start_addr, {addr + start_addr for addr in links}))
+    return topology
+
+
+def random_geometric(size, start_addr=0, radius=None, seed=0):
+    """Returns a random geometric (unit disk) graph of the given size.
+
+    Nodes are placed uniformly at random in a unit square and linked to the
+    nodes within `radius` of them, which defaults to sqrt(2 ln n / (pi n))
+    (the graph is then connected with high probability, but not always).
+    The same `seed` always gives the same graph.
+    """
+    if radius is None:
+        radius = math.sqrt(2 * math.log(max(size, 2)) / (math.pi * max(size, 2)))
+    rand = random.Random(seed)
+    positions = [(rand.random(), rand.random()) for i in xrange(size)]
+
+    # Nodes in cells of radius x radius, only nodes in neighbouring cells can
+    # be within radius of each other.
+    cells = collections.defaultdict(list)
+    for i, (x, y) in enumerate(positions):
+        cells[(int(x / radius), int(y / radius))].append(i)
+
+    topology = []
+    for i, (x, y) in enumerate(positions):
+        links = set()
+        cell_x, cell_y = int(x / radius), int(y / radius)
+        for dx in (-1, 0, 1):
+            for dy in (-1, 0, 1):
+                for j in cells.get((cell_x + dx, cell_y + dy), []):
+                    other_x, other_y = positions[j]
+                    if j != i and (x - other_x) ** 2 + (y - other_y) ** 2 <= radius ** 2:
+                        links.add(j + start_addr)
+        topology.append((i + start_addr, links))
+    return topology
+
+
+def from_links(links):
+    """Returns the topology of the (sender, dest) links, eg. measured links."""
+    topo_dict = {}
+    for sender, dest in links:
+        topo_dict.setdefault(sender, set()).add(dest)
+        topo_dict.setdefault(dest, set())
+    return sorted(dict_to_topo(topo_dict))
+
+
+def read_topology(f):
+    """Returns the topology in the file `f`.
+
+    Either JSON of the links of each node, eg. {"1": [2], "2": [1, 3], ...},
+    or a list of edges (linking both nodes), one per line, eg. "1 2", blank
+    lines and lines starting with # are ignored.
+    """
+    content = f.read()
+    if content.lstrip().startswith('{'):
+        return sorted((int(addr), set(links))
+                      for addr, links in json.loads(content).iteritems())
+    topo_dict = collections.defaultdict(set)
+    for line in content.splitlines():
+        line = line.strip()
+        if not line or line.startswith('#'):
+            continue
+        a, b = [int(addr) for addr in line.replace(',', ' ').split()]
+        _add_links(topo_dict, a, b)
+    return sorted(dict_to_topo(topo_dict))
+
 TOPOLOGY_HELP = """\
 Specify the network topology of the network.
 * Node IDs will be assigned from the left to right in order.
@@ -126,50 +220,57 @@ Examples:
 * l[2]-c[3] => list of 2 nodes connected to a clique of 3 nodes
 * l[2, 3] => list of 2 node, node id starting from 3
 * c[3, 10] => clique of 2 nodes, node id starting from 10
+* g[500] => square grid of 500 nodes (rows of 23 nodes)
+* r[200] => random geometric graph of 200 nodes (see --topo-seed)
 * l[5, 1]+1-3,1-4 => list of 5 nodes, with edges between 1, 3 and 1, 4.
 """
 
-COMPONENT_REGEXP = '([lc])\[(\d*)\,?\s?(\d*)?\]'
+COMPONENT_REGEXP = '([lcgr])\[(\d*)\,?\s?(\d*)?\]'
 
 COMPONENTS_FUNC = {
     'l': chain,
     'c': clique,
+    'g': grid,
+    'r': random_geometric,
 }
 
 
-def parse_topology(topo):
+def parse_topology(topo, seed=0):
+    """Returns the topology described by `topo` (see TOPOLOGY_HELP), random
+    each random component with its own seed drawn from `seed`."""
     topo_parts = topo.split('+')
     edges = "" if len(topo_parts) == 1 else topo_parts[1]
     topo = topo_parts[0]
 
-    components = []
+    # Seeds of the random components, uncorrelated across values of `seed`.
+    seeds = random.Random(seed)
+
+    # Components are merged into a single dict of the links of each node.
+    topo_dict = {}
+    last_addr = None
     for component in topo.split('-'):
         matches = re.search(COMPONENT_REGEXP, component)
         component_type, number, start_addr = matches.groups()
         if not start_addr:
-            if len(components) == 0:
-                start_addr = 1
-            else:
-                start_addr = largest_addr(components[-1]) + 1
+            start_addr = 1 if last_addr is None else last_addr + 1
         else:
             start_addr = int(start_addr)
-        components.append(
-            COMPONENTS_FUNC[component_type](int(number), start_addr))
-
-    # Merge components and add links.
-    while len(components) != 1:
-        last = components.pop()
-        second_last = components.pop()
-        merged = merge_topologies(last, second_last)
-        merged = add_link(merged, largest_addr(second_last), smallest_addr(last))
-        components.append(merged)
+        func = COMPONENTS_FUNC[component_type]
+        if func is random_geometric:
+            component_topo = func(int(number), start_addr,
+                seed=seeds.getrandbits(32))
+        else:
+            component_topo = func(int(number), start_addr)
+        assert len(topo_dict.viewkeys() & all_nodes(component_topo)) == 0
+        topo_dict.update(component_topo)
+        if last_addr is not None:
+            _add_links(topo_dict, last_addr, smallest_addr(component_topo))
+        last_addr = largest_addr(component_topo)
 
     # Add additional edges specified.
-    merged_topology = components[0]
-
     if edges != '':
         for edge in edges.split(','):
             a, b = edge.split('-')
-            merged_topology = add_link(merged_topology, int(a), int(b))
+            _add_links(topo_dict, int(a), int(b))
 
-    return merged_topology
+    return sorted(dict_to_topo(topo_dict))
@@ -1,7 +1,7 @@
-import Queue as queue
 import socket
 import threading
 import time
+import utils.boundedqueue
 
 
 class Reader(object):
@@ -11,9 +11,13 @@ class Reader(object):
 
     SOCKET_BACKLOG = 1
 
+    # Messages read but not yet consumed. When full, stop accepting connections
+    # so writers are pushed back on.
+    QUEUE_SIZE = 64
+
     def __init__(self, socket):
         self.socket = socket
-        self.q = queue.Queue()
+        self.q = utils.boundedqueue.BoundedQueue(self.QUEUE_SIZE)
 
     def get(self):
         return self.q.get()
@@ -1,18 +1,25 @@
-import Queue as queue
 import socket
 import threading
 import time
+import utils.boundedqueue
 
 
 class BufferedWriter(threading.Thread):
+    # Messages waiting to be written. Blocks the producer (eg. a protocol's
+    # send loop) when the stack falls behind.
+    QUEUE_SIZE = 128
+
     def __init__(self, socket_address):
         super(BufferedWriter, self).__init__()
         self.daemon = True
         self.socket_address = socket_address
-        self._queue = queue.Queue()
+        self._queue = utils.boundedqueue.BoundedQueue(self.QUEUE_SIZE)
+
+    def put(self, data, block=True, timeout=None):
+        self._queue.put(data, block, timeout)
 
-    def put(self, data):
-        self._queue.put(data)
+    def get_stats(self):
+        return self._queue.get_stats()
 
     def run(self):
         while True:
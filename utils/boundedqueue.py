@@ -0,0 +1,119 @@
+import Queue as queue
+import collections
+import time
+
+
+class Policy(object):
+    """What a `BoundedQueue` does when a producer finds it full."""
+    # Block the producer until a consumer makes room.
+    BLOCK = 'BLOCK'
+    # Make room by discarding the oldest droppable item. Items that are not
+    # droppable (eg. control messages) are never discarded, their producer
+    # blocks instead.
+    DROP_OLDEST = 'DROP_OLDEST'
+
+
+class BoundedQueue(queue.Queue):
+    """A `Queue.Queue` with an explicit backpressure policy.
+
+    Keeps counters of what went through the queue, and how long items waited
+    in it, so the backlog of each layer can be inspected (see `get_stats`).
+    """
+
+    def __init__(self, maxsize=0, policy=Policy.BLOCK, is_droppable=None):
+        queue.Queue.__init__(self, maxsize)
+        self.policy = policy
+        # Predicate deciding if an item may be dropped under DROP_OLDEST,
+        # evaluated once when the item is put.
+        self.is_droppable = is_droppable or (lambda item: True)
+
+        self.puts = 0
+        self.gets = 0
+        self.dropped = 0
+        self.blocked = 0
+        self.high_watermark = 0
+        # Time each item in the queue was put, and the seconds items waited in
+        # the queue in total and at most.
+        self._put_times = collections.deque()
+        # Whether each item in the queue may be dropped.
+        self._droppable = collections.deque()
+        self.wait_time = 0.0
+        self.max_wait = 0.0
+
+    def put(self, item, block=True, timeout=None):
+        droppable = self.policy == Policy.DROP_OLDEST and \
+            self.is_droppable(item)
+        with self.not_full:
+            if self._is_full():
+                if self.policy == Policy.DROP_OLDEST and self._drop_oldest():
+                    pass
+                elif droppable:
+                    # Nothing older can be dropped, drop the new item instead.
+                    self.dropped += 1
+                    return
+                else:
+                    self.blocked += 1
+                    self._wait_for_room(block, timeout)
+            self._droppable.append(droppable)
+            self._put(item)
+            self.puts += 1
+            self.unfinished_tasks += 1
+            self.high_watermark = max(self.high_watermark, self._qsize())
+            self.not_empty.notify()
+
+    def _put(self, item):
+        self._put_times.append(time.time())
+        queue.Queue._put(self, item)
+
+    def _get(self):
+        self.gets += 1
+        self._droppable.popleft()
+        wait = time.time() - self._put_times.popleft()
+        self.wait_time += wait
+        self.max_wait = max(self.max_wait, wait)
+        return queue.Queue._get(self)
+
+    def _is_full(self):
+        return self.maxsize > 0 and self._qsize() >= self.maxsize
+
+    def _wait_for_room(self, block, timeout):
+        # Same semantics as `Queue.Queue.put`, called with `not_full` held.
+        if not block:
+            raise queue.Full
+        if timeout is None:
+            while self._is_full():
+                self.not_full.wait()
+            return
+        if timeout < 0:
+            raise ValueError("'timeout' must be a non-negative number")
+        endtime = time.time() + timeout
+        while self._is_full():
+            remaining = endtime - time.time()
+            if remaining <= 0.0:
+                raise queue.Full
+            self.not_full.wait(remaining)
+
+    def _drop_oldest(self):
+        for idx, droppable in enumerate(self._droppable):
+            if droppable:
+                del self.queue[idx]
+                del self._put_times[idx]
+                del self._droppable[idx]
+                self.dropped += 1
+                self.unfinished_tasks -= 1
+                return True
+        return False
+
+    def get_stats(self):
+        with self.mutex:
+            return {
+                'depth': self._qsize(),
+                'maxsize': self.maxsize,
+                'high_watermark': self.high_watermark,
+                'puts': self.puts,
+                'gets': self.gets,
+                'dropped': self.dropped,
+                'blocked': self.blocked,
+                'wait_time': self.wait_time,
+                'max_wait': self.max_wait,
+            }
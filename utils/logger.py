@@ -1,21 +1,178 @@
+import Queue as queue
+import atexit
+import boundedqueue
 import config
 import logging
 import logging.handlers
 import sys
+import threading
+import time
+
+
+# Format of the log lines.
+FORMAT = "%(name)s - %(levelname)s - %(asctime)s: %(message)s"
+
+# Returns the time to stamp log records with, None for the system time.
+_clock = None
+
+
+def set_clock(clock):
+    """Stamps log records with `clock()`, eg. a simulator's virtual time."""
+    global _clock
+    _clock = clock
+
+
+def now():
+    """Returns the time log records are stamped with."""
+    return _clock() if _clock is not None else time.time()
+
+
+class _ClockFilter(logging.Filter):
+    def filter(self, record):
+        if _clock is not None:
+            record.created = _clock()
+            record.msecs = (record.created - int(record.created)) * 1000
+        return True
+
+
+class AsyncHandler(logging.Handler):
+    """Hands records to a background thread that writes them to `handlers`.
+
+    Logging only puts the record in a bounded queue, so it never blocks on
+    I/O. The thread writes records in batches of up to BATCH_SIZE (or those
+    logged within FLUSH_INTERVAL seconds of the first), flushing each handler
+    once per batch. When the queue is full the oldest DEBUG/INFO record is
+    dropped, and counted (see `get_stats`).
+    """
+
+    QUEUE_SIZE = 10000
+    BATCH_SIZE = 500
+    FLUSH_INTERVAL = .5
+
+    def __init__(self, handlers):
+        logging.Handler.__init__(self)
+        self.handlers = handlers
+        self.queue = boundedqueue.BoundedQueue(
+            self.QUEUE_SIZE, policy=boundedqueue.Policy.DROP_OLDEST,
+            is_droppable=lambda record: record.levelno < logging.WARNING)
+        # Records not queued since the queue was full of warnings and errors.
+        self.rejected = 0
+        self.batches = 0
+        self._write_lock = threading.Lock()
+        t = threading.Thread(target=self._write_batches)
+        t.setDaemon(True)
+        t.start()
+
+    def emit(self, record):
+        try:
+            # Format the message now, its arguments may change.
+            record.msg = record.getMessage()
+            record.args = None
+            if record.exc_info:
+                self.format(record)
+                record.exc_info = None
+            self.queue.put(record, block=False)
+        except queue.Full:
+            self.rejected += 1
+        except Exception:
+            self.handleError(record)
+
+    def _write_batches(self):
+        not_empty = self.queue.not_empty
+        while True:
+            # Wait for a record, then for a batch or the flush interval.
+            with not_empty:
+                while not self.queue._qsize():
+                    not_empty.wait()
+                deadline = time.time() + self.FLUSH_INTERVAL
+                while self.queue._qsize() < self.BATCH_SIZE:
+                    remaining = deadline - time.time()
+                    if remaining <= 0:
+                        break
+                    not_empty.wait(remaining)
+            self.flush()
+
+    def flush(self):
+        """Writes the queued records."""
+        # Records are only taken from the queue here, so they are written in
+        # order.
+        with self._write_lock:
+            records = []
+            while True:
+                try:
+                    records.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            for handler in self.handlers:
+                handler.acquire()
+                try:
+                    for record in records:
+                        self._write_record(handler, record)
+                    handler.flush()
+                finally:
+                    handler.release()
+            if records:
+                self.batches += 1
+
+    def _write_record(self, handler, record):
+        try:
+            if not handler.filter(record):
+                return
+            if not isinstance(handler, logging.StreamHandler):
+                handler.emit(record)
+                return
+            if isinstance(handler, logging.handlers.RotatingFileHandler) and \
+                    handler.shouldRollover(record):
+                handler.doRollover()
+            # As StreamHandler.emit, without flushing after each record.
+            handler.stream.write(handler.format(record) + "\n")
+        except Exception:
+            handler.handleError(record)
+
+    def get_stats(self):
+        stats = self.queue.get_stats()
+        stats['dropped'] += self.rejected
+        stats['batches'] = self.batches
+        return stats
+
+
+# Handler shared by the loggers of the process with config.ASYNC_LOGGING.
+_async_handler = None
+
+
+def get_async_handler():
+    """Returns the AsyncHandler of the process, None if logging is
+    synchronous."""
+    return _async_handler
+
+
+def _create_handlers():
+    formatter = logging.Formatter(FORMAT)
+    handlers = [logging.StreamHandler(sys.stdout)]
+    if config.SHOULD_LOG:
+        handlers.append(logging.handlers.RotatingFileHandler(
+            config.LOG_FILE_NAME, backupCount=20, maxBytes=5242880))
+    for handler in handlers:
+        handler.setFormatter(formatter)
+    return handlers
 
 
 def get_logger(name="Default"):
+    global _async_handler
     logger = logging.getLogger(name)
     # TODO: Refactor debug level as a cli argument.
     logger.setLevel(logging.DEBUG)
     if len(logger.handlers) == 0:
-        formatter = logging.Formatter("%(name)s - %(levelname)s - %(asctime)s: %(message)s")
-        stream_handler = logging.StreamHandler(sys.stdout)
-        stream_handler.setFormatter(formatter)
-        logger.addHandler(stream_handler)
-        if config.SHOULD_LOG:
-            file_handler = logging.handlers.RotatingFileHandler(
-                config.LOG_FILE_NAME, backupCount=20, maxBytes=5242880)
-            file_handler.setFormatter(formatter)
-            logger.addHandler(file_handler)
-    return logger
\ No newline at end of file
+        if config.ASYNC_LOGGING:
+            if _async_handler is None:
+                _async_handler = AsyncHandler(_create_handlers())
+                # Records are stamped when logged, not when written.
+                _async_handler.addFilter(_ClockFilter())
+                atexit.register(_async_handler.flush)
+            logger.addHandler(_async_handler)
+        else:
+            clock_filter = _ClockFilter()
+            for handler in _create_handlers():
+                handler.addFilter(clock_filter)
+                logger.addHandler(handler)
+    return logger
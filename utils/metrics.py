@@ -0,0 +1,218 @@
+"""In-process metrics, served over HTTP on localhost for live monitoring.
+
+The stack (`net/main.py`) and the applications (`app/manager.py`) update
+counters, gauges and histograms in a `Registry` (`get_registry()`), which a
+`MetricsServer` serves in the Prometheus text format, eg.
+
+    $ curl localhost:9100/metrics
+    # HELP xbns_layer_messages_total Messages handled by the layer.
+    # TYPE xbns_layer_messages_total counter
+    xbns_layer_messages_total{addr="3",direction="incoming",layer="physical"} 1234
+"""
+import BaseHTTPServer
+import bisect
+import threading
+import utils.logger
+
+
+class Metric(object):
+    TYPE = None
+
+    def __init__(self, name, help='', labels=None):
+        self.name = name
+        self.help = help
+        self.labels = labels or {}
+        self._lock = threading.Lock()
+
+    def get_samples(self):
+        """Returns [(name, extra labels, value)] of the metric."""
+        raise NotImplementedError
+
+
+class Counter(Metric):
+    """A count that only goes up, or the value of a function (eg. a count
+    kept elsewhere) when collected."""
+    TYPE = 'counter'
+
+    def __init__(self, name, help='', labels=None):
+        super(Counter, self).__init__(name, help, labels)
+        self.value = 0
+        self._function = None
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+    def set_function(self, function):
+        self._function = function
+
+    def get(self):
+        return self._function() if self._function is not None else self.value
+
+    def get_samples(self):
+        return [(self.name, {}, self.get())]
+
+
+class Gauge(Counter):
+    """A value that goes up and down."""
+    TYPE = 'gauge'
+
+    def set(self, value):
+        with self._lock:
+            self.value = value
+
+    def dec(self, amount=1):
+        self.inc(-amount)
+
+
+class Histogram(Metric):
+    """Counts of observed values in cumulative buckets, with their sum."""
+    TYPE = 'histogram'
+
+    # Upper bounds of the buckets, in seconds.
+    BUCKETS = [.001, .005, .01, .05, .1, .5, 1, 5, 10, 30, 60, 300]
+
+    def __init__(self, name, help='', labels=None, buckets=None):
+        super(Histogram, self).__init__(name, help, labels)
+        self.buckets = sorted(buckets or self.BUCKETS)
+        # Observations in each bucket (and above the last), not cumulative.
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0
+
+    def observe(self, value):
+        with self._lock:
+            self.counts[bisect.bisect_left(self.buckets, value)] += 1
+            self.sum += value
+
+    def get_samples(self):
+        with self._lock:
+            counts, total = self.counts[:], self.sum
+        samples = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + [float('inf')], counts):
+            cumulative += count
+            samples.append((self.name + '_bucket', {'le': bound}, cumulative))
+        samples.append((self.name + '_sum', {}, total))
+        samples.append((self.name + '_count', {}, cumulative))
+        return samples
+
+
+class Registry(object):
+    """Metrics by name and labels, created on first use."""
+
+    def __init__(self):
+        # {name: {sorted label items: metric}}
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def counter(self, name, help='', **labels):
+        return self._get(Counter, name, help, labels)
+
+    def gauge(self, name, help='', **labels):
+        return self._get(Gauge, name, help, labels)
+
+    def histogram(self, name, help='', buckets=None, **labels):
+        return self._get(Histogram, name, help, labels, buckets=buckets)
+
+    def _get(self, cls, name, help, labels, **kwargs):
+        key = tuple(sorted(labels.iteritems()))
+        with self._lock:
+            metrics = self._metrics.setdefault(name, {})
+            for metric in metrics.itervalues():
+                if metric.TYPE != cls.TYPE:
+                    raise ValueError("%s is a %s, not a %s" % \
+                        (name, metric.TYPE, cls.TYPE))
+                break
+            if key not in metrics:
+                metrics[key] = cls(name, help, labels, **kwargs)
+            return metrics[key]
+
+    def render(self):
+        """Returns the metrics in the Prometheus text format."""
+        with self._lock:
+            metrics = [(name, sorted(by_labels.items()))
+                       for name, by_labels in sorted(self._metrics.iteritems())
+                       if by_labels]
+        lines = []
+        for name, by_labels in metrics:
+            first = by_labels[0][1]
+            if first.help:
+                lines.append("# HELP %s %s" % (name, first.help))
+            lines.append("# TYPE %s %s" % (name, first.TYPE))
+            for key, metric in by_labels:
+                for sample_name, extra, value in metric.get_samples():
+                    labels = dict(metric.labels, **extra)
+                    lines.append("%s%s %s" % (
+                        sample_name, _format_labels(labels), _format_value(value)))
+        return "".join(line + "\n" for line in lines)
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, float):
+        return repr(value)
+    return str(value)
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    return '{%s}' % ','.join(
+        '%s="%s"' % (key, _format_value(value).replace('\\', '\\\\').replace('"', '\\"'))
+        for key, value in sorted(labels.iteritems()))
+
+
+_registry = Registry()
+
+
+def get_registry():
+    """Returns the registry shared by the process."""
+    return _registry
+
+
+class MetricsServer(threading.Thread):
+    """Serves the metrics of a registry at http://<host>:<port>/metrics."""
+
+    HOST = '127.0.0.1'
+
+    def __init__(self, port, registry=None, host=None):
+        super(MetricsServer, self).__init__()
+        self.daemon = True
+        self.registry = registry or get_registry()
+        self.logger = utils.logger.get_logger(self.__class__.__name__)
+        server = self
+
+        class Handler(BaseHTTPServer.BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?')[0] not in ('/', '/metrics'):
+                    self.send_error(404)
+                    return
+                body = server.registry.render()
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.httpd = BaseHTTPServer.HTTPServer((host or self.HOST, port), Handler)
+        # The port, if `port` was 0 (any free port).
+        self.port = self.httpd.server_address[1]
+
+    def run(self):
+        self.logger.info("Serving metrics on port %s" % self.port)
+        self.httpd.serve_forever()
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def serve(port, registry=None):
+    """Starts serving the metrics on localhost, returns the MetricsServer."""
+    server = MetricsServer(port, registry)
+    server.start()
+    return server
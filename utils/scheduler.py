@@ -0,0 +1,117 @@
+import threading
+import time
+import timerwheel
+import utils.logger
+
+
+class Handle(object):
+    """A callback scheduled on a `Scheduler`."""
+    __slots__ = ['callback', 'args', 'cancelled', 'timer']
+
+    def __init__(self, callback, args):
+        self.callback = callback
+        self.args = args
+        self.cancelled = False
+        self.timer = None
+
+    def cancel(self):
+        self.cancelled = True
+        self.timer.cancel()
+
+
+class Scheduler(threading.Thread):
+    """Runs callbacks at a later time, all on a single thread.
+
+    Replaces a `threading.Timer` (and so a new thread) per scheduled event.
+    Callbacks are kept in a hierarchical timer wheel, `call_later` returns a
+    handle that can be cancelled. Callbacks run one at a time and should not
+    block: a callback waiting on a full queue stalls every other timer in the
+    process. Applications sending from a callback drop the message when the
+    stack is backed up (see `Application._send`).
+    """
+
+    # Resolution of the timers, in seconds.
+    TICK = .01
+
+    def __init__(self, tick=None, clock=time.time):
+        super(Scheduler, self).__init__()
+        self.daemon = True
+        self.clock = clock
+        self._wheel = timerwheel.HierarchicalTimerWheel(
+            tick=tick or self.TICK, now=self.clock())
+        self._condition = threading.Condition()
+        # Handles due, run by the thread outside the lock.
+        self._ready = []
+        self.logger = utils.logger.get_logger(self.__class__.__name__)
+
+    def __len__(self):
+        return len(self._wheel)
+
+    def time(self):
+        return self.clock()
+
+    def call_later(self, delay, callback, *args):
+        """Calls `callback(*args)` in `delay` seconds, returns a cancellable
+        handle."""
+        return self.call_at(self.clock() + delay, callback, *args)
+
+    def call_at(self, deadline, callback, *args):
+        handle = Handle(callback, args)
+        with self._condition:
+            handle.timer = self._wheel.schedule(
+                deadline, self._make_ready, handle)
+            # The thread may be sleeping past the new deadline.
+            self._condition.notify()
+        return handle
+
+    def _make_ready(self, handle):
+        self._ready.append(handle)
+
+    def run_ready(self):
+        """Runs the callbacks due by now, returns the number run."""
+        with self._condition:
+            self._wheel.advance(self.clock())
+            ready, self._ready = self._ready, []
+        ran = 0
+        for handle in ready:
+            # Cancelled by an earlier callback.
+            if handle.cancelled:
+                continue
+            try:
+                handle.callback(*handle.args)
+            except Exception as e:
+                self.logger.exception(e)
+            ran += 1
+        return ran
+
+    def run(self):
+        while True:
+            self.run_ready()
+            with self._condition:
+                deadline = self._wheel.next_deadline()
+                if deadline is None:
+                    self._condition.wait()
+                else:
+                    self._condition.wait(max(deadline - self.clock(), 0))
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def set_scheduler(scheduler):
+    """Replaces the scheduler shared by everything in this process, eg. with
+    a simulator's virtual clock (see `sim.engine`)."""
+    global _scheduler
+    with _scheduler_lock:
+        _scheduler = scheduler
+
+
+def get_scheduler():
+    """Returns the scheduler shared by everything in this process."""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = Scheduler()
+            _scheduler.start()
+    return _scheduler
@@ -0,0 +1,99 @@
+from nose.tools import eq_
+from nose.tools import ok_
+from boundedqueue import *
+import Queue as queue
+
+
+def drain(q):
+    items = []
+    while not q.empty():
+        items.append(q.get())
+    return items
+
+
+def test_block_raises_when_full_and_not_blocking():
+    q = BoundedQueue(2)
+    q.put(1)
+    q.put(2)
+    try:
+        q.put(3, block=False)
+        ok_(False)
+    except queue.Full:
+        # Expected
+        pass
+    eq_([1, 2], drain(q))
+    eq_(1, q.get_stats()['blocked'])
+
+
+def test_block_timeout():
+    q = BoundedQueue(1)
+    q.put(1)
+    try:
+        q.put(2, timeout=.01)
+        ok_(False)
+    except queue.Full:
+        # Expected
+        pass
+
+
+def test_drop_oldest():
+    q = BoundedQueue(3, policy=Policy.DROP_OLDEST)
+    for i in xrange(5):
+        q.put(i)
+    eq_([2, 3, 4], drain(q))
+    eq_(2, q.get_stats()['dropped'])
+
+
+def test_drop_oldest_never_drops_control():
+    # Odd numbers are "control" and must never be dropped.
+    q = BoundedQueue(3, policy=Policy.DROP_OLDEST,
+                     is_droppable=lambda x: x % 2 == 0)
+    q.put(1)
+    q.put(2)
+    q.put(3)
+    # Evicts 2, the only droppable item.
+    q.put(4)
+    eq_([1, 3, 4], list(q.queue))
+    # Evicts 4.
+    q.put(5)
+    eq_([1, 3, 5], list(q.queue))
+    # Nothing droppable left, the new item is dropped.
+    q.put(6)
+    eq_([1, 3, 5], list(q.queue))
+    # Control blocks instead of being dropped.
+    try:
+        q.put(7, block=False)
+        ok_(False)
+    except queue.Full:
+        # Expected
+        pass
+    eq_([1, 3, 5], drain(q))
+
+
+def test_stats():
+    q = BoundedQueue(4)
+    q.put('a')
+    q.put('b')
+    q.get()
+    stats = q.get_stats()
+    eq_(1, stats['depth'])
+    eq_(4, stats['maxsize'])
+    eq_(2, stats['high_watermark'])
+    eq_(2, stats['puts'])
+    eq_(1, stats['gets'])
+    eq_(0, stats['dropped'])
+
+
+def test_wait_time():
+    q = BoundedQueue(4, policy=Policy.DROP_OLDEST)
+    q.put('a')
+    q.put('b')
+    q._put_times[1] -= 1
+    q.put('c')
+    q._put_times[0] -= 5
+    q.put('d')
+    q.put('e')
+    eq_(['b', 'c', 'd', 'e'], drain(q))
+    stats = q.get_stats()
+    ok_(1 <= stats['max_wait'] < 2)
+    ok_(1 <= stats['wait_time'] < 2)
@@ -0,0 +1,43 @@
+from nose.tools import eq_
+from logger import *
+import logging
+import StringIO
+
+
+def _create_handler(queue_size=None):
+    stream = StringIO.StringIO()
+    target = logging.StreamHandler(stream)
+    target.setFormatter(logging.Formatter("%(levelname)s %(message)s"))
+    handler = AsyncHandler([target])
+    if queue_size is not None:
+        handler.queue.maxsize = queue_size
+    logger = logging.getLogger('test_logger.%s' % id(handler))
+    logger.propagate = False
+    logger.addHandler(handler)
+    return logger, handler, stream
+
+
+def test_records_are_written_in_order():
+    logger, handler, stream = _create_handler()
+    args = ['a']
+    logger.info("%s", args)
+    # Arguments are formatted when logged.
+    args.append('b')
+    logger.warning("2")
+    handler.flush()
+    eq_("INFO ['a']\nWARNING 2\n", stream.getvalue())
+
+
+def test_drops_oldest_info_when_full():
+    logger, handler, stream = _create_handler(queue_size=2)
+    # Stall the writer.
+    with handler._write_lock:
+        logger.info("1")
+        logger.error("2")
+        logger.info("3")
+        logger.error("4")
+        logger.error("5")
+        logger.info("6")
+        eq_(4, handler.get_stats()['dropped'])
+    handler.flush()
+    eq_(["ERROR 2", "ERROR 4"], stream.getvalue().splitlines()[-2:])
@@ -0,0 +1,58 @@
+from nose.tools import eq_
+from nose.tools import raises
+from metrics import *
+import urllib2
+
+
+def test_counter_and_gauge():
+    registry = Registry()
+    registry.counter('frames_total', 'Frames.', addr=1).inc()
+    registry.counter('frames_total', addr=1).inc(2)
+    registry.counter('frames_total', addr=2).set_function(lambda: 5)
+    gauge = registry.gauge('depth')
+    gauge.set(4)
+    gauge.dec()
+    eq_(3, registry.counter('frames_total', addr=1).get())
+    eq_('# TYPE depth gauge\n'
+        'depth 3\n'
+        '# HELP frames_total Frames.\n'
+        '# TYPE frames_total counter\n'
+        'frames_total{addr="1"} 3\n'
+        'frames_total{addr="2"} 5\n', registry.render())
+
+
+def test_histogram():
+    registry = Registry()
+    histogram = registry.histogram('latency', buckets=[1, .5], op='"a"')
+    for value in [.1, .5, .7, 3]:
+        histogram.observe(value)
+    eq_('# TYPE latency histogram\n'
+        'latency_bucket{le="0.5",op="\\"a\\""} 2\n'
+        'latency_bucket{le="1",op="\\"a\\""} 3\n'
+        'latency_bucket{le="+Inf",op="\\"a\\""} 4\n'
+        'latency_sum{op="\\"a\\""} 4.3\n'
+        'latency_count{op="\\"a\\""} 4\n', registry.render())
+
+
+@raises(ValueError)
+def test_type_conflict():
+    registry = Registry()
+    registry.counter('frames_total', addr=1)
+    registry.gauge('frames_total', addr=2)
+
+
+def test_server():
+    registry = Registry()
+    registry.counter('frames_total').inc()
+    server = MetricsServer(0, registry)
+    server.start()
+    try:
+        url = 'http://127.0.0.1:%s' % server.port
+        eq_(registry.render(), urllib2.urlopen(url + '/metrics').read())
+        try:
+            urllib2.urlopen(url + '/other')
+            raise AssertionError('Expected a 404')
+        except urllib2.HTTPError as e:
+            eq_(404, e.code)
+    finally:
+        server.stop()
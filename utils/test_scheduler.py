@@ -0,0 +1,62 @@
+from nose.tools import eq_
+from nose.tools import ok_
+from scheduler import *
+import threading
+
+
+class FakeClock(object):
+    def __init__(self):
+        self.now = 0
+
+    def __call__(self):
+        return self.now
+
+
+def test_call_later():
+    clock = FakeClock()
+    scheduler = Scheduler(tick=.1, clock=clock)
+    called = []
+    scheduler.call_later(1, called.append, 'b')
+    scheduler.call_later(.5, called.append, 'a')
+    clock.now = .4
+    eq_(0, scheduler.run_ready())
+    clock.now = 1
+    eq_(2, scheduler.run_ready())
+    eq_(['a', 'b'], called)
+    eq_(0, len(scheduler))
+
+
+def test_cancel():
+    clock = FakeClock()
+    scheduler = Scheduler(tick=.1, clock=clock)
+    called = []
+    handle = scheduler.call_later(1, called.append, 'a')
+    # Cancelled by an earlier callback due at the same time.
+    scheduler.call_at(.9, handle.cancel)
+    clock.now = 1
+    scheduler.run_ready()
+    eq_([], called)
+
+
+def test_callbacks_can_reschedule():
+    clock = FakeClock()
+    scheduler = Scheduler(tick=.1, clock=clock)
+    called = []
+    def callback():
+        called.append(clock.now)
+        if len(called) < 3:
+            scheduler.call_later(1, callback)
+    scheduler.call_later(1, callback)
+    for now in xrange(1, 5):
+        clock.now = now
+        scheduler.run_ready()
+    eq_([1, 2, 3], called)
+
+
+def test_thread_runs_callbacks():
+    scheduler = Scheduler()
+    scheduler.start()
+    event = threading.Event()
+    scheduler.call_later(.01, event.set)
+    event.wait(5)
+    ok_(event.is_set())
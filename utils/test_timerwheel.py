@@ -0,0 +1,111 @@
+from nose.tools import eq_
+from nose.tools import ok_
+from timerwheel import *
+
+
+def test_fires_in_deadline_order():
+    fired = []
+    wheel = TimerWheel(tick=.1, slots=8)
+    wheel.schedule(.35, fired.append, 'b')
+    wheel.schedule(.3, fired.append, 'a')
+    wheel.schedule(1, fired.append, 'c')
+    eq_(0, wheel.advance(.29))
+    eq_(2, wheel.advance(.4))
+    eq_(['a', 'b'], fired)
+    eq_(1, len(wheel))
+    eq_(1, wheel.advance(1))
+    eq_(['a', 'b', 'c'], fired)
+    eq_(0, len(wheel))
+
+
+def test_never_fires_early():
+    fired = []
+    wheel = TimerWheel(tick=.1, slots=8)
+    wheel.schedule(.25, fired.append, 'a')
+    wheel.advance(.2)
+    eq_([], fired)
+    wheel.advance(.3)
+    eq_(['a'], fired)
+
+
+def test_deadlines_beyond_one_revolution():
+    fired = []
+    wheel = TimerWheel(tick=1, slots=4)
+    wheel.schedule(2, fired.append, 'a')
+    wheel.schedule(6, fired.append, 'b')
+    wheel.advance(3)
+    eq_(['a'], fired)
+    wheel.advance(5)
+    eq_(['a'], fired)
+    # Skip over more than a revolution at once.
+    wheel.schedule(20, fired.append, 'c')
+    wheel.advance(100)
+    eq_(['a', 'b', 'c'], fired)
+
+
+def test_cancel():
+    fired = []
+    wheel = TimerWheel(tick=1, slots=4)
+    timer = wheel.schedule(2, fired.append, 'a')
+    wheel.schedule(2, timer.cancel)
+    timer.cancel()
+    wheel.advance(3)
+    eq_([], fired)
+
+
+def test_past_deadline_fires_on_next_advance():
+    fired = []
+    wheel = TimerWheel(tick=1, slots=4, now=10)
+    wheel.schedule(5, fired.append, 'a')
+    wheel.advance(11)
+    eq_(['a'], fired)
+
+
+def test_hierarchical_cascades_far_timers():
+    fired = []
+    wheel = HierarchicalTimerWheel(tick=1, slots=4, levels=3)
+    for deadline in [70, 2, 9, 33, 17]:
+        wheel.schedule(deadline, fired.append, deadline)
+    eq_(5, len(wheel))
+    wheel.advance(16)
+    eq_([2, 9], fired)
+    wheel.advance(33)
+    eq_([2, 9, 17, 33], fired)
+    # Past the range of the top level (4 ** 3 ticks).
+    wheel.advance(69)
+    eq_([2, 9, 17, 33], fired)
+    wheel.advance(70)
+    eq_([2, 9, 17, 33, 70], fired)
+    eq_(0, len(wheel))
+
+
+def test_hierarchical_matches_deadline_order():
+    import random
+    rand = random.Random(1)
+    deadlines = [rand.uniform(0, 500) for i in xrange(200)]
+    fired = []
+    wheel = HierarchicalTimerWheel(tick=.1, slots=8, levels=3)
+    for deadline in deadlines:
+        wheel.schedule(deadline, fired.append, deadline)
+    now = 0
+    while now < 500:
+        now += rand.uniform(0, 20)
+        wheel.advance(now)
+        ok_(all(deadline <= now for deadline in fired))
+    eq_(sorted(deadlines), fired)
+
+
+def test_hierarchical_next_deadline():
+    wheel = HierarchicalTimerWheel(tick=1, slots=4, levels=2)
+    eq_(None, wheel.next_deadline())
+    timer = wheel.schedule(2, lambda: None)
+    eq_(2, wheel.next_deadline())
+    timer.cancel()
+    wheel.schedule(9, lambda: None)
+    wheel.advance(3)
+    # Cascade at the start of the bucket holding the timer.
+    eq_(8, wheel.next_deadline())
+    eq_(0, wheel.advance(8))
+    eq_(9, wheel.next_deadline())
+    eq_(1, wheel.advance(9))
+    eq_(None, wheel.next_deadline())
@@ -0,0 +1,193 @@
+import math
+
+
+class Timer(object):
+    """Handle to a callback scheduled on a `TimerWheel`."""
+    __slots__ = ['deadline', 'tick', 'callback', 'args', 'cancelled']
+
+    def __init__(self, deadline, tick, callback, args):
+        self.deadline = deadline
+        self.tick = tick
+        self.callback = callback
+        self.args = args
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+
+class TimerWheel(object):
+    """A hashed timing wheel.
+
+    Timers are hashed into `slots` buckets by the tick (of `tick` seconds) they
+    expire in, so scheduling and cancelling are O(1) and advancing the wheel
+    only looks at the buckets of the ticks that passed. The wheel does not
+    keep time itself, the owner calls `advance` with the current time.
+    """
+
+    def __init__(self, tick=.1, slots=256, now=0):
+        self.tick = tick
+        self.slots = [[] for i in xrange(slots)]
+        # The last tick the wheel was advanced to.
+        self.current_tick = self._floor_tick(now)
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+    # Ticks are rounded ignoring floating point noise (eg. 1.0 / .1).
+    def _to_tick(self, t):
+        return int(math.ceil(t / self.tick - 1e-9))
+
+    def _floor_tick(self, t):
+        return int(math.floor(t / self.tick + 1e-9))
+
+    def schedule(self, deadline, callback, *args):
+        """Calls `callback(*args)` once the wheel is advanced past `deadline`."""
+        # Timers already due fire on the next advance.
+        tick = max(self._to_tick(deadline), self.current_tick + 1)
+        timer = Timer(deadline, tick, callback, args)
+        self.slots[tick % len(self.slots)].append(timer)
+        self._size += 1
+        return timer
+
+    def advance(self, now):
+        """Fires all timers due by `now`, returns the number fired."""
+        target_tick = self._floor_tick(now)
+        if target_tick <= self.current_tick:
+            return 0
+        # Past a full revolution every slot has to be looked at once.
+        num_ticks = min(target_tick - self.current_tick, len(self.slots))
+        due = []
+        for tick in xrange(self.current_tick + 1, self.current_tick + num_ticks + 1):
+            slot = self.slots[tick % len(self.slots)]
+            if not slot:
+                continue
+            pending = []
+            for timer in slot:
+                if timer.cancelled:
+                    self._size -= 1
+                elif timer.tick <= target_tick:
+                    self._size -= 1
+                    due.append(timer)
+                else:
+                    pending.append(timer)
+            slot[:] = pending
+        self.current_tick = target_tick
+
+        due.sort(key=lambda timer: timer.deadline)
+        fired = 0
+        for timer in due:
+            # An earlier callback may have cancelled this timer.
+            if not timer.cancelled:
+                timer.callback(*timer.args)
+                fired += 1
+        return fired
+
+
+class HierarchicalTimerWheel(TimerWheel):
+    """Timer wheels of increasing granularity stacked on top of each other.
+
+    Level `l` has `slots` buckets of `slots ** l` ticks each. Timers are kept
+    in the lowest level whose range covers them and are cascaded down a level
+    whenever the wheel below completes a revolution, so timers far in the
+    future (eg. a 10 minute round) are not looked at on every tick and idle
+    stretches of time are skipped over.
+    """
+
+    def __init__(self, tick=.01, slots=64, levels=4, now=0):
+        self.tick = tick
+        self.num_slots = slots
+        self.levels = [[[] for i in xrange(slots)] for l in xrange(levels)]
+        # Number of timers (including cancelled ones) in each level.
+        self._level_sizes = [0] * levels
+        self.current_tick = self._floor_tick(now)
+        self._size = 0
+
+    def _insert(self, timer):
+        delta = timer.tick - self.current_tick
+        level = 0
+        # Timers past the range of the top level wait there for a revolution.
+        while level < len(self.levels) - 1 and \
+                delta >= self.num_slots ** (level + 1):
+            level += 1
+        slot = (timer.tick // self.num_slots ** level) % self.num_slots
+        self.levels[level][slot].append(timer)
+        self._level_sizes[level] += 1
+
+    def schedule(self, deadline, callback, *args):
+        """Calls `callback(*args)` once the wheel is advanced past `deadline`."""
+        tick = max(self._to_tick(deadline), self.current_tick + 1)
+        timer = Timer(deadline, tick, callback, args)
+        self._insert(timer)
+        self._size += 1
+        return timer
+
+    def _next_tick(self):
+        """The next tick anything has to be done in, None if empty."""
+        candidates = []
+        if self._level_sizes[0]:
+            for tick in xrange(self.current_tick + 1,
+                               self.current_tick + self.num_slots + 1):
+                if self.levels[0][tick % self.num_slots]:
+                    candidates.append(tick)
+                    break
+        for level in xrange(1, len(self.levels)):
+            if not self._level_sizes[level]:
+                continue
+            # Start of the next non-empty bucket of this level.
+            span = self.num_slots ** level
+            start = self.current_tick // span
+            for bucket in xrange(start + 1, start + self.num_slots + 1):
+                if self.levels[level][bucket % self.num_slots]:
+                    candidates.append(bucket * span)
+                    break
+        return min(candidates) if candidates else None
+
+    def next_deadline(self):
+        """The earliest time `advance` may fire a timer, None if empty."""
+        tick = self._next_tick()
+        return None if tick is None else tick * self.tick
+
+    def _take(self, level, slot):
+        timers = self.levels[level][slot]
+        self.levels[level][slot] = []
+        self._level_sizes[level] -= len(timers)
+        return timers
+
+    def advance(self, now):
+        """Fires all timers due by `now`, returns the number fired."""
+        target_tick = self._floor_tick(now)
+        fired = 0
+        while True:
+            tick = self._next_tick()
+            if tick is None or tick > target_tick:
+                break
+            self.current_tick = tick
+            due = []
+            # Cascade the buckets starting at this tick, highest level first.
+            for level in xrange(len(self.levels) - 1, 0, -1):
+                span = self.num_slots ** level
+                if tick % span != 0:
+                    continue
+                for timer in self._take(level, (tick // span) % self.num_slots):
+                    if timer.cancelled:
+                        self._size -= 1
+                    elif timer.tick <= tick:
+                        self._size -= 1
+                        due.append(timer)
+                    else:
+                        self._insert(timer)
+            for timer in self._take(0, tick % self.num_slots):
+                self._size -= 1
+                if not timer.cancelled:
+                    due.append(timer)
+
+            due.sort(key=lambda timer: timer.deadline)
+            for timer in due:
+                # An earlier callback may have cancelled this timer.
+                if not timer.cancelled:
+                    timer.callback(*timer.args)
+                    fired += 1
+        self.current_tick = max(self.current_tick, target_tick)
+        return fired